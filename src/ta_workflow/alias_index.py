@@ -0,0 +1,156 @@
+"""Module for the persistent index of the submission names students were matched by."""
+
+import json
+import os
+from pathlib import Path, PurePath
+
+from ta_workflow.matcher import normalize
+from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.student import Student
+from ta_workflow.transfer import file_digest
+
+ALIAS_INDEX_PATH: Path = PROJECT_ROOT / "alias_index.json"
+
+# The kinds of aliases, looked up in this order
+CONTENT_HASH = "content_hash"
+MOODLE_DIR = "moodle_dir"
+FILE_NAME = "file_name"
+ALIAS_KINDS = (CONTENT_HASH, MOODLE_DIR, FILE_NAME)
+
+
+def file_name_key(file_name: str) -> str:
+    """
+    Gets the part of a file name that stays the same from one assignment to the next.
+
+    Parameters:
+    -----------
+    file_name : str
+        The file name, e.g. "Lovelace_Ada_HW3.pdf".
+
+    Returns:
+    --------
+    str
+        The sorted normalized tokens without digits and the extension, e.g. "ada hw
+        lovelace".
+    """
+    tokens = normalize(Path(file_name).stem).split()
+    return " ".join(sorted({token.strip("0123456789") for token in tokens} - {""}))
+
+
+def submission_aliases(
+    file_path: PurePath, moodle_dir_name: str | None, digest: str | None = None
+) -> dict[str, str]:
+    """
+    Gets the aliases a submission can be looked up by.
+
+    Parameters:
+    -----------
+    file_path : PurePath
+        The path of the submitted file.
+    moodle_dir_name : str or None
+        The name of the Moodle submission directory of the file, if any.
+    digest : str or None, optional
+        The hash of the contents of the file, computed from the file if not given.
+
+    Returns:
+    --------
+    dict of str to str
+        The alias of every kind. A file in a Moodle directory is not looked up by its
+        name, since Moodle directories often contain files with generic names.
+    """
+    aliases = {CONTENT_HASH: digest or file_digest(Path(file_path))}
+    if moodle_dir_name is not None:
+        aliases[MOODLE_DIR] = normalize(moodle_dir_name)
+    elif key := file_name_key(file_path.name):
+        aliases[FILE_NAME] = key
+    return aliases
+
+
+class AliasIndex:
+    """
+    A persistent map from submission aliases to the bilkent id of the student.
+
+    Every confirmed match is recorded under the content hash of the file and either
+    the Moodle directory name or the file name, so later assignments and reruns resolve
+    the same students with a dictionary lookup instead of fuzzy matching. A file name
+    is recorded only if it contains the first or last name of the student, since
+    generic names such as "hw1.pdf" are shared by many students. An alias that was
+    confirmed for two different students is ambiguous and never resolved again.
+
+    Attributes:
+    -----------
+    path : Path
+        The path of the JSON file of the index.
+    aliases : dict of str to dict of str to str or None
+        The bilkent id of every alias of every kind, None for ambiguous aliases.
+    """
+
+    def __init__(self, path: Path = ALIAS_INDEX_PATH) -> None:
+        self.path = path
+        try:
+            with path.open() as fp:
+                stored = json.load(fp)
+        except FileNotFoundError:
+            stored = {}
+        self.aliases: dict[str, dict[str, str | None]] = {
+            kind: stored.get(kind, {}) for kind in ALIAS_KINDS
+        }
+
+    def lookup(self, aliases: dict[str, str]) -> str | None:
+        """
+        Finds the student of a submission.
+
+        Parameters:
+        -----------
+        aliases : dict of str to str
+            The aliases of the submission, see `submission_aliases`.
+
+        Returns:
+        --------
+        str or None
+            The bilkent id of the student, None if no alias is known.
+        """
+        for kind in ALIAS_KINDS:
+            if kind in aliases and (
+                bilkent_id := self.aliases[kind].get(aliases[kind])
+            ):
+                return bilkent_id
+        return None
+
+    def confirm(self, aliases: dict[str, str], student: Student) -> None:
+        """
+        Records the student a submission was matched to.
+
+        Parameters:
+        -----------
+        aliases : dict of str to str
+            The aliases of the submission, see `submission_aliases`.
+        student : Student
+            The student.
+
+        Returns:
+        --------
+        None
+        """
+        name_tokens = set(
+            normalize(student.first_name + " " + student.last_name).split()
+        )
+        for kind, alias in aliases.items():
+            if kind == FILE_NAME and name_tokens.isdisjoint(alias.split()):
+                continue
+            known = self.aliases[kind].setdefault(alias, student.bilkent_id)
+            if known != student.bilkent_id:
+                self.aliases[kind][alias] = None
+
+    def save(self) -> None:
+        """
+        Writes the index to its JSON file, replacing the previous version atomically.
+
+        Returns:
+        --------
+        None
+        """
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with tmp_path.open("w") as fp:
+            json.dump(self.aliases, fp, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -1,12 +1,16 @@
 """Command line application module."""
 
 import logging
-from subprocess import CalledProcessError
+from pathlib import Path
 
 import typer
 from rich import print as rprint
 
-from ta_workflow.utils import get_students_and_selected_assignments, prepare
+from ta_workflow.utils import (
+    get_students_and_selected_assignments,
+    init_logger,
+    prepare,
+)
 
 app = typer.Typer()
 
@@ -17,7 +21,7 @@ copy_option = typer.Option(
 
 score_threshold_argument = typer.Argument(
     35,
-    help="The minimum similarity score for a match to be considered valid.",
+    help="The minimum similarity score for a match to be considered valid, the weighted ratio of rapidfuzz from 0 to 100.",
 )
 
 sym_link_option = typer.Option(
@@ -25,36 +29,198 @@ sym_link_option = typer.Option(
     help="Create a symbolic link of the output excel in the output directory. Original excel is saved in the project root.",
 )
 
+export_format_option = typer.Option(
+    ["xls"],
+    "--format",
+    help="The format of the files: xls for AIRS, csv or xlsx for other systems. Can be given multiple times.",
+)
+
+export_jobs_option = typer.Option(
+    None,
+    "--jobs",
+    help="The number of worker processes writing files. Defaults to every core.",
+)
+
+force_option = typer.Option(
+    False,
+    help="Write every file, even if its grades did not change since the last run.",
+)
+
+strategy_option = typer.Option(
+    "copy",
+    help="How to put the files into the students' directories: copy, reflink, hardlink or symlink. Reflinks and hardlinks fall back to copies where unsupported.",
+)
+
+verify_option = typer.Option(False, help="Verify the checksums of the copied files.")
+
+jobs_option = typer.Option(
+    1,
+    help="Distribute the selected assignments in this many worker processes. Their logs are shown in assignment order when all are done.",
+)
+
+read_pdfs_option = typer.Option(
+    True,
+    help="Look for the bilkent id or name of the student in the first page of the files that cannot be matched by their filename, and of the files known from earlier runs. A student found in the page overrides the one the file was known for.",
+)
+
+zip_option = typer.Option(
+    None,
+    "--zip",
+    help="Distribute a Moodle 'download all submissions' ZIP of the selected assignment without extracting it first.",
+)
+
+watch_option = typer.Option(
+    False,
+    help="Keep running and distribute new or changed submissions as they arrive, until Ctrl+C. The submissions already there are not distributed again. Cannot be combined with --zip or --jobs.",
+)
+
 delete_option = typer.Option(False, help="Delete the directories and their contents.")
 
+roster_argument = typer.Argument(
+    ..., help="The updated class roster from the registrar, a .xls or .csv file."
+)
+
+dry_run_option = typer.Option(
+    False, help="Only show the directories that would be added, archived or renamed."
+)
+
+manifest_option = typer.Option(
+    None,
+    help="A CSV (file,pages rows, e.g. exam.pdf,1-2) or YAML (file: [1-2, 3-4]) manifest of the files to split, without prompting.",
+)
+
+files_option = typer.Option(
+    None,
+    help="A glob of the files to split into parts of --pages-per-part pages, e.g. 'exams/*.pdf'. Cannot be combined with --manifest.",
+)
+
+pages_per_part_option = typer.Option(
+    None,
+    help="The number of pages of every part of the files given with --files, or of every paper of --stack.",
+)
+
+split_jobs_option = typer.Option(
+    None,
+    "--jobs",
+    help="The number of worker processes splitting files. Defaults to every core.",
+)
+
+low_memory_option = typer.Option(
+    False,
+    help="Memory map the files and hold one part in memory at a time, for large scans.",
+)
+
+stack_option = typer.Option(
+    None,
+    help="A scanned stack of papers to split straight into the students' directories of --assignment.",
+)
+
+assignment_option = typer.Option(
+    None, help="The assignment directory the papers of --stack are written to."
+)
+
+boundary_option = typer.Option(
+    "cover",
+    help="Where a paper of --stack starts: cover (a page with a bilkent id), blank (after blank separator pages) or pages (every --pages-per-part pages). Cover needs a text layer, so use blank or pages for image-only scans without OCR.",
+)
+
+resend_option = typer.Option(
+    False,
+    help="Also send to the students the outbox journal marks as already sent. Default skips them.",
+)
+
+render_option = typer.Option(
+    False,
+    help="Only render the emails into the outbox (_outbox in the project root) for review, nothing is sent. Send them later with --flush.",
+)
+
+attach_option = typer.Option(
+    None,
+    help="A file attached to every email, e.g. the solutions. Can be given multiple times.",
+)
+
+flush_option = typer.Option(
+    False, help="Send the emails rendered into the outbox with --render."
+)
+
+shrink_pdfs_option = typer.Option(
+    False,
+    help="Send optimized copies of the feedback PDFs when they are smaller. Optimized copies are cached in _pdf_cache in the project root.",
+)
+
+image_scale_option = typer.Option(
+    None,
+    help="Also downsample the JPEG images in the feedback PDFs by this factor, e.g. 0.5. Requires Pillow and --shrink-pdfs.",
+)
+
 
 @app.command()
 def distribute(
-    copy: bool = copy_option, score_threshold: int = score_threshold_argument
+    copy: bool = copy_option,
+    score_threshold: int = score_threshold_argument,
+    strategy: str = strategy_option,
+    verify: bool = verify_option,
+    jobs: int = jobs_option,
+    read_pdfs: bool = read_pdfs_option,
+    zip_file: Path = zip_option,
+    watch: bool = watch_option,
 ) -> None:
     """Distribute the assignments into their respective directories."""
-    from ta_workflow.distribute_assignments import distribute_assignments
+    from ta_workflow.distribute_assignments import (
+        distribute_assignments,
+        watch_assignments,
+    )
+
+    if watch and (zip_file or jobs > 1):
+        rprint("[red]--watch cannot be combined with --zip or --jobs[/red]")
+        raise typer.Exit(1)
 
     # Get the students and selected assignments.
     students, selected_assignments = get_students_and_selected_assignments("distribute")
 
     try:
-        distribute_assignments(students, selected_assignments, copy, score_threshold)
+        if watch:
+            watch_assignments(
+                students,
+                selected_assignments,
+                copy,
+                score_threshold,
+                strategy,
+                verify,
+                read_pdfs,
+            )
+        else:
+            distribute_assignments(
+                students,
+                selected_assignments,
+                copy,
+                score_threshold,
+                strategy,
+                verify,
+                jobs,
+                read_pdfs,
+                zip_file,
+            )
     except FileNotFoundError:
         # Log an error if the assignments directory is not found.
         logging.error(
             "Could not find the assignments directory. Run `make_dirs` first."
         )
-    except CalledProcessError:
-        # Log an error if the command to copy the files fails.
-        logging.error("Error copying the files. Did you use make-dirs?")
+    except ValueError as e:
+        # Log an error if the transfer strategy is unknown or the ZIP is ambiguous.
+        logging.error(e)
     else:
         # Log a message to indicate that the command has finished executing.
         logging.info("Distributing assignments finished.")
 
 
 @app.command()
-def excel(sym_link: bool = sym_link_option) -> None:
+def excel(
+    sym_link: bool = sym_link_option,
+    formats: list[str] = export_format_option,
+    jobs: int = export_jobs_option,
+    force: bool = force_option,
+) -> None:
     """Create excel files for each assignment to be uploaded to AIRS."""
     from ta_workflow.grades_to_excel import grades_to_excel
 
@@ -64,7 +230,13 @@ def excel(sym_link: bool = sym_link_option) -> None:
     )
 
     # Call the function to create the excel files.
-    grades_to_excel(students, selected_assignments, sym_link)
+    try:
+        grades_to_excel(
+            students, selected_assignments, sym_link, tuple(formats), jobs, force
+        )
+    except ValueError as e:
+        rprint(f"[red]{e}[/red]")
+        raise typer.Exit(1)
 
     # Log a message to indicate that the command has finished executing.
     logging.info("Creating excel files finished.")
@@ -94,29 +266,135 @@ def make_dirs(delete: bool = delete_option) -> None:
 
 
 @app.command()
-def split_pdf() -> None:
+def sync_roster(roster: Path = roster_argument, dry_run: bool = dry_run_option) -> None:
+    """Update the student directories and data to a new roster, touching only the added, dropped, withdrawn or renamed students."""
+    from ta_workflow.make_project_dir import sync_roster
+    from ta_workflow.student import StudentTable, read_registrar_data, sync_student_data
+
+    # Get the students the directories were made for, homeworks, and quizzes.
+    old_students, homeworks, quizzes = prepare()
+    roster_data = read_registrar_data(roster)
+    students = list(StudentTable.from_frame(roster_data))
+    # Call the function to add, archive and rename the changed directories.
+    sync_roster(students, homeworks + quizzes, old_students, dry_run)
+    if not dry_run:
+        # Update the student data the other commands read, keeping the grades.
+        sync_student_data(roster_data)
+    logging.info("Syncing roster finished.")
+
+
+@app.command()
+def split_pdf(
+    manifest: Path = manifest_option,
+    files: str = files_option,
+    pages_per_part: int = pages_per_part_option,
+    jobs: int = split_jobs_option,
+    low_memory: bool = low_memory_option,
+    stack: Path = stack_option,
+    assignment: str = assignment_option,
+    boundary: str = boundary_option,
+) -> None:
     """Split a pdf file into individual pages."""
-    from ta_workflow.pdf_splitter import get_input, split_pdf
+    if stack:
+        # Split the stack straight into the students' directories.
+        from ta_workflow.stack_splitter import split_stack
+        from ta_workflow.student import parse_and_validate_student_data
+
+        if not assignment:
+            rprint("[red]--assignment is required with --stack[/red]")
+            raise typer.Exit(1)
+        try:
+            split_stack(
+                str(stack),
+                assignment,
+                parse_and_validate_student_data(),
+                boundary,
+                pages_per_part,
+            )
+        except ValueError as e:
+            rprint(f"[red]{e}[/red]")
+            raise typer.Exit(1)
+        return
+
+    from ta_workflow.pdf_splitter import (
+        get_input,
+        glob_jobs,
+        read_manifest,
+        split_pdf,
+        split_pdf_low_memory,
+        split_pdfs,
+    )
+
+    if manifest or files:
+        # Split every file of the manifest or glob without prompting.
+        if manifest and files:
+            raise typer.BadParameter("--manifest cannot be combined with --files")
+        if files and not pages_per_part:
+            rprint("[red]--pages-per-part is required with --files[/red]")
+            raise typer.Exit(1)
+        try:
+            split_jobs = read_manifest(manifest) if manifest else glob_jobs(files)
+        except (OSError, ValueError) as e:
+            rprint(f"[red]{e}[/red]")
+            raise typer.Exit(1) from None
+        split_pdfs(split_jobs, pages_per_part, jobs, low_memory)
+        return
 
     # Get the file path and page numbers from the user.
     file_path, pages = get_input()
 
     # Call the function to split the pdf file.
-    split_pdf(file_path, pages)
+    (split_pdf_low_memory if low_memory else split_pdf)(file_path, pages)
     rprint("Splitting pdf finished.")  # logger not initialized for this module
 
 
 @app.command()
-def send_emails() -> None:
-    """Send the grades to the students."""
-    from ta_workflow.send_grades import send_grades
+def send_emails(
+    resend: bool = resend_option,
+    render: bool = render_option,
+    flush: bool = flush_option,
+    attach: list[Path] = attach_option,
+    shrink_pdfs: bool = shrink_pdfs_option,
+    image_scale: float = image_scale_option,
+) -> None:
+    """Send the grades to the students. Students who already got the same email are skipped."""
+    if flush:
+        from ta_workflow.send_grades import flush_outbox
+
+        init_logger()
+        flush_outbox(resend=resend)
+        logging.info("Flushing outbox finished.")
+        return
 
     students, selected_assignments = get_students_and_selected_assignments(
-        "send email for"
+        "render email for" if render else "send email for"
     )
 
-    send_grades(students, selected_assignments)
-    logging.info("Sending grades finished.")
+    common_files_path = [str(path.resolve()) for path in attach or []]
+    if render:
+        from ta_workflow.send_grades import render_grades
+
+        render_grades(
+            students,
+            selected_assignments,
+            resend=resend,
+            common_files_path=common_files_path,
+            shrink_pdfs=shrink_pdfs,
+            image_scale=image_scale,
+        )
+        logging.info("Rendering emails finished.")
+    else:
+        from ta_workflow.send_grades import send_grades
+
+        send_grades(
+            students,
+            selected_assignments,
+            resend=resend,
+            common_files_path=common_files_path,
+            shrink_pdfs=shrink_pdfs,
+            image_scale=image_scale,
+        )
+        logging.info("Sending grades finished.")
 
 
 @app.command()
@@ -24,12 +24,22 @@ class YAMLConfig(BaseModel):
         The number of quizzes in the course.
     email_frequency_in_seconds : float
         The frequency (in seconds) at which to send reminder emails.
+        Used as the default per-minute email quota.
     google_drive_path : str
         The path to the Google Drive folder for the course.
     course_code : str
         The code for the course.
     ta_name : str
         The name of the TA for the course.
+    email_workers : int, optional
+        The number of emails sent concurrently, defaults to 4.
+    emails_per_minute : float, optional
+        The per-minute email quota, defaults to 60 / email_frequency_in_seconds.
+    emails_per_hour : float, optional
+        The per-hour email quota, defaults to no hourly quota.
+    email_size_limit_in_mb : float, optional
+        The largest email the server accepts, larger feedback is shared via Google Drive.
+        Defaults to 25.
     """
 
     project_root_path: str
@@ -40,6 +50,10 @@ class YAMLConfig(BaseModel):
     google_drive_path: str
     course_code: str
     ta_name: str
+    email_workers: int = 4
+    emails_per_minute: float | None = None
+    emails_per_hour: float | None = None
+    email_size_limit_in_mb: float = 25
 
     # Validators to check that the configuration settings are valid
     @validator("student_data_file_name")
@@ -72,6 +86,18 @@ class YAMLConfig(BaseModel):
             raise ValueError(f"email_frequency_in_seconds must be positive, {v} is not")
         return v
 
+    @validator("email_workers")
+    def email_workers_must_be_valid(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError(f"email_workers must be a positive integer, {v} is not")
+        return v
+
+    @validator("emails_per_minute", "emails_per_hour", "email_size_limit_in_mb")
+    def email_limit_must_be_valid(cls, v: float | None) -> float | None:
+        if v is not None and v <= 0:
+            raise ValueError(f"email limits must be positive, {v} is not")
+        return v
+
     @validator("course_code")
     def course_code_must_be_valid(cls, v: str) -> str:
         if not v.isidentifier():
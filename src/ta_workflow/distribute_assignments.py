@@ -1,83 +1,328 @@
 import logging
-import subprocess
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path, PurePath, PurePosixPath
+from time import sleep
+from typing import Sequence
+from zipfile import ZipFile, ZipInfo
 
-from fuzzywuzzy import process  # type: ignore
 from unidecode import unidecode
 
+from ta_workflow.alias_index import CONTENT_HASH, AliasIndex, submission_aliases
+from ta_workflow.matcher import NameMatcher
 from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.pdf_text import extract_texts
 from ta_workflow.student import Student
+from ta_workflow.transfer import COPY, FileTransfer, extract_members
 
+WATCH_INTERVAL_IN_SECONDS = 2.0
 
-def distribute_assignments(
-    students: list[Student],
-    assignment_names: list[str],
+# The roster index and alias index, set once in every distribute worker process
+_matcher: NameMatcher | None = None
+_alias_index: AliasIndex | None = None
+# The number of processes extracting PDF texts, 1 inside the distribute workers
+_text_workers: int | None = None
+# Collects the log records of a worker process, so they are logged in order at the end
+_log_collector: "LogCollector | None" = None
+
+
+class LogCollector(logging.Handler):
+    """
+    A logging handler that keeps the records instead of emitting them.
+
+    Attributes:
+    -----------
+    records : list of logging.LogRecord
+        The collected records, with their messages formatted so they can be pickled.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        record.msg, record.args, record.exc_info = record.getMessage(), None, None
+        self.records.append(record)
+
+    def pop_records(self) -> list[logging.LogRecord]:
+        """
+        Gets the collected records and forgets them.
+
+        Returns:
+        --------
+        list of logging.LogRecord
+            The records in the order they were logged.
+        """
+        records, self.records = self.records, []
+        return records
+
+
+def init_distribute_worker(
+    matcher: NameMatcher, alias_index: AliasIndex, collect_logs: bool = True
+) -> None:
+    """
+    Initializes a distribute worker with the roster and alias indexes.
+
+    Parameters:
+    -----------
+    matcher : NameMatcher
+        The index of the student names, built once in the main process.
+    alias_index : AliasIndex
+        The alias index as it was when distributing started.
+    collect_logs : bool, optional
+        Whether to collect the log records of the worker instead of emitting them. The
+        workers that collect their logs run in a pool, so they extract PDF texts
+        without a nested pool.
+
+    Returns:
+    --------
+    None
+    """
+    global _matcher, _alias_index, _text_workers, _log_collector
+    _matcher, _alias_index = matcher, alias_index
+    _text_workers = 1 if collect_logs else None
+    if collect_logs:
+        _log_collector = LogCollector()
+        logger = logging.getLogger()
+        logger.handlers = [_log_collector]
+        logger.setLevel(logging.DEBUG)
+
+
+def student_assignment_dir(student: Student, assignment_name: str) -> Path:
+    """
+    Returns the directory of an assignment in the directory of a student.
+
+    Parameters:
+    -----------
+    student : Student
+        The student.
+    assignment_name : str
+        The name of the assignment.
+
+    Returns:
+    --------
+    Path
+        The directory the submission of the student is copied to.
+    """
+    return PROJECT_ROOT / f"{student.last_name}_{student.bilkent_id}" / assignment_name
+
+
+def scan_directory(
+    assignment_dir: Path, entries: list[Path] | None = None
+) -> tuple[list[Path], list[str], list[dict[str, str]], bool]:
+    """
+    Finds the submissions in an assignment directory.
+
+    The submissions are the PDFs in the directory, and the PDFs alone in a
+    subdirectory, as in an extracted Moodle download.
+
+    Parameters:
+    -----------
+    assignment_dir : Path
+        The assignment directory.
+    entries : list of Path or None, optional
+        The entries of the directory to look at, e.g. the new ones. Defaults to every
+        entry.
+
+    Returns:
+    --------
+    tuple of (list of Path, list of str, list of dict, bool)
+        The files, the queries to match them by, their aliases, and whether the
+        directory is a Moodle directory.
+    """
+    moodle_dir = False
+    files, queries, aliases = [], [], []
+    for iterd in assignment_dir.iterdir() if entries is None else entries:
+        if iterd.is_dir():
+            pdfs = list(iterd.glob("*.pdf"))
+            if len(pdfs) == 1:
+                moodle_dir = True
+                file = pdfs[0]
+            else:
+                continue
+        elif not iterd.is_file() or not iterd.name.endswith(".pdf"):
+            continue
+        else:
+            file = iterd
+        files.append(file)
+        aliases.append(submission_aliases(file, iterd.name if iterd.is_dir() else None))
+        if moodle_dir:
+            queries.append(iterd.name + " " + file.name)
+        else:
+            queries.append(file.name)
+    return files, queries, aliases, moodle_dir
+
+
+def scan_zip(
+    zip_file: Path,
+) -> tuple[list[ZipInfo], list[str], list[dict[str, str]], bool]:
+    """
+    Finds the submissions in a Moodle "download all submissions" ZIP.
+
+    Only the central directory is read, nothing is extracted. The submissions are
+    found as `scan_directory` finds them in the extracted directory, and the CRC-32
+    and size of a member stand in for the hash of its contents.
+
+    Parameters:
+    -----------
+    zip_file : Path
+        The path of the ZIP.
+
+    Returns:
+    --------
+    tuple of (list of ZipInfo, list of str, list of dict, bool)
+        The members, the queries to match them by, their aliases, and whether the
+        ZIP has Moodle submission directories.
+    """
+    with ZipFile(zip_file) as archive:
+        infos = archive.infolist()
+    pdfs_by_dir: dict[str, list[ZipInfo]] = {}
+    for info in infos:
+        path = PurePosixPath(info.filename)
+        if not info.is_dir() and path.suffix == ".pdf" and len(path.parts) <= 2:
+            pdfs_by_dir.setdefault(str(path.parent), []).append(info)
+    moodle_dir = False
+    members, queries, aliases = [], [], []
+    for dir_name, pdfs in pdfs_by_dir.items():
+        if dir_name != "." and len(pdfs) != 1:
+            continue
+        for info in pdfs:
+            path = PurePosixPath(info.filename)
+            digest = f"zip-crc32-{info.CRC:08x}-{info.file_size}"
+            members.append(info)
+            if dir_name == ".":
+                aliases.append(submission_aliases(path, None, digest))
+                queries.append(path.name)
+            else:
+                moodle_dir = True
+                aliases.append(submission_aliases(path, dir_name, digest))
+                queries.append(dir_name + " " + path.name)
+    return members, queries, aliases, moodle_dir
+
+
+def distribute_assignment(
+    assignment_name: str,
     copy: bool = False,
     score_threshold: int = 35,
-) -> None:
+    strategy: str = COPY,
+    verify: bool = False,
+    read_pdfs: bool = True,
+    zip_file: Path | None = None,
+    entries: list[Path] | None = None,
+    matched_students: dict[Student, int] | None = None,
+) -> tuple[list[logging.LogRecord], list[tuple[dict[str, str], str]]]:
     """
-    Distributes assignments to students based on filename similarity.
+    Distributes the submissions of one assignment, in a worker set up by
+    `init_distribute_worker`.
 
     Parameters:
     -----------
-    students : list of Student objects
-        List of students in the class.
-    assignment_names : list of str
-        List of assignment names.
+    assignment_name : str
+        The assignment name.
     copy : bool, optional
         Whether to copy the files to the students' directories.
     score_threshold : int, optional
         The minimum similarity score required for a match.
+    strategy : str, optional
+        How the files are put into the students' directories.
+    verify : bool, optional
+        Whether to compare the checksums of the copies with the submissions.
+    read_pdfs : bool, optional
+        Whether to look for the bilkent id or name of the student in the first page
+        of the files whose filename score is below the threshold, and of the files
+        resolved from the alias index. A student found in the page overrides the
+        student of the alias.
+    zip_file : Path or None, optional
+        A Moodle ZIP to distribute instead of the assignment directory. The matched
+        members are extracted into the students' directories in one pass over the
+        ZIP, and the first pages are not read.
+    entries : list of Path or None, optional
+        The entries of the assignment directory to distribute. Defaults to every
+        entry.
+    matched_students : dict of Student to int or None, optional
+        The score of the students already matched, updated with the new matches, e.g.
+        to keep them from one call to the next. Defaults to no student.
 
     Returns:
     --------
-    None
+    tuple of (list of logging.LogRecord, list of (dict, str) tuples)
+        The log records collected by the worker, empty if they were emitted, and the
+        aliases and bilkent id of every copied submission.
     """
+    assert _matcher is not None and _alias_index is not None
+    matcher, alias_index = _matcher, _alias_index
+    students = matcher.students
+    students_by_id = {student.bilkent_id: student for student in students}
+    confirmed: list[tuple[dict[str, str], str]] = []
 
-    # Create a dictionary of full names of students mapped to their Student objects
-    students_full_names = {
-        student.first_name + " " + student.last_name: student for student in students
-    }
+    # Copy the files from a pool of threads
+    with FileTransfer(strategy, verify) as file_transfer:
+        # The students mapped to the score of the file they are matched to
+        if matched_students is None:
+            matched_students = {}
+        copies: list[tuple[Future[int], dict[str, str], str]] = []
 
-    # Iterate over the assignment names and the files in their directories
-    for assignment_name in assignment_names:
-        # Create a dictionary of students mapped to the number of files they are matched to
-        matched_students = {student: 0 for student in students}
-
-        assignment_dir = PROJECT_ROOT / assignment_name
-        moodle_dir = False
-        for iterd in assignment_dir.iterdir():
-            if iterd.is_dir():
-                pdfs = list(iterd.glob("*.pdf"))
-                if len(pdfs) == 1:
-                    moodle_dir = True
-                    file = pdfs[0]
-                else:
-                    continue
-            elif not iterd.is_file() or not iterd.name.endswith(".pdf"):
-                continue
-            else:
-                file = iterd
-            if moodle_dir:
-                query = iterd.name + " " + file.name
+        files: Sequence[PurePath]
+        if zip_file is None:
+            files, queries, aliases, moodle_dir = scan_directory(
+                PROJECT_ROOT / assignment_name, entries
+            )
+        else:
+            members, queries, aliases, moodle_dir = scan_zip(zip_file)
+            files = [PurePosixPath(member.filename) for member in members]
+            extractions: list[tuple[ZipInfo, Path, dict[str, str], str]] = []
+
+        # Resolve the known submissions, then find the best match for the others at once
+        matches: list[tuple[Student | None, int]] = [(None, 0)] * len(files)
+        unknown, resolved = [], []
+        for i, file_aliases in enumerate(aliases):
+            bilkent_id = alias_index.lookup(file_aliases)
+            if bilkent_id in students_by_id:
+                matches[i] = (students_by_id[bilkent_id], 100)
+                resolved.append(i)
             else:
-                query = file.name
-            # Find the best match for the filename in the dictionary of student full names
-            best_match, score = process.extractOne(
-                unidecode(query), students_full_names.keys()
+                unknown.append(i)
+        for i, match in zip(unknown, matcher.match([queries[i] for i in unknown])):
+            matches[i] = match
+        logging.info(
+            f"Resolved {len(files) - len(unknown)} of {len(files)} {assignment_name} files from the alias index"
+        )
+
+        # Read the files without a name in their filename, and the files resolved from
+        # the alias index, since the bilkent id or name on a file outweighs its alias
+        unmatched = [
+            i for i, (_, score) in enumerate(matches) if score < score_threshold
+        ]
+        if read_pdfs and zip_file is None and (unmatched or resolved):
+            read = sorted(unmatched + resolved)
+            texts = extract_texts(
+                [Path(files[i]) for i in read],
+                [aliases[i][CONTENT_HASH] for i in read],
+                workers=_text_workers,
             )
+            for i, match in zip(read, matcher.match_text(texts)):
+                if match[0] is None or match[0] is matches[i][0]:
+                    continue
+                if matches[i][1] < score_threshold:
+                    logging.info(f"Matched {files[i].name} by its contents")
+                else:
+                    logging.warning(
+                        f"{files[i].name} names {match[0].first_name} {match[0].last_name}, not the student of its alias"
+                    )
+                matches[i] = match
 
+        for i, (file, file_aliases, (best_match_student, score)) in enumerate(
+            zip(files, aliases, matches)
+        ):
             # If the similarity score is less than the threshold, log a message and continue to the next file
-            if score < score_threshold:
+            if best_match_student is None or score < score_threshold:
                 logging.info(
                     f"Could not find a match for {unidecode(file.name):<41} {'-----':<15} {'-----':<10} Similarity Score: {'--'}"
                 )
                 continue
 
-            # Get the Student object corresponding to the best match
-            best_match_student = students_full_names[best_match]
-
             # If the Student has not been matched yet, update the matched_students dictionary and log a message
-            if matched_students[best_match_student] == 0:
+            if not matched_students.get(best_match_student):
                 matched_students[best_match_student] = score
                 logging.info(
                     f"Found a match for {unidecode(file.name):<50} {best_match_student.first_name:<15} {best_match_student.last_name:<10} Similarity Score: {score}"
@@ -85,21 +330,24 @@ def distribute_assignments(
 
                 # If copy is True, copy the file to the Student's directory
                 if copy:
-                    source_file = str(file)
-                    destination_file = str(
-                        PROJECT_ROOT
-                        / f"{best_match_student.last_name}_{best_match_student.bilkent_id}"
-                        / assignment_name
+                    destination_file = (
+                        student_assignment_dir(best_match_student, assignment_name)
                         / file.name
                     )
-                    subprocess.run(
-                        [
-                            "cp",
-                            source_file,
-                            destination_file,
-                        ],
-                        check=True,
-                    )
+                    if zip_file is None:
+                        future = file_transfer.submit(Path(file), destination_file)
+                        copies.append(
+                            (future, file_aliases, best_match_student.bilkent_id)
+                        )
+                    else:
+                        extractions.append(
+                            (
+                                members[i],
+                                destination_file,
+                                file_aliases,
+                                best_match_student.bilkent_id,
+                            )
+                        )
 
             # If the Student has already been matched, log a message and continue to the next file
             else:
@@ -107,7 +355,259 @@ def distribute_assignments(
                     f"{best_match_student.first_name} {best_match_student.last_name} is already matched"
                 )
                 continue
+        if copy and zip_file is not None:
+            extracted = extract_members(
+                zip_file, [(member, path) for member, path, _, _ in extractions]
+            )
+            if not all(extracted):
+                logging.error("Error copying the files. Did you use make-dirs?")
+            for ok, (_, _, file_aliases, bilkent_id) in zip(extracted, extractions):
+                if ok:
+                    confirmed.append((file_aliases, bilkent_id))
+        elif copy:
+            if file_transfer.wait():
+                logging.error("Error copying the files. Did you use make-dirs?")
+            for future, file_aliases, bilkent_id in copies:
+                if future.exception() is None:
+                    confirmed.append((file_aliases, bilkent_id))
         if moodle_dir:
             logging.info(
                 "The assignments directory was a moodle directory, matched also using the directory name."
             )
+
+    records = _log_collector.pop_records() if _log_collector else []
+    return records, confirmed
+
+
+def distribute_assignments(
+    students: Sequence[Student],
+    assignment_names: list[str],
+    copy: bool = False,
+    score_threshold: int = 35,
+    strategy: str = COPY,
+    verify: bool = False,
+    jobs: int = 1,
+    read_pdfs: bool = True,
+    zip_file: Path | None = None,
+) -> None:
+    """
+    Distributes assignments to students based on filename similarity.
+
+    Submissions whose content hash, Moodle directory name or file name was matched
+    before are resolved from the alias index, only the others are fuzzy matched. The
+    files are copied by a pool of threads, and the matches are recorded in the alias
+    index once their files are copied. With more than one job, the assignments are
+    distributed in parallel worker processes that share the roster index through the
+    pool initializer, and their logs are emitted in assignment order at the end.
+
+    Parameters:
+    -----------
+    students : sequence of Student objects
+        List of students in the class.
+    assignment_names : list of str
+        List of assignment names.
+    copy : bool, optional
+        Whether to copy the files to the students' directories.
+    score_threshold : int, optional
+        The minimum similarity score required for a match.
+    strategy : str, optional
+        How the files are put into the students' directories, one of the strategies
+        of `ta_workflow.transfer`.
+    verify : bool, optional
+        Whether to compare the checksums of the copies with the submissions.
+    jobs : int, optional
+        The number of worker processes.
+    read_pdfs : bool, optional
+        Whether to look for the bilkent id or name of the student in the first page
+        of the files whose filename score is below the threshold, and of the files
+        resolved from the alias index. The texts are cached by file hash.
+    zip_file : Path or None, optional
+        A Moodle "download all submissions" ZIP of the only selected assignment, to
+        distribute without extracting it first.
+
+    Raises:
+    -------
+    ValueError
+        If a ZIP is given for more or less than one assignment.
+
+    Returns:
+    --------
+    None
+    """
+    if zip_file is not None and len(assignment_names) != 1:
+        raise ValueError("Select exactly one assignment to distribute a ZIP")
+
+    # Normalize and index the student names once for every assignment
+    matcher = NameMatcher(students)
+    alias_index = AliasIndex()
+    students_by_id = {student.bilkent_id: student for student in students}
+    args = (copy, score_threshold, strategy, verify, read_pdfs, zip_file)
+    jobs = min(jobs, len(assignment_names))
+
+    if jobs <= 1:
+        init_distribute_worker(matcher, alias_index, collect_logs=False)
+        for assignment_name in assignment_names:
+            _, confirmed = distribute_assignment(assignment_name, *args)
+            for file_aliases, bilkent_id in confirmed:
+                alias_index.confirm(file_aliases, students_by_id[bilkent_id])
+            if copy:
+                alias_index.save()
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_distribute_worker,
+        initargs=(matcher, alias_index),
+    ) as executor:
+        futures = [
+            executor.submit(distribute_assignment, assignment_name, *args)
+            for assignment_name in assignment_names
+        ]
+        for future in futures:
+            records, confirmed = future.result()
+            for record in records:
+                logging.getLogger().handle(record)
+            for file_aliases, bilkent_id in confirmed:
+                alias_index.confirm(file_aliases, students_by_id[bilkent_id])
+    if copy:
+        alias_index.save()
+
+
+def snapshot_directory(assignment_dir: Path) -> dict[str, tuple]:
+    """
+    Takes a snapshot of the submissions in an assignment directory with os.scandir.
+
+    Parameters:
+    -----------
+    assignment_dir : Path
+        The assignment directory.
+
+    Returns:
+    --------
+    dict of str to tuple
+        The signature of every entry: the size and modification time of a PDF, or the
+        names, sizes and modification times of the PDFs in a subdirectory.
+    """
+    snapshot: dict[str, tuple] = {}
+    with os.scandir(assignment_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                with os.scandir(entry.path) as sub_entries:
+                    snapshot[entry.name] = tuple(
+                        sorted(
+                            (sub.name, sub.stat().st_size, sub.stat().st_mtime_ns)
+                            for sub in sub_entries
+                            if sub.is_file() and sub.name.endswith(".pdf")
+                        )
+                    )
+            elif entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def watch_assignments(
+    students: Sequence[Student],
+    assignment_names: list[str],
+    copy: bool = False,
+    score_threshold: int = 35,
+    strategy: str = COPY,
+    verify: bool = False,
+    read_pdfs: bool = True,
+    interval: float = WATCH_INTERVAL_IN_SECONDS,
+) -> None:
+    """
+    Distributes the submissions of the assignments as they arrive, until interrupted.
+
+    The roster and alias indexes stay in memory. Every interval the assignment
+    directories are listed with os.scandir, and the entries that are new or changed
+    since they were last distributed are matched and copied. An entry is only
+    distributed once it is the same in two listings in a row, so files that are still
+    being written are not copied half way. The entries already there when the watch
+    starts are not distributed again, and a student whose assignment directory has
+    files stays matched until one of those files is submitted again.
+
+    Parameters:
+    -----------
+    students : sequence of Student objects
+        List of students in the class.
+    assignment_names : list of str
+        List of assignment names.
+    copy : bool, optional
+        Whether to copy the files to the students' directories.
+    score_threshold : int, optional
+        The minimum similarity score required for a match.
+    strategy : str, optional
+        How the files are put into the students' directories.
+    verify : bool, optional
+        Whether to compare the checksums of the copies with the submissions.
+    read_pdfs : bool, optional
+        Whether to look for the students in the first pages of the files whose
+        filename score is below the threshold, and of the files resolved from the
+        alias index.
+    interval : float, optional
+        The seconds between two listings of the directories.
+
+    Returns:
+    --------
+    None
+    """
+    alias_index = AliasIndex()
+    init_distribute_worker(NameMatcher(students), alias_index, collect_logs=False)
+    students_by_id = {student.bilkent_id: student for student in students}
+    previous = {
+        name: snapshot_directory(PROJECT_ROOT / name) for name in assignment_names
+    }
+    distributed = {name: dict(snapshot) for name, snapshot in previous.items()}
+    # The files already copied count as exact matches
+    matched: dict[str, dict[Student, int]] = {
+        name: {
+            student: 100
+            for student in students
+            if any(student_assignment_dir(student, name).glob("*"))
+        }
+        for name in assignment_names
+    }
+    logging.info(f"Watching {', '.join(assignment_names)}, press Ctrl+C to stop")
+    try:
+        while True:
+            for assignment_name in assignment_names:
+                assignment_dir = PROJECT_ROOT / assignment_name
+                snapshot = snapshot_directory(assignment_dir)
+                settled = {
+                    name: signature
+                    for name, signature in snapshot.items()
+                    if previous[assignment_name].get(name) == signature
+                    and distributed[assignment_name].get(name) != signature
+                }
+                previous[assignment_name] = snapshot
+                if not settled:
+                    continue
+                # The student of a submission that changed is matched again
+                file_names = {
+                    sub[0] if isinstance(sub, tuple) else name
+                    for name, signature in settled.items()
+                    for sub in signature
+                }
+                for student in list(matched[assignment_name]):
+                    student_dir = student_assignment_dir(student, assignment_name)
+                    if any((student_dir / name).exists() for name in file_names):
+                        del matched[assignment_name][student]
+                _, confirmed = distribute_assignment(
+                    assignment_name,
+                    copy,
+                    score_threshold,
+                    strategy,
+                    verify,
+                    read_pdfs,
+                    entries=[assignment_dir / name for name in sorted(settled)],
+                    matched_students=matched[assignment_name],
+                )
+                distributed[assignment_name].update(settled)
+                for file_aliases, bilkent_id in confirmed:
+                    alias_index.confirm(file_aliases, students_by_id[bilkent_id])
+                if copy and confirmed:
+                    alias_index.save()
+            sleep(interval)
+    except KeyboardInterrupt:
+        logging.info("Stopped watching")
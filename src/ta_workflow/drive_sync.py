@@ -0,0 +1,128 @@
+"""Module for copying the feedback files that are too large to email to Google Drive."""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+
+from ta_workflow.config_parser import YAML_CONFIG
+from ta_workflow.transfer import COPY, file_digest, transfer_file
+
+DRIVE_SYNC_WORKERS = 4
+
+
+def sync_file(source: Path, destination_dir: Path) -> int:
+    """Copies a file into a directory unless an identical copy is already there.
+
+    The copy is skipped when the destination has the same size and contents. The size
+    is compared first, so only files that may be unchanged are hashed. The copy is
+    renamed over the destination when it is complete, so the Drive client never
+    uploads a half-written file.
+
+    Args:
+        source (Path): path of the file
+        destination_dir (Path): path of the directory to copy into
+
+    Returns:
+        int: the number of bytes copied, 0 if the copy was skipped
+    """
+    destination = destination_dir / source.name
+    size = source.stat().st_size
+    if (
+        destination.exists()
+        and destination.stat().st_size == size
+        and file_digest(destination) == file_digest(source)
+    ):
+        return 0
+    destination_dir.mkdir(parents=True, exist_ok=True)
+    return transfer_file(source, destination, COPY)
+
+
+class DriveSync:
+    """
+    A background queue that copies files into the Google Drive folder.
+
+    Files are copied by a pool of worker threads, so the email workers only enqueue
+    them and never wait on Drive I/O. Files that are already in the Drive folder with
+    the same contents are not copied again, so rerunning is cheap.
+    """
+
+    def __init__(
+        self,
+        google_drive_path: Path | None = None,
+        workers: int = DRIVE_SYNC_WORKERS,
+    ) -> None:
+        self.google_drive_path = (
+            (google_drive_path or Path(YAML_CONFIG.google_drive_path))
+            .expanduser()
+            .resolve()
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="drive"
+        )
+        self._futures: list[Future[int]] = []
+        self._lock = threading.Lock()
+        self.copied_files = 0
+        self.skipped_files = 0
+        self.copied_bytes = 0
+
+    def __enter__(self) -> "DriveSync":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None:
+            self.wait()
+        self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+
+    def _sync(self, source: Path, destination_dir: Path) -> int:
+        copied = sync_file(source, destination_dir)
+        with self._lock:
+            if copied:
+                self.copied_files += 1
+                self.copied_bytes += copied
+            else:
+                self.skipped_files += 1
+        return copied
+
+    def submit(self, files_path: list[str], folder: Path) -> None:
+        """Queues files to be copied into a folder of the Google Drive folder.
+
+        Args:
+            files_path (list[str]): list of file paths to be copied
+            folder (Path): the destination, relative to the Google Drive folder
+        """
+        destination_dir = self.google_drive_path / folder
+        with self._lock:
+            self._futures.extend(
+                self._executor.submit(self._sync, Path(file), destination_dir)
+                for file in files_path
+            )
+
+    def wait(self) -> int:
+        """Waits for every queued file and logs the transferred bytes.
+
+        Returns:
+            int: the number of files that could not be copied
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        if not futures:
+            return 0
+        failed = 0
+        for future in futures:
+            try:
+                future.result()
+            except OSError as e:
+                failed += 1
+                logging.error(f"Could not copy a file to Google Drive: {e!r}")
+        logging.info(
+            f"Copied {self.copied_files} files ({self.copied_bytes / 2**20:.1f} MB) "
+            f"to {self.google_drive_path}, {self.skipped_files} were already there"
+        )
+        return failed
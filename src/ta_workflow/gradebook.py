@@ -0,0 +1,159 @@
+"""Module for the in-memory grade book shared by the commands that read grades."""
+
+import logging
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from ta_workflow.roster_cache import read_student_data
+
+
+def get_cols_after(df: pd.DataFrame, col_name: str) -> pd.Index:
+    """
+    Get the columns after the given column.
+
+    Args:
+        df (pd.DataFrame): The dataframe to get the columns from.
+
+    Returns:
+        pd.Index: The columns after the given column.
+    """
+    return df.columns[df.columns.get_loc(col_name) + 1 :]  # type: ignore
+
+
+class GradeBook:
+    """
+    The grades of every student for every assignment, loaded once.
+
+    Grades are kept in a dense students x assignments float array, with hash indexes
+    from bilkent_id to row and from assignment name to column, so a single grade is
+    an O(1) lookup and a whole assignment is a vectorized column access.
+
+    Attributes:
+    -----------
+    bilkent_ids : list of str
+        The bilkent ids of the students, in row order.
+    assignments : list of str
+        The assignment names, in column order.
+    grades : np.ndarray
+        The students x assignments grade array.
+    """
+
+    def __init__(
+        self, bilkent_ids: Iterable, assignments: Iterable[str], grades: np.ndarray
+    ) -> None:
+        self.bilkent_ids = [str(bilkent_id) for bilkent_id in bilkent_ids]
+        self.assignments = list(assignments)
+        self.grades = np.asarray(grades, dtype=float)
+        self._rows = {bilkent_id: i for i, bilkent_id in enumerate(self.bilkent_ids)}
+        self._columns = {assignment: j for j, assignment in enumerate(self.assignments)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "GradeBook":
+        """
+        Builds the grade book from the student data, grades are the columns after email.
+
+        Cells that are not numbers, e.g. a note typed into a grade column, are logged
+        and read as missing grades.
+
+        Args:
+            df (pd.DataFrame): The fixed student data with the grade columns.
+
+        Returns:
+            GradeBook: The grade book.
+        """
+        assignments = get_cols_after(df, "email")
+        bilkent_ids = df["bilkent_id"].astype("int64")
+        grades = df[assignments].apply(pd.to_numeric, errors="coerce")
+        not_numbers = grades.isna() & df[assignments].notna()
+        for row, assignment in zip(*np.nonzero(not_numbers.to_numpy())):
+            logging.warning(
+                f"The {assignments[assignment]} grade of {bilkent_ids.iloc[row]} is "
+                f"not a number: {df[assignments].iat[row, assignment]!r}"
+            )
+        return cls(bilkent_ids, assignments, grades.to_numpy(dtype=float))
+
+    def grade(self, bilkent_id: str, assignment: str) -> float:
+        """
+        Get the grade of a student for an assignment.
+
+        Args:
+            bilkent_id (str): The bilkent id of the student.
+            assignment (str): The assignment name.
+
+        Returns:
+            float: The grade.
+        """
+        return float(self.grades[self._rows[bilkent_id], self._columns[assignment]])
+
+    def rows(self, bilkent_ids: Iterable[str]) -> np.ndarray:
+        """
+        Get the row indexes of the given students.
+
+        Args:
+            bilkent_ids (Iterable[str]): The bilkent ids of the students.
+
+        Returns:
+            np.ndarray: The row indexes, in the given order.
+        """
+        return np.fromiter((self._rows[i] for i in bilkent_ids), dtype=np.intp)
+
+    def columns(self, assignments: Iterable[str]) -> np.ndarray:
+        """
+        Get the column indexes of the given assignments.
+
+        Args:
+            assignments (Iterable[str]): The assignment names.
+
+        Returns:
+            np.ndarray: The column indexes, in the given order.
+        """
+        return np.fromiter((self._columns[a] for a in assignments), dtype=np.intp)
+
+    def column(self, assignment: str) -> np.ndarray:
+        """
+        Get the grades of every student for an assignment.
+
+        Args:
+            assignment (str): The assignment name.
+
+        Returns:
+            np.ndarray: The grades, in row order.
+        """
+        return self.grades[:, self._columns[assignment]]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Get the grades as a dataframe indexed by bilkent id.
+
+        Returns:
+            pd.DataFrame: The grades with one column per assignment.
+        """
+        return pd.DataFrame(
+            self.grades,
+            index=pd.Index(self.bilkent_ids, name="bilkent_id"),
+            columns=self.assignments,
+        )
+
+    def describe(self, assignment: str) -> pd.Series:
+        """
+        Get the summary statistics of an assignment.
+
+        Args:
+            assignment (str): The assignment name.
+
+        Returns:
+            pd.Series: The output of pandas describe for the grades of the assignment.
+        """
+        return pd.Series(self.column(assignment), name=assignment).describe()
+
+
+def load_gradebook() -> GradeBook:
+    """
+    Reads the fixed student data file into a grade book.
+
+    Returns:
+        GradeBook: The grade book.
+    """
+    return GradeBook.from_frame(read_student_data())
@@ -1,91 +1,276 @@
+import hashlib
+import json
 import logging
-import subprocess
-import sys
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Sequence
 
+import numpy as np
 import pandas as pd  # type: ignore
 
-from ta_workflow.config_parser import YAML_CONFIG
-from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.gradebook import load_gradebook
+from ta_workflow.path import OUTPUT_PATH, PROJECT_ROOT
 from ta_workflow.student import Student
+from ta_workflow.transfer import SYMLINK, file_digest, transfer_file
 
 pd.options.io.excel.xls.writer = (
     "xlwt"  # set the option to 'xlwt' to suppress the .xls warning
 )
 
-OS = "windows-based" if sys.platform.startswith("win") else "unix-based"
+# The file formats of the exports, AIRS wants .xls, other systems take .csv or .xlsx
+EXPORT_FORMATS = ("xls", "csv", "xlsx")
+
+EXPORT_MANIFEST_PATH: Path = PROJECT_ROOT / "export_manifest.json"
+
+
+def grades_digest(bilkent_ids: list[str], grades: np.ndarray) -> str:
+    """
+    Hashes the grades of an assignment.
+
+    Parameters:
+    -----------
+    bilkent_ids : list of str
+        The bilkent ids of the students.
+    grades : np.ndarray
+        The grades of the students, in the same order.
+
+    Returns:
+    --------
+    str
+        The hex digest of the bilkent ids and the grades.
+    """
+    digest = hashlib.sha256("\n".join(bilkent_ids).encode())
+    digest.update(np.ascontiguousarray(grades, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class ExportManifest:
+    """
+    The hashes of the grades every exported file was written from and of the file.
+
+    A file is current when the grades it would be written from have not changed and
+    the file still has the contents it was written with, so it is not written again.
+
+    Attributes:
+    -----------
+    path : Path
+        The path of the JSON file of the manifest.
+    files : dict of str to dict of str to str
+        The grades and file hashes of every exported file name.
+    """
+
+    def __init__(self, path: Path = EXPORT_MANIFEST_PATH) -> None:
+        self.path = path
+        try:
+            with path.open() as fp:
+                self.files: dict[str, dict[str, str]] = json.load(fp)
+        except FileNotFoundError:
+            self.files = {}
+
+    def is_current(self, file_path: Path, grades_hash: str) -> bool:
+        """
+        Checks whether a file was written from the given grades and is unchanged.
+
+        Parameters:
+        -----------
+        file_path : Path
+            The path of the exported file.
+        grades_hash : str
+            The hash of the grades the file would be written from.
+
+        Returns:
+        --------
+        bool
+            True if the file does not need to be written again.
+        """
+        entry = self.files.get(file_path.name)
+        return (
+            entry is not None
+            and entry["grades"] == grades_hash
+            and file_path.exists()
+            and file_digest(file_path) == entry["file"]
+        )
+
+    def record(self, file_path: Path, grades_hash: str) -> None:
+        """
+        Records the hashes of a written file.
+
+        Parameters:
+        -----------
+        file_path : Path
+            The path of the exported file.
+        grades_hash : str
+            The hash of the grades the file was written from.
+
+        Returns:
+        --------
+        None
+        """
+        self.files[file_path.name] = {
+            "grades": grades_hash,
+            "file": file_digest(file_path),
+        }
+
+    def save(self) -> None:
+        """
+        Writes the manifest to its JSON file, replacing the previous version atomically.
+
+        Returns:
+        --------
+        None
+        """
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with tmp_path.open("w") as fp:
+            json.dump(self.files, fp, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def write_grades(
+    assignment: str, bilkent_ids: list[str], grades: np.ndarray, file_format: str
+) -> Path:
+    """
+    Writes the grades of an assignment to a headerless bilkent id, grade file.
+
+    Runs in worker processes.
+
+    Parameters:
+    -----------
+    assignment : str
+        The assignment name, also the name of the file.
+    bilkent_ids : list of str
+        The bilkent ids of the students.
+    grades : np.ndarray
+        The grades of the students, in the same order.
+    file_format : str
+        One of EXPORT_FORMATS.
+
+    Returns:
+    --------
+    Path
+        The path of the file in the project root.
+    """
+    original_file = (PROJECT_ROOT / f"{assignment}.{file_format}").resolve()
+    assignment_data = pd.DataFrame(grades, index=bilkent_ids)
+    if file_format == "csv":
+        assignment_data.to_csv(original_file, header=False)
+    else:
+        assignment_data.to_excel(str(original_file), header=False)
+    return original_file
 
 
 def grades_to_excel(
-    students: list[Student], assignment_names: list[str], sym_link: bool = True
+    students: Sequence[Student],
+    assignment_names: list[str],
+    sym_link: bool = True,
+    formats: tuple[str, ...] = ("xls",),
+    workers: int | None = None,
+    force: bool = False,
+    manifest_path: Path = EXPORT_MANIFEST_PATH,
 ) -> None:
     """
     Creates an Excel file with the grades for each assignment.
 
+    The grades of every selected assignment are taken from the grade book in one
+    vectorized lookup, and the files are written concurrently in worker processes.
+    Files whose grades did not change since they were written are skipped, see
+    ExportManifest.
+
     Parameters:
     -----------
-    students : list of Student objects
+    students : sequence of Student objects
         List of students in the class.
     assignment_names : list of str
         List of assignment names.
     sym_link : bool, optional
         Whether to create a symbolic link to the Excel file in the outputs directory.
+    formats : tuple of str, optional
+        The formats to write every assignment in, see EXPORT_FORMATS. Defaults to xls.
+    workers : int or None, optional
+        The number of worker processes, 1 writes in this process. Defaults to None,
+        which uses every core.
+    force : bool, optional
+        Whether to write the files whose grades did not change too.
+    manifest_path : Path, optional
+        The path of the export manifest.
+
+    Raises:
+    -------
+    ValueError
+        If a format is unknown.
 
     Returns:
     --------
     None
     """
-
-    # Read the fixed student data from the Excel file
-    df = pd.read_excel(
-        PROJECT_ROOT
-        / (YAML_CONFIG.student_data_file_name.split(".")[0] + "_fixed.xlsx")
-    )
-
-    # Iterate over the assignment names and create an Excel file for each assignment
-    for assignment in assignment_names:
-        # Create a dictionary of bilkent IDs mapped to grades for the current assignment
-        assignment_data = {}
-        for student in students:
-            student_grade = df[df["bilkent_id"] == int(student.bilkent_id)][
-                assignment
-            ].values[0]
-            assignment_data[student.bilkent_id] = round(student_grade, 2)
-
-        # Write the dictionary to an Excel file with the assignment name
-        original_file = PROJECT_ROOT / f"{assignment}.xls"  # AIRS want .xls not .xlsx
-        sym_link_to_original = (
-            Path(__file__).parents[2] / "outputs" / f"{assignment}.xls"
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(
+            f"Unknown export formats {sorted(unknown)}, use {EXPORT_FORMATS}"
         )
-        pd.DataFrame.from_dict(assignment_data, orient="index").to_excel(
-            str(original_file.resolve()), header=False
+
+    # Read the grades once and take the selected assignments of the students at once
+    gradebook = load_gradebook()
+    bilkent_ids = [student.bilkent_id for student in students]
+    rows = gradebook.rows(bilkent_ids)
+    columns = gradebook.columns(assignment_names)
+    grades = gradebook.grades[np.ix_(rows, columns)].round(2)
+
+    # Write the files of the assignments whose grades changed, concurrently
+    manifest = ExportManifest(manifest_path)
+    grades_hashes = [
+        grades_digest(bilkent_ids, grades[:, j]) for j in range(len(assignment_names))
+    ]
+    exports, exports_hash, skipped = [], [], []
+    for j, assignment in enumerate(assignment_names):
+        for file_format in formats:
+            original_file = (PROJECT_ROOT / f"{assignment}.{file_format}").resolve()
+            if not force and manifest.is_current(original_file, grades_hashes[j]):
+                skipped.append((assignment, original_file))
+                continue
+            exports.append((assignment, bilkent_ids, grades[:, j], file_format))
+            exports_hash.append(grades_hashes[j])
+    if workers == 1 or len(exports) <= 1:
+        written = [write_grades(*export) for export in exports]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            written = list(executor.map(write_grades, *zip(*exports)))
+    for original_file, grades_hash in zip(written, exports_hash):
+        manifest.record(original_file, grades_hash)
+    manifest.save()
+    if skipped:
+        logging.info(
+            f"Skipped {len(skipped)} files whose grades did not change: "
+            + ", ".join(original_file.name for _, original_file in skipped)
         )
-        logging.info(f"Created excel for {assignment} at {original_file.resolve()}")
 
-        # If sym_link is True, create a symbolic link to the Excel file in the outputs directory
+    # Link the written files, and the skipped files whose link is missing
+    links = [
+        (assignment, original_file)
+        for (assignment, *_), original_file in zip(exports, written)
+    ]
+    links += [
+        (assignment, original_file)
+        for assignment, original_file in skipped
+        if sym_link and not (OUTPUT_PATH / original_file.name).is_symlink()
+    ]
+    for assignment, original_file in links:
+        if original_file in written:
+            logging.info(
+                f"Created {original_file.suffix[1:]} for {assignment} at {original_file}"
+            )
+
+        # If sym_link is True, create a symbolic link to the file in the outputs directory
         if sym_link:
-            if OS == "windows-based":
-                subprocess.run(
-                    [
-                        "mklink",
-                        str(sym_link_to_original.resolve()),
-                        str(original_file.resolve()),
-                    ],
-                    check=False,
-                )
+            sym_link_to_original = OUTPUT_PATH / original_file.name
+            try:
+                transfer_file(original_file, sym_link_to_original, SYMLINK)
+            except OSError as e:  # e.g. Windows without the symlink privilege
+                logging.error(f"Could not create symbolic link for {assignment}: {e}")
             else:
-                subprocess.run(
-                    [
-                        "ln",
-                        "-s",
-                        str(original_file.resolve()),
-                        str(sym_link_to_original.resolve()),
-                    ],
-                    check=False,
+                logging.info(
+                    f"Created symbolic link for {assignment} at {sym_link_to_original}"
                 )
-            logging.info(
-                f"Created symbolic link for {assignment} at {sym_link_to_original}"
-            )
 
         # If sym_link is False, log a message indicating that no symbolic link was created
         else:
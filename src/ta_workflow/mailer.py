@@ -0,0 +1,676 @@
+"""Module for long-lived SMTP sessions, streamed messages and rate limited concurrent email dispatch."""
+
+import base64
+import hashlib
+import logging
+import math
+import mmap
+import os
+import re
+import smtplib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.policy import SMTP
+from pathlib import Path
+from time import monotonic, sleep
+from types import TracebackType
+from typing import BinaryIO, Callable, Concatenate, Iterator, ParamSpec
+from uuid import uuid4
+
+DEFAULT_SERVER_NAME = "asmtp.bilkent.edu.tr"
+# Reply codes the server uses to tell us to slow down
+THROTTLING_CODES = frozenset({421, 450, 451, 452})
+MAX_THROTTLED_ATTEMPTS = 5
+# Reply code and enhanced status codes of messages larger than the server accepts
+MESSAGE_TOO_LARGE_CODE = 552
+MESSAGE_TOO_LARGE_PATTERN = re.compile(rb"\b5\.(?:3\.4|2\.3)\b")
+# base64 encodes every 57 bytes into one 76 character line
+BASE64_LINE_IN_BYTES = 57
+BASE64_CHUNK_IN_BYTES = BASE64_LINE_IN_BYTES * 4096
+
+P = ParamSpec("P")
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously at `rate` tokens per second.
+
+    The bucket starts full, so up to `capacity` emails can go out back to back.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+
+    def try_acquire(self) -> float:
+        """Takes a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Gates outgoing emails with a per-minute and an optional per-hour quota.
+
+    The limiter is adaptive: when the server answers with a throttling code the
+    per-minute rate is halved and every sender pauses, and each successful send
+    afterwards recovers the rate step by step until the configured quota is reached.
+    """
+
+    def __init__(
+        self,
+        emails_per_minute: float,
+        emails_per_hour: float | None = None,
+        initial_backoff_in_seconds: float = 30,
+    ) -> None:
+        self.emails_per_minute = emails_per_minute
+        self.initial_backoff_in_seconds = initial_backoff_in_seconds
+        self._minute_bucket = TokenBucket(emails_per_minute / 60, emails_per_minute)
+        self._hour_bucket = (
+            TokenBucket(emails_per_hour / 3600, emails_per_hour)
+            if emails_per_hour
+            else None
+        )
+        self._paused_until = 0.0
+        self._consecutive_backoffs = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until both quotas allow one more email."""
+        for bucket in filter(None, (self._hour_bucket, self._minute_bucket)):
+            while True:
+                with self._lock:
+                    pause = self._paused_until - monotonic()
+                if pause > 0:
+                    sleep(pause)
+                    continue
+                wait = bucket.try_acquire()
+                if not wait:
+                    break
+                sleep(wait)
+
+    def back_off(self) -> float:
+        """Halves the per-minute rate and pauses every sender, exponentially longer on repeats.
+
+        Returns:
+            float: the pause in seconds
+        """
+        with self._lock:
+            pause = self.initial_backoff_in_seconds * 2**self._consecutive_backoffs
+            self._consecutive_backoffs += 1
+            self._paused_until = max(self._paused_until, monotonic() + pause)
+            self._minute_bucket.rate = max(
+                self._minute_bucket.rate / 2, 1 / 3600
+            )  # never below one email per hour
+        logging.warning(
+            f"Server is throttling, pausing for {pause:.0f} seconds and slowing down to "
+            f"{self._minute_bucket.rate * 60:.2f} emails per minute"
+        )
+        return pause
+
+    def record_success(self) -> None:
+        """Recovers the per-minute rate after a successful send."""
+        with self._lock:
+            self._consecutive_backoffs = 0
+            nominal_rate = self.emails_per_minute / 60
+            if self._minute_bucket.rate < nominal_rate:
+                self._minute_bucket.rate = min(
+                    nominal_rate, self._minute_bucket.rate + nominal_rate / 10
+                )
+
+
+def is_message_too_large(e: smtplib.SMTPResponseException) -> bool:
+    """Tells whether the server refused a message because of its size.
+
+    Args:
+        e (smtplib.SMTPResponseException): the refusal, e.g. to MAIL FROM with SIZE or to DATA
+
+    Returns:
+        bool: True for 552 replies and 5.3.4 or 5.2.3 enhanced status codes, False for throttling and other failures
+    """
+    reply = (
+        e.smtp_error if isinstance(e.smtp_error, bytes) else str(e.smtp_error).encode()
+    )
+    return (
+        e.smtp_code == MESSAGE_TOO_LARGE_CODE
+        or MESSAGE_TOO_LARGE_PATTERN.search(reply) is not None
+    )
+
+
+def throttling_code(
+    e: "smtplib.SMTPResponseException | smtplib.SMTPRecipientsRefused",
+) -> int | None:
+    """Tells whether the server refused an email to slow us down.
+
+    Args:
+        e (smtplib.SMTPResponseException | smtplib.SMTPRecipientsRefused): the refusal
+
+    Returns:
+        int | None: the throttling reply code, or None if the refusal is not throttling
+    """
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code if e.smtp_code in THROTTLING_CODES else None
+    codes = {code for code, _ in e.recipients.values()}
+    if not codes or not codes <= THROTTLING_CODES:
+        return None
+    return 421 if 421 in codes else min(codes)
+
+
+class SMTPSession:
+    """
+    An authenticated SMTP connection that is opened once and reused for every email.
+
+    The connection is opened lazily on the first send and is transparently
+    re-established if the server drops it. When the server advertises the ESMTP
+    PIPELINING extension, the envelope commands are sent in a single round trip.
+    """
+
+    def __init__(
+        self,
+        user: str,
+        password: str,
+        server_name: str = DEFAULT_SERVER_NAME,
+        port: int = 465,
+        rate_limiter: RateLimiter | None = None,
+    ) -> None:
+        self.user = user
+        self.password = password
+        self.server_name = server_name
+        self.port = port
+        self.rate_limiter = rate_limiter
+        self._server: smtplib.SMTP_SSL | None = None
+
+    def __enter__(self) -> "SMTPSession":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def connect(self) -> smtplib.SMTP_SSL:
+        """Opens (or reopens) the connection and logs in.
+
+        Returns:
+            smtplib.SMTP_SSL: the connected server
+        """
+        self.close()
+        if self.server_name == "localhost":  # local server, no login needed
+            server = smtplib.SMTP_SSL(self.server_name)
+            server.ehlo()
+        else:
+            server = smtplib.SMTP_SSL(self.server_name, self.port)
+            server.ehlo()
+            server.login(self.user, self.password)
+        self._server = server
+        return server
+
+    def close(self) -> None:
+        """Closes the connection if it is open."""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except OSError:  # the server may already have closed the connection
+            pass
+        finally:
+            self._server = None
+
+    def sendmail(
+        self,
+        from_addr: str,
+        to_addr: list[str],
+        message: "str | bytes | MIMEStream | SpooledMessage",
+    ) -> None:
+        """Sends a serialized or streamed message.
+
+        If the session has a rate limiter, a token is taken before every attempt and
+        throttling replies are retried after backing off.
+
+        Args:
+            from_addr (str): from address
+            to_addr (list[str]): to address
+            message (str | bytes | MIMEStream | SpooledMessage): the serialized or streamed message
+        """
+        for attempt in range(1, MAX_THROTTLED_ATTEMPTS + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                self._sendmail(from_addr, to_addr, message)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                code = throttling_code(e)
+                if (
+                    self.rate_limiter is None
+                    or code is None
+                    or attempt == MAX_THROTTLED_ATTEMPTS
+                ):
+                    raise
+                if code == 421:  # the server closes the connection on 421
+                    self.close()
+                self.rate_limiter.back_off()
+            else:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.record_success()
+                return
+
+    def _sendmail(
+        self,
+        from_addr: str,
+        to_addr: list[str],
+        message: "str | bytes | MIMEStream | SpooledMessage",
+    ) -> None:
+        """Sends the message, reconnecting once if the connection was dropped.
+
+        Args:
+            from_addr (str): from address
+            to_addr (list[str]): to address
+            message (str | bytes | MIMEStream | SpooledMessage): the serialized or streamed message
+        """
+        for attempt in range(2):
+            server = self._server or self.connect()
+            try:
+                if not isinstance(message, (str, bytes)):
+                    self._envelope(server, from_addr, to_addr, len(message))
+                    self._stream_data(server, message)
+                elif server.has_extn("pipelining"):
+                    self._envelope(server, from_addr, to_addr, len(message))
+                    code, reply = server.data(message)
+                    if code != 250:
+                        self._refuse_data(server, code, reply)
+                else:
+                    server.sendmail(from_addr, to_addr, message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt:
+                    raise
+                logging.warning(f"Lost connection to {self.server_name}, reconnecting")
+
+    @staticmethod
+    def _envelope(
+        server: smtplib.SMTP, from_addr: str, to_addr: list[str], size: int
+    ) -> None:
+        """Sends MAIL FROM and RCPT TO, in one write if the server supports PIPELINING.
+
+        Args:
+            server (smtplib.SMTP): a connected server
+            from_addr (str): from address
+            to_addr (list[str]): to address
+            size (int): the size of the message in bytes
+        """
+        mail_options = ""
+        if server.has_extn("size"):
+            mail_options = f" size={size}"
+        commands = [f"mail FROM:{smtplib.quoteaddr(from_addr)}{mail_options}"]
+        commands += [f"rcpt TO:{smtplib.quoteaddr(addr)}" for addr in to_addr]
+        pipelining = server.has_extn("pipelining")
+        if pipelining:
+            server.send("".join(f"{command}\r\n" for command in commands))
+        # Every pipelined command gets a reply, read them all before acting on them
+        replies: list[tuple[int, bytes]] = []
+        for command in commands:
+            if not pipelining:
+                server.putcmd(command)
+            replies.append(server.getreply())
+            if replies[-1][0] == 421:
+                # The server closes the connection after a 421, so no RSET
+                server.close()
+                raise smtplib.SMTPSenderRefused(421, replies[-1][1], from_addr)
+            if not pipelining and replies[0][0] != 250:  # no point in sending RCPT TO
+                break
+
+        mail_code, mail_reply = replies[0]
+        if mail_code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(mail_code, mail_reply, from_addr)
+        refused = {
+            addr: reply
+            for addr, reply in zip(to_addr, replies[1:])
+            if reply[0] not in (250, 251)
+        }
+        if len(refused) == len(to_addr):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)  # type: ignore[arg-type]
+
+    @staticmethod
+    def _stream_data(
+        server: smtplib.SMTP, message: "MIMEStream | SpooledMessage"
+    ) -> None:
+        """Sends DATA and writes the message to the socket chunk by chunk.
+
+        Args:
+            server (smtplib.SMTP): a connected server that accepted the envelope
+            message (MIMEStream | SpooledMessage): the streamed message
+        """
+        server.putcmd("data")
+        code, reply = server.getreply()
+        if code != 354:
+            SMTPSession._refuse_data(server, code, reply)
+        for chunk in message:
+            server.send(chunk)
+        server.send(b".\r\n")
+        code, reply = server.getreply()
+        if code != 250:
+            SMTPSession._refuse_data(server, code, reply)
+
+    @staticmethod
+    def _refuse_data(server: smtplib.SMTP, code: int, reply: bytes) -> None:
+        """Resets the transaction, or drops the connection on 421, and raises.
+
+        Args:
+            server (smtplib.SMTP): a connected server
+            code (int): the reply code
+            reply (bytes): the reply message
+
+        Raises:
+            smtplib.SMTPDataError: always
+        """
+        if code == 421:  # the server closes the connection after a 421
+            server.close()
+        else:
+            server.rset()
+        raise smtplib.SMTPDataError(code, reply)
+
+
+class EncodedAttachment:
+    """
+    A file encoded once into a MIME attachment part, to be attached to many messages.
+
+    Used for the files every student gets, e.g. the solutions, so they are read and
+    base64 encoded once per run instead of once per email.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.part = _attachment_head(file_path) + b"".join(_iter_base64(file_path))
+        self.digest = hashlib.sha256(self.part).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.part)
+
+
+class MIMEStream:
+    """
+    A MIME message whose attachments are base64 encoded chunk by chunk while it is sent.
+
+    The text part and the headers are serialized once with the SMTP policy. The files
+    are memory-mapped and encoded in chunks of whole lines, so the memory used does not
+    grow with the size of the attachments. Already encoded shared attachments are
+    spliced in as they are. Iterating yields the message as CRLF terminated,
+    dot-stuffed bytes that can be written to the socket after DATA, and the message
+    can be iterated again if it has to be resent.
+    """
+
+    def __init__(
+        self,
+        message: MIMEMultipart,
+        files_path: list[str] | None = None,
+        shared_attachments: list[EncodedAttachment] | None = None,
+    ) -> None:
+        self.files_path = files_path or []
+        self.shared_attachments = shared_attachments or []
+        boundary = f"==============={uuid4().hex}=="
+        message.set_boundary(boundary)
+        head = message.as_bytes(policy=SMTP)
+        self._delimiter = f"--{boundary}\r\n".encode()
+        self._closing_delimiter = f"--{boundary}--\r\n".encode()
+        # Attachments go between the text part and the closing delimiter
+        self._raw_head = head.removesuffix(self._closing_delimiter)
+        self._head = _dot_stuff(self._raw_head)
+        self._part_heads = [
+            self._delimiter + _attachment_head(file_path)
+            for file_path in self.files_path
+        ]
+
+    def __len__(self) -> int:
+        size = len(self._head) + len(self._closing_delimiter)
+        for shared_attachment in self.shared_attachments:
+            size += len(self._delimiter) + len(shared_attachment)
+        for file_path, part_head in zip(self.files_path, self._part_heads):
+            full_lines, rest = divmod(os.path.getsize(file_path), BASE64_LINE_IN_BYTES)
+            size += len(part_head) + full_lines * 78
+            if rest:
+                size += 4 * math.ceil(rest / 3) + 2
+        return size
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        yield from self._iter_attachments()
+
+    def write(self, fp: BinaryIO) -> None:
+        """Writes the message as it is, without dot-stuffing, e.g. to a mailbox file.
+
+        Args:
+            fp (BinaryIO): the file to write to
+        """
+        fp.write(self._raw_head)
+        for chunk in self._iter_attachments():
+            fp.write(chunk)
+
+    def _iter_attachments(self) -> Iterator[bytes]:
+        """Yields the attachment parts and the closing delimiter, which need no dot-stuffing."""
+        for shared_attachment in self.shared_attachments:
+            yield self._delimiter
+            yield shared_attachment.part
+        for file_path, part_head in zip(self.files_path, self._part_heads):
+            yield part_head
+            yield from _iter_base64(file_path)
+        yield self._closing_delimiter
+
+
+class SpooledMessage:
+    """
+    A message that was already rendered to a file, streamed from disk when it is sent.
+
+    Iterating yields the file in chunks of whole CRLF terminated lines, dot-stuffed so
+    they can be written to the socket after DATA. The headers starting with
+    private_header_prefix are left out, so the length is an upper bound.
+    """
+
+    def __init__(self, path: Path, private_header_prefix: str | None = None) -> None:
+        self.path = path
+        self.private_header_prefix = private_header_prefix
+
+    def __len__(self) -> int:
+        return self.path.stat().st_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        remainder = b""
+        with self.path.open("rb") as fp:
+            if self.private_header_prefix is not None:
+                yield _dot_stuff(
+                    _drop_headers(fp, self.private_header_prefix.lower().encode())
+                )
+            while chunk := fp.read(BASE64_CHUNK_IN_BYTES):
+                # Only whole lines are yielded, the rest waits for the next chunk
+                lines, newline, remainder = (remainder + chunk).rpartition(b"\n")
+                if newline:
+                    yield _dot_stuff(lines + newline)
+        if remainder:
+            yield _dot_stuff(remainder + b"\r\n")
+
+
+def _drop_headers(fp: BinaryIO, prefix: bytes) -> bytes:
+    """Reads the headers of a message, leaving out the ones whose names start with a prefix.
+
+    Args:
+        fp (BinaryIO): the message, at its start
+        prefix (bytes): the lowercase prefix of the names of the headers to leave out
+
+    Returns:
+        bytes: the other headers and the blank line after them
+    """
+    kept = []
+    dropping = False
+    for line in fp:
+        if not line.strip():
+            kept.append(line)
+            break
+        # Folded lines continue the header above them
+        if not line[:1].isspace():
+            dropping = line.lower().startswith(prefix)
+        if not dropping:
+            kept.append(line)
+    return b"".join(kept)
+
+
+def _dot_stuff(data: bytes) -> bytes:
+    """Doubles the periods at the start of lines, as SMTP DATA requires.
+
+    Args:
+        data (bytes): whole lines of a message
+
+    Returns:
+        bytes: the dot-stuffed lines
+    """
+    return re.sub(rb"(?m)^\.", b"..", data)
+
+
+def _attachment_head(file_path: str) -> bytes:
+    """Serializes the headers of an attachment part.
+
+    Args:
+        file_path (str): path of the attached file
+
+    Returns:
+        bytes: the headers followed by the blank line that separates them from the payload
+    """
+    part = MIMEBase("application", "octet-stream")
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header(
+        "Content-Disposition", "attachment; filename= %s" % Path(file_path).name
+    )
+    return part.as_bytes(policy=SMTP)
+
+
+def _iter_base64(file_path: str) -> Iterator[bytes]:
+    """Reads a memory-mapped file and yields it base64 encoded in CRLF terminated lines.
+
+    Args:
+        file_path (str): path of the file
+
+    Yields:
+        bytes: an encoded chunk of whole lines
+    """
+    if os.path.getsize(file_path) == 0:
+        return
+    with open(file_path, "rb") as fp, mmap.mmap(
+        fp.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
+        for offset in range(0, len(mapped_file), BASE64_CHUNK_IN_BYTES):
+            chunk = mapped_file[offset : offset + BASE64_CHUNK_IN_BYTES]
+            yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+
+class EmailDispatcher:
+    """
+    Sends emails concurrently from a pool of worker threads.
+
+    Every worker owns its own SMTPSession, and all sessions share one RateLimiter so
+    the pool as a whole stays within the quota of the relay.
+    """
+
+    def __init__(
+        self,
+        user: str,
+        password: str,
+        rate_limiter: RateLimiter,
+        workers: int = 1,
+        server_name: str = DEFAULT_SERVER_NAME,
+    ) -> None:
+        self.user = user
+        self.password = password
+        self.rate_limiter = rate_limiter
+        self.server_name = server_name
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="email"
+        )
+        self._local = threading.local()
+        self._sessions: list[SMTPSession] = []
+        self._sessions_lock = threading.Lock()
+        self._futures: list[Future[None]] = []
+
+    def __enter__(self) -> "EmailDispatcher":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        # On Ctrl-C do not start the emails that are still waiting in the queue
+        self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+        for session in self._sessions:
+            session.close()
+
+    def _session(self) -> SMTPSession:
+        """Returns the session of the current worker thread, creating it on first use."""
+        session: SMTPSession | None = getattr(self._local, "session", None)
+        if session is None:
+            session = SMTPSession(
+                self.user,
+                self.password,
+                self.server_name,
+                rate_limiter=self.rate_limiter,
+            )
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def submit(
+        self,
+        job: Callable[Concatenate[SMTPSession, P], None],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> "Future[None]":
+        """Schedules `job(session, *args, **kwargs)` on a worker.
+
+        Args:
+            job (Callable): the function that sends the email(s) using the given session
+
+        Returns:
+            Future[None]: the future of the job
+        """
+        future = self._executor.submit(lambda: job(self._session(), *args, **kwargs))
+        self._futures.append(future)
+        return future
+
+    def wait(self) -> int:
+        """Waits for every submitted job and logs the ones that failed.
+
+        Returns:
+            int: the number of failed jobs
+        """
+        failed = 0
+        for future in self._futures:
+            exception = future.exception()
+            if exception is not None:
+                failed += 1
+                logging.error(f"Email job failed: {exception!r}")
+        self._futures.clear()
+        return failed
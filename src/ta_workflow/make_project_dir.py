@@ -1,16 +1,123 @@
+import json
+import logging
+import os
 import shutil
+from pathlib import Path
+from typing import Sequence
 
 from ta_workflow.path import PROJECT_ROOT
-from ta_workflow.student import Student
+from ta_workflow.student import STUDENT_FIELDS, Student
 
+ROSTER_SNAPSHOT_PATH: Path = PROJECT_ROOT / "roster_snapshot.json"
+# The directory the directories of dropped and withdrawn students are moved to
+ARCHIVE_PATH: Path = PROJECT_ROOT / "_archive"
 
-def make_project_dir(students: list[Student], assignment_names: list[str]) -> None:
+
+def student_dir_name(student: Student) -> str:
+    """
+    Gets the name of the directory of a student, e.g. "Lovelace_21900000".
+    """
+    return student.last_name + "_" + student.bilkent_id
+
+
+def load_roster_snapshot(path: Path = ROSTER_SNAPSHOT_PATH) -> list[Student] | None:
+    """
+    Reads the roster the student directories were last synced to.
+
+    Parameters:
+    -----------
+    path : Path, optional
+        The path of the JSON snapshot.
+
+    Returns:
+    --------
+    list of Student objects or None
+        The students, None if the directories were never synced.
+    """
+    try:
+        with path.open() as fp:
+            return [Student.from_values(values) for values in json.load(fp)]
+    except FileNotFoundError:
+        return None
+
+
+def save_roster_snapshot(
+    students: Sequence[Student], path: Path = ROSTER_SNAPSHOT_PATH
+) -> None:
+    """
+    Writes the roster the student directories are synced to, replacing it atomically.
+
+    Parameters:
+    -----------
+    students : sequence of Student objects
+        The students.
+    path : Path, optional
+        The path of the JSON snapshot.
+
+    Returns:
+    --------
+    None
+    """
+    tmp_path = path.with_suffix(".json.tmp")
+    with tmp_path.open("w") as fp:
+        json.dump(
+            [
+                [getattr(student, field) for field in STUDENT_FIELDS]
+                for student in students
+            ],
+            fp,
+            indent=1,
+        )
+    os.replace(tmp_path, path)
+
+
+class RosterDiff:
+    """
+    The changes between two rosters, matched by bilkent id.
+
+    Attributes:
+    -----------
+    added : list of Student objects
+        The students that are only in the new roster, or that are no longer withdrawn.
+    dropped : list of Student objects
+        The students that are only in the old roster, or that withdrew.
+    renamed : list of (Student, Student) tuples
+        The old and new rows of the students whose last name changed.
+    """
+
+    def __init__(self, old: Sequence[Student], new: Sequence[Student]) -> None:
+        old_by_id = {student.bilkent_id: student for student in old}
+        new_by_id = {student.bilkent_id: student for student in new}
+        self.added = [
+            student
+            for bilkent_id, student in new_by_id.items()
+            if not student.withdraw_fz
+            and (bilkent_id not in old_by_id or old_by_id[bilkent_id].withdraw_fz)
+        ]
+        self.dropped = [
+            student
+            for bilkent_id, student in old_by_id.items()
+            if not student.withdraw_fz
+            and (bilkent_id not in new_by_id or new_by_id[bilkent_id].withdraw_fz)
+        ]
+        self.renamed = [
+            (old_by_id[bilkent_id], student)
+            for bilkent_id, student in new_by_id.items()
+            if bilkent_id in old_by_id
+            and student_dir_name(student) != student_dir_name(old_by_id[bilkent_id])
+        ]
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.dropped) + len(self.renamed)
+
+
+def make_project_dir(students: Sequence[Student], assignment_names: list[str]) -> None:
     """
     Creates the project directory structure for each student and assignment.
 
     Parameters:
     -----------
-    students : list of Student objects
+    students : sequence of Student objects
         List of students in the class.
     assignment_names : list of str
         List of assignment names.
@@ -22,7 +129,7 @@ def make_project_dir(students: list[Student], assignment_names: list[str]) -> No
 
     # Iterate over the students and assignments, and create the necessary directories
     for student in students:
-        student_dir = PROJECT_ROOT / (student.last_name + "_" + student.bilkent_id)
+        student_dir = PROJECT_ROOT / student_dir_name(student)
         student_dir.mkdir(exist_ok=True)
         for assignment in assignment_names:
             assignment_dir = student_dir / assignment
@@ -30,14 +137,14 @@ def make_project_dir(students: list[Student], assignment_names: list[str]) -> No
 
 
 def delete_project_dir_and_contents(
-    students: list[Student], assignment_names: list[str]
+    students: Sequence[Student], assignment_names: list[str]
 ) -> None:
     """
     Deletes the project directory structure for each assignment in every student directory.
 
     Parameters:
     -----------
-    students : list of Student objects
+    students : sequence of Student objects
         List of students in the class.
     assignment_names : list of str
         List of assignment names.
@@ -49,7 +156,90 @@ def delete_project_dir_and_contents(
 
     # Iterate over the students and assignments, and delete the necessary directories
     for student in students:
-        student_dir = PROJECT_ROOT / (student.last_name + "_" + student.bilkent_id)
+        student_dir = PROJECT_ROOT / student_dir_name(student)
         for assignment in assignment_names:
             assignment_dir = student_dir / assignment
             shutil.rmtree(assignment_dir)
+
+
+def sync_roster(
+    students: Sequence[Student],
+    assignment_names: list[str],
+    old_students: Sequence[Student] | None = None,
+    dry_run: bool = False,
+    snapshot_path: Path = ROSTER_SNAPSHOT_PATH,
+) -> RosterDiff:
+    """
+    Updates the student directories to a new roster, touching only the changed students.
+
+    The new roster is compared with the roster of the last sync by bilkent id. The
+    directories of dropped and withdrawn students are moved to the archive, those of
+    students whose last name changed are renamed, and new or reinstated students get
+    their directories back from the archive or new ones.
+
+    Parameters:
+    -----------
+    students : sequence of Student objects
+        The students of the new roster.
+    assignment_names : list of str
+        List of assignment names, created for the new students.
+    old_students : sequence of Student objects or None, optional
+        The roster the directories were made for, used when there is no snapshot yet.
+    dry_run : bool, optional
+        Whether to only log the changes.
+    snapshot_path : Path, optional
+        The path of the JSON snapshot of the roster of the last sync.
+
+    Returns:
+    --------
+    RosterDiff
+        The changes.
+    """
+    diff = RosterDiff(
+        load_roster_snapshot(snapshot_path) or old_students or [], students
+    )
+    for old, new in diff.renamed:
+        logging.info(f"Renaming {student_dir_name(old)} to {student_dir_name(new)}")
+    for student in diff.dropped:
+        logging.info(f"Archiving {student_dir_name(student)}")
+    for student in diff.added:
+        logging.info(f"Adding {student_dir_name(student)}")
+    logging.info(
+        f"{len(diff.added)} students added, {len(diff.dropped)} archived and "
+        f"{len(diff.renamed)} renamed"
+    )
+    if dry_run:
+        return diff
+
+    renamed_dirs = {}
+    for old, new in diff.renamed:
+        # A student that is also archived is archived under the new name
+        old_dir = PROJECT_ROOT / student_dir_name(old)
+        new_dir = PROJECT_ROOT / student_dir_name(new)
+        renamed_dirs[old_dir] = new_dir
+        if not old_dir.exists():
+            continue
+        if new_dir.exists():
+            logging.error(f"Could not rename {old_dir}, {new_dir} exists")
+        else:
+            os.rename(old_dir, new_dir)
+    for student in diff.dropped:
+        student_dir = PROJECT_ROOT / student_dir_name(student)
+        student_dir = renamed_dirs.get(student_dir, student_dir)
+        archived_dir = ARCHIVE_PATH / student_dir.name
+        if not student_dir.exists():
+            continue
+        if archived_dir.exists():
+            logging.error(f"Could not archive {student_dir}, {archived_dir} exists")
+        else:
+            ARCHIVE_PATH.mkdir(exist_ok=True)
+            os.rename(student_dir, archived_dir)
+    for student in diff.added:
+        # A reinstated student gets the archived directory back, even if renamed since
+        student_dir = PROJECT_ROOT / student_dir_name(student)
+        restored_dir = next(ARCHIVE_PATH.glob(f"*_{student.bilkent_id}"), None)
+        if restored_dir is not None and not student_dir.exists():
+            os.rename(restored_dir, student_dir)
+    make_project_dir(diff.added, assignment_names)
+    save_roster_snapshot(students, snapshot_path)
+    return diff
@@ -0,0 +1,219 @@
+"""Module for matching submission file names to the students of the course."""
+
+import heapq
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+from unidecode import unidecode
+
+from ta_workflow.student import Student
+
+NGRAM_SIZE = 3
+# The number of students sharing the most n-grams with a file name that are scored
+MAX_CANDIDATES = 20
+# The scores of the students found in the text of a submission
+ID_IN_TEXT_SCORE = 100
+NAME_IN_TEXT_SCORE = 90
+BILKENT_ID_PATTERN = re.compile(r"(?<!\d)\d{8}(?!\d)")
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a name or file name for matching.
+
+    Parameters:
+    -----------
+    text : str
+        The text to normalize.
+
+    Returns:
+    --------
+    str
+        The ascii, lower case text with every non alphanumeric character replaced by a
+        space, the same preprocessing fuzzywuzzy applies.
+    """
+    return utils.default_process(unidecode(text))
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> set[str]:
+    """
+    Gets the character n-grams of every token of a normalized text.
+
+    Parameters:
+    -----------
+    text : str
+        The normalized text.
+    n : int, optional
+        The length of the n-grams.
+
+    Returns:
+    --------
+    set of str
+        The n-grams, tokens shorter than n are kept as they are.
+    """
+    return {
+        token[i : i + n]
+        for token in text.split()
+        for i in range(max(1, len(token) - n + 1))
+    }
+
+
+class NameMatcher:
+    """
+    Matches file names to students by the similarity to their full names.
+
+    The roster is normalized and indexed once. An inverted index from the n-grams of
+    the names to the students narrows every file name down to the students that share
+    the most n-grams with it, and every file name and candidate pair is then scored in
+    one batched call to rapidfuzz in native code. Scores are rapidfuzz's weighted ratio,
+    the scorer of fuzzywuzzy's `process.extractOne`.
+
+    Attributes:
+    -----------
+    students : list of Student objects
+        The students to match, in roster order.
+    names : list of str
+        The normalized full names of the students.
+    max_candidates : int
+        The number of candidates scored for every file name.
+    """
+
+    def __init__(
+        self, students: Iterable[Student], max_candidates: int = MAX_CANDIDATES
+    ) -> None:
+        self.students = list(students)
+        self.max_candidates = max_candidates
+        self.names = [
+            normalize(student.first_name + " " + student.last_name)
+            for student in self.students
+        ]
+        postings: dict[str, list[int]] = defaultdict(list)
+        for i, name in enumerate(self.names):
+            for ngram in ngrams(name):
+                postings[ngram].append(i)
+        self._index = {ngram: tuple(rows) for ngram, rows in postings.items()}
+        self._by_id = {student.bilkent_id: student for student in self.students}
+        self._name_tokens = [frozenset(name.split()) for name in self.names]
+
+    def candidates(self, queries: list[str]) -> list[np.ndarray]:
+        """
+        Finds the candidate students of every normalized query using the n-gram index.
+
+        Only the students in the postings of the n-grams of a query are counted, so the
+        work grows with the postings a query hits rather than with the roster.
+
+        Parameters:
+        -----------
+        queries : list of str
+            The normalized file names.
+
+        Returns:
+        --------
+        list of np.ndarray
+            The student indexes of every query, sorted in roster order. Every query
+            gets up to max_candidates students it shares the most n-grams with, none
+            if it shares no n-gram with any name. Every student is a candidate if the
+            roster has at most max_candidates students.
+        """
+        if len(self.students) <= self.max_candidates:
+            return [np.arange(len(self.students))] * len(queries)
+        candidates = []
+        for query in queries:
+            shared: Counter[int] = Counter()
+            for ngram in ngrams(query):
+                shared.update(self._index.get(ngram, ()))
+            top = heapq.nsmallest(
+                self.max_candidates,
+                shared.items(),
+                key=lambda item: (-item[1], item[0]),
+            )
+            candidates.append(np.sort(np.array([j for j, _ in top], dtype=np.intp)))
+        return candidates
+
+    def match(self, queries: list[str]) -> list[tuple[Student | None, int]]:
+        """
+        Finds the most similar student of every file name.
+
+        Parameters:
+        -----------
+        queries : list of str
+            The file names, e.g. with the Moodle directory name prepended.
+
+        Returns:
+        --------
+        list of (Student or None, int) tuples
+            The best match and its similarity score from 0 to 100 for every file name,
+            in the given order. The student is None if the roster is empty, or if
+            the file name shares no n-gram with a name of a roster larger than
+            max_candidates. Ties go to the student that comes first in the roster.
+        """
+        if not self.students or not queries:
+            return [(None, 0)] * len(queries)
+        normalized = [normalize(query) for query in queries]
+        candidates = self.candidates(normalized)
+        counts = [len(rows) for rows in candidates]
+        flat = np.concatenate(candidates)
+        if not len(flat):
+            return [(None, 0)] * len(queries)
+        # Score every (file name, candidate) pair in a single batch
+        scores = process.cpdist(
+            np.repeat(normalized, counts),
+            [self.names[j] for j in flat],
+            scorer=fuzz.WRatio,
+            processor=None,
+            workers=-1,
+        )
+        matches: list[tuple[Student | None, int]] = []
+        start = 0
+        for count in counts:
+            if count == 0:
+                matches.append((None, 0))
+                continue
+            best = start + int(scores[start : start + count].argmax())
+            matches.append((self.students[flat[best]], int(round(scores[best]))))
+            start += count
+        return matches
+
+    def match_text(self, texts: list[str]) -> list[tuple[Student | None, int]]:
+        """
+        Finds the student whose bilkent id or full name is written in every text.
+
+        A bilkent id is an exact match. Otherwise the student whose every name token
+        is in the text is the match, if there is exactly one, so the names of the
+        instructors or of a group mate do not cause a wrong match.
+
+        Parameters:
+        -----------
+        texts : list of str
+            The texts of the submissions, e.g. of their first pages.
+
+        Returns:
+        --------
+        list of (Student or None, int) tuples
+            The match and its score for every text, in the given order. The student is
+            None if no single student is found.
+        """
+        matches: list[tuple[Student | None, int]] = []
+        for text in texts:
+            ids = {
+                bilkent_id
+                for bilkent_id in BILKENT_ID_PATTERN.findall(text)
+                if bilkent_id in self._by_id
+            }
+            if len(ids) == 1:
+                matches.append((self._by_id[ids.pop()], ID_IN_TEXT_SCORE))
+                continue
+            tokens = set(normalize(text).split())
+            found = [
+                j
+                for j, name_tokens in enumerate(self._name_tokens)
+                if name_tokens and name_tokens <= tokens
+            ]
+            if len(found) == 1:
+                matches.append((self.students[found[0]], NAME_IN_TEXT_SCORE))
+            else:
+                matches.append((None, 0))
+        return matches
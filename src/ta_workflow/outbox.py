@@ -0,0 +1,218 @@
+"""Module for the local spool of pre-rendered grade emails."""
+
+import json
+import os
+import socket
+from email.message import Message
+from email.parser import BytesHeaderParser
+from email.policy import default
+from pathlib import Path
+from time import time
+from uuid import uuid4
+
+from ta_workflow.mailer import EncodedAttachment, MIMEStream
+from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.utils import _mime_init
+
+OUTBOX_PATH: Path = PROJECT_ROOT / "_outbox"
+
+# Headers of spooled messages that are only read locally and stripped when sending
+PRIVATE_HEADER_PREFIX = "X-TA-Workflow-"
+# Headers that tie a spooled message back to its outbox journal entry
+ASSIGNMENT_HEADER = "X-TA-Workflow-Assignment"
+BILKENT_ID_HEADER = "X-TA-Workflow-Bilkent-Id"
+CONTENT_HASH_HEADER = "X-TA-Workflow-Content-Hash"
+# Headers of the files a message links to instead of attaching, copied to Google Drive
+# when the message is sent
+DRIVE_FOLDER_HEADER = "X-TA-Workflow-Drive-Folder"
+DRIVE_FILES_HEADER = "X-TA-Workflow-Drive-Files"
+
+# Attachments of every message, set once in each render worker process
+_shared_attachments: list[EncodedAttachment] = []
+
+
+def init_render_worker(shared_attachments: list[EncodedAttachment]) -> None:
+    """Initializes a render worker process with the attachments every message gets.
+
+    Args:
+        shared_attachments (list[EncodedAttachment]): the already encoded attachments
+    """
+    global _shared_attachments
+    _shared_attachments = shared_attachments
+
+
+def render_message(
+    outbox_path: str,
+    from_addr: str,
+    to_addr: list[str],
+    subject: str,
+    body: str,
+    files_path: list[str] | None = None,
+    headers: dict[str, str] | None = None,
+    fallback: tuple[str, dict[str, str]] | None = None,
+) -> str:
+    """Renders an email with its attachments and the shared attachments into the outbox.
+
+    The message is written to tmp and then renamed into new, as Maildir delivery
+    requires, so a half-written message is never flushed. A fallback message without
+    the attached files is renamed into fallback under the same name first, to be sent
+    instead if the server refuses the message as too large. Runs in worker processes.
+
+    Args:
+        outbox_path (str): path of the outbox
+        from_addr (str): from address
+        to_addr (list[str]): to address
+        subject (str): subject of the email
+        body (str): body of the email
+        files_path (list[str] | None, optional): list of file paths to be attached, defaults to None
+        headers (dict[str, str] | None, optional): extra headers of the email, defaults to None
+        fallback (tuple[str, dict[str, str]] | None, optional): the body and extra headers of the fallback message, defaults to None
+
+    Returns:
+        str: path of the rendered message
+    """
+    file_name = f"{int(time())}.{os.getpid()}_{uuid4().hex}.{socket.gethostname()}"
+    tmp_path = Path(outbox_path) / "tmp" / file_name
+    renders = [(body, files_path, headers, Path(outbox_path) / "new" / file_name)]
+    if fallback is not None:
+        fallback_body, fallback_headers = fallback
+        fallback_path = Path(outbox_path) / "fallback" / file_name
+        renders.insert(0, (fallback_body, None, fallback_headers, fallback_path))
+    for message_body, message_files_path, message_headers, path in renders:
+        message = _mime_init(from_addr, to_addr, subject, message_body)
+        for name, value in (message_headers or {}).items():
+            message[name] = value
+        with tmp_path.open("wb") as fp:
+            MIMEStream(message, message_files_path, _shared_attachments).write(fp)
+        os.replace(tmp_path, path)
+    return str(Path(outbox_path) / "new" / file_name)
+
+
+def drive_headers(files_path: list[str], folder: Path) -> dict[str, str]:
+    """Gets the headers of the files a message links to in the Google Drive folder.
+
+    Args:
+        files_path (list[str]): paths of the files
+        folder (Path): the folder of the files in Google Drive
+
+    Returns:
+        dict[str, str]: the headers, see Outbox.read_drive_files
+    """
+    return {
+        DRIVE_FOLDER_HEADER: folder.as_posix(),
+        DRIVE_FILES_HEADER: json.dumps(files_path),
+    }
+
+
+class Outbox:
+    """
+    A Maildir of rendered emails waiting to be flushed to the server.
+
+    Rendered messages are in new, and flushed messages are moved to cur and marked as
+    seen, so the outbox can be reviewed with any mail client that reads Maildir. The
+    fallbacks of messages that may be too large for the server are kept in fallback.
+    """
+
+    def __init__(self, path: Path = OUTBOX_PATH) -> None:
+        self.path = path
+        for sub_dir in ("tmp", "new", "cur", "fallback"):
+            (path / sub_dir).mkdir(parents=True, exist_ok=True)
+
+    def pending(self) -> list[Path]:
+        """Get the messages that are not flushed yet.
+
+        Returns:
+            list[Path]: the paths of the messages, oldest first
+        """
+        return sorted((self.path / "new").iterdir())
+
+    @staticmethod
+    def read_headers(message_path: Path) -> Message:
+        """Parses the headers of a message without reading its attachments.
+
+        Args:
+            message_path (Path): path of the message
+
+        Returns:
+            Message: the message headers
+        """
+        header_lines = []
+        with message_path.open("rb") as fp:
+            for line in fp:
+                header_lines.append(line)
+                if not line.strip():
+                    break
+        return BytesHeaderParser(policy=default).parsebytes(b"".join(header_lines))
+
+    @classmethod
+    def read_journal_key(cls, message_path: Path) -> tuple[str, str, str]:
+        """Get the outbox journal key of a message.
+
+        Args:
+            message_path (Path): path of the message
+
+        Returns:
+            tuple[str, str, str]: the assignment, bilkent id and content hash of the message
+        """
+        headers = cls.read_headers(message_path)
+        return (
+            headers[ASSIGNMENT_HEADER].strip(),
+            headers[BILKENT_ID_HEADER].strip(),
+            headers[CONTENT_HASH_HEADER].strip(),
+        )
+
+    @classmethod
+    def read_drive_files(cls, message_path: Path) -> tuple[list[str], Path] | None:
+        """Get the files a message links to in Google Drive.
+
+        Args:
+            message_path (Path): path of the message
+
+        Returns:
+            tuple[list[str], Path] | None: the paths of the files and their Google Drive folder, None if the message links to no files
+        """
+        headers = cls.read_headers(message_path)
+        if headers[DRIVE_FILES_HEADER] is None:
+            return None
+        return (
+            json.loads(headers[DRIVE_FILES_HEADER]),
+            Path(headers[DRIVE_FOLDER_HEADER].strip()),
+        )
+
+    def fallback_path(self, message_path: Path) -> Path | None:
+        """Get the fallback of a message, to send if the message is too large.
+
+        Args:
+            message_path (Path): path of the message
+
+        Returns:
+            Path | None: path of the fallback, None if the message has none
+        """
+        fallback_path = self.path / "fallback" / message_path.name
+        return fallback_path if fallback_path.exists() else None
+
+    def discard(self, assignments: list[str]) -> int:
+        """Removes the pending messages of the given assignments, e.g. before rendering them again.
+
+        Args:
+            assignments (list[str]): the assignment names
+
+        Returns:
+            int: the number of removed messages
+        """
+        removed = 0
+        for message_path in self.pending():
+            if self.read_journal_key(message_path)[0] in assignments:
+                message_path.unlink()
+                (self.path / "fallback" / message_path.name).unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def mark_flushed(self, message_path: Path) -> None:
+        """Moves a flushed message to cur and marks it as seen, removing its fallback.
+
+        Args:
+            message_path (Path): path of the message
+        """
+        os.replace(message_path, self.path / "cur" / f"{message_path.name}:2,S")
+        (self.path / "fallback" / message_path.name).unlink(missing_ok=True)
@@ -0,0 +1,132 @@
+"""Module for the persistent journal of sent grade emails."""
+
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from types import TracebackType
+
+from ta_workflow.path import PROJECT_ROOT
+
+# Kept with the course, so courses sharing an install do not share their journal
+JOURNAL_PATH: Path = PROJECT_ROOT / "outbox_journal.sqlite3"
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def content_hash(*texts: str, files_path: list[str] | None = None) -> str:
+    """Hashes the texts and the contents of the files that make up an email.
+
+    Args:
+        texts (str): the texts of the email, e.g. subject and body
+        files_path (list[str] | None, optional): list of attached file paths, defaults to None
+
+    Returns:
+        str: hex digest of the email contents
+    """
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode())
+        digest.update(b"\0")
+    for file_path in sorted(files_path or []):
+        digest.update(Path(file_path).name.encode())
+        with open(file_path, "rb") as fp:
+            while chunk := fp.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OutboxJournal:
+    """
+    A SQLite journal of the grade emails, keyed by (assignment, bilkent_id, content_hash).
+
+    Every email is recorded as pending before it is sent and as sent or failed right
+    after, each in its own transaction, so an interrupted run can be resumed without
+    emailing the same content twice. The keys of the sent emails are kept in memory
+    for O(1) lookups. The journal is safe to share between the email worker threads.
+    """
+
+    def __init__(self, path: Path = JOURNAL_PATH) -> None:
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS emails (
+                    assignment TEXT NOT NULL,
+                    bilkent_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (assignment, bilkent_id, content_hash)
+                )
+                """
+            )
+            self._sent: set[tuple[str, str, str]] = set(
+                self._connection.execute(
+                    "SELECT assignment, bilkent_id, content_hash FROM emails WHERE status = ?",
+                    (SENT,),
+                )
+            )
+
+    def __enter__(self) -> "OutboxJournal":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def is_sent(self, assignment: str, bilkent_id: str, content_hash: str) -> bool:
+        """Checks if this exact email was already sent.
+
+        Args:
+            assignment (str): the assignment name
+            bilkent_id (str): the bilkent id of the student
+            content_hash (str): the hash of the email contents
+
+        Returns:
+            bool: True if the email was sent successfully before
+        """
+        return (assignment, bilkent_id, content_hash) in self._sent
+
+    def mark(
+        self,
+        assignment: str,
+        bilkent_id: str,
+        content_hash: str,
+        status: str,
+        error: str | None = None,
+    ) -> None:
+        """Records the status of an email in a single transaction.
+
+        Args:
+            assignment (str): the assignment name
+            bilkent_id (str): the bilkent id of the student
+            content_hash (str): the hash of the email contents
+            status (str): one of PENDING, SENT or FAILED
+            error (str | None, optional): the reason of a failure, defaults to None
+        """
+        key = (assignment, bilkent_id, content_hash)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, status, error, datetime.now().isoformat(timespec="seconds")),
+            )
+            if status == SENT:
+                self._sent.add(key)
+            else:
+                self._sent.discard(key)
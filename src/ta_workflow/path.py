@@ -7,3 +7,6 @@ PROJECT_ROOT = Path(YAML_CONFIG.project_root_path).resolve().expanduser()
 
 # The path to the log directory
 LOG_PATH: Path = Path(__file__).parents[2] / "logs"
+
+# The path to the output directory
+OUTPUT_PATH: Path = Path(__file__).parents[2] / "outputs"
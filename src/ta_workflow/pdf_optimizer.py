@@ -0,0 +1,238 @@
+"""Module for shrinking feedback PDFs before they are emailed."""
+
+import hashlib
+import logging
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import cast
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+from ta_workflow.path import PROJECT_ROOT
+
+try:  # Pillow is only needed to downsample images
+    from PIL import Image  # type: ignore
+except ImportError:
+    Image = None
+
+PDF_CACHE_PATH: Path = PROJECT_ROOT / "_pdf_cache"
+# Marks a cached source whose optimized copy was not smaller
+NOT_SMALLER_MARKER = "not_smaller"
+
+
+def optimize_pdf(
+    source: Path,
+    destination: Path,
+    image_scale: float | None = None,
+    jpeg_quality: int = 75,
+) -> None:
+    """
+    Write a smaller copy of a PDF.
+
+    Identical image and form XObjects are deduplicated so they are written once,
+    content streams are flate compressed, and if an image scale is given JPEG images are
+    downsampled with Pillow.
+
+    Args:
+        source (Path): The PDF to optimize.
+        destination (Path): The path of the optimized copy.
+        image_scale (float | None, optional): The factor to scale JPEG images by, e.g. 0.5. Defaults to None, which keeps the images.
+        jpeg_quality (int, optional): The quality of the downsampled JPEG images. Defaults to 75.
+
+    Returns:
+        None
+    """
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    seen_xobjects: dict[str, IndirectObject] = {}
+    downsampled: dict[int, IndirectObject] = {}
+    for page in reader.pages:
+        _deduplicate_xobjects(page, seen_xobjects)
+        if image_scale is not None:
+            _downsample_images(writer, page, image_scale, jpeg_quality, downsampled)
+        # Compress before the page is cloned, or the writer also keeps the old streams
+        page.compress_content_streams()
+        writer.add_page(page)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    with destination.open("wb") as out_file:
+        writer.write(out_file)
+
+
+def _deduplicate_xobjects(
+    page: PageObject, seen_xobjects: dict[str, IndirectObject]
+) -> None:
+    """
+    Point the XObjects of a page to the first identical XObject of the document.
+
+    This is done on the reader side, so the writer clones every distinct XObject once.
+
+    Args:
+        page (PageObject): A page of the source PDF.
+        seen_xobjects (dict[str, IndirectObject]): The first XObject of every content hash.
+
+    Returns:
+        None
+    """
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
+    xobjects = cast(DictionaryObject, xobjects.get_object())
+    for name, reference in list(xobjects.items()):
+        if not isinstance(reference, IndirectObject):
+            continue
+        xobject = cast(StreamObject, reference.get_object())
+        # Hash the raw stream data, decoding large scans would only slow this down
+        digest = hashlib.sha256(xobject.hash_value_data()).hexdigest()
+        xobjects[NameObject(name)] = seen_xobjects.setdefault(digest, reference)
+
+
+def _downsample_images(
+    writer: PdfWriter,
+    page: PageObject,
+    image_scale: float,
+    jpeg_quality: int,
+    downsampled: dict[int, IndirectObject],
+) -> None:
+    """
+    Point the JPEG images of a page to downsampled copies in the writer.
+
+    This is done on the reader side, so the writer never clones the original images.
+    Every image is downsampled into a new stream object once, and every page that
+    shares the image points to the same copy.
+
+    Args:
+        writer (PdfWriter): The writer of the optimized PDF.
+        page (PageObject): A page of the source PDF.
+        image_scale (float): The factor to scale images by.
+        jpeg_quality (int): The quality of the downsampled JPEG images.
+        downsampled (dict[int, IndirectObject]): The copy of every image that is already downsampled, by object number.
+
+    Returns:
+        None
+    """
+    if Image is None:
+        return
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
+    xobjects = cast(DictionaryObject, xobjects.get_object())
+    for name, reference in list(xobjects.items()):
+        if not isinstance(reference, IndirectObject):
+            continue
+        if reference.idnum in downsampled:
+            xobjects[NameObject(name)] = downsampled[reference.idnum]
+            continue
+        image = cast(StreamObject, reference.get_object())
+        if image.get("/Subtype") != "/Image" or image.get("/Filter") != "/DCTDecode":
+            continue
+        # PyPDF2 does not decode JPEG, so the data is the JPEG file
+        data = cast(bytes, cast(EncodedStreamObject, image).get_data())
+        with Image.open(BytesIO(data)) as original:
+            width = max(1, round(original.width * image_scale))
+            height = max(1, round(original.height * image_scale))
+            buffer = BytesIO()
+            original.resize((width, height)).save(buffer, "JPEG", quality=jpeg_quality)
+        copy = DecodedStreamObject()
+        copy.update({key: value for key, value in image.items() if key != "/Length"})
+        copy[NameObject("/Width")] = NumberObject(width)
+        copy[NameObject("/Height")] = NumberObject(height)
+        copy.set_data(buffer.getvalue())
+        # PyPDF2 3 has no public method to add an object, streams must be indirect
+        downsampled[reference.idnum] = writer._add_object(copy)
+        xobjects[NameObject(name)] = downsampled[reference.idnum]
+
+
+def _optimize_cached(
+    source: str, image_scale: float | None, cache_path: str
+) -> tuple[str, str]:
+    """
+    Optimize a PDF unless the result for its contents is cached.
+
+    Runs in worker processes. The cache is keyed by the hash of the source and the
+    image scale, and remembers sources whose optimized copy was not smaller.
+
+    Args:
+        source (str): The path of the PDF.
+        image_scale (float | None): The factor to scale JPEG images by.
+        cache_path (str): The path of the cache directory.
+
+    Returns:
+        tuple[str, str]: The source and the path of the file to send instead of it.
+    """
+    digest = hashlib.sha256(f"{image_scale}".encode())
+    with open(source, "rb") as fp:
+        while chunk := fp.read(1 << 20):
+            digest.update(chunk)
+    cache_dir = Path(cache_path) / digest.hexdigest()
+    optimized = cache_dir / Path(source).name
+    if (cache_dir / NOT_SMALLER_MARKER).exists():
+        return source, source
+    if not optimized.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_dir / f"{Path(source).name}.tmp"
+        try:
+            optimize_pdf(Path(source), tmp_file, image_scale)
+        except Exception as e:  # a PDF PyPDF2 cannot handle is sent as it is
+            logging.warning(f"Could not optimize {source}: {e!r}")
+            shutil.rmtree(cache_dir)
+            return source, source
+        if tmp_file.stat().st_size >= Path(source).stat().st_size:
+            tmp_file.unlink()
+            (cache_dir / NOT_SMALLER_MARKER).touch()
+            return source, source
+        tmp_file.replace(optimized)
+    return source, str(optimized)
+
+
+def optimize_pdfs(
+    files_path: list[str],
+    image_scale: float | None = None,
+    cache_path: Path = PDF_CACHE_PATH,
+) -> dict[str, str]:
+    """
+    Optimize PDFs in parallel worker processes, keeping the copies that are smaller.
+
+    Args:
+        files_path (list[str]): The paths of the PDFs.
+        image_scale (float | None, optional): The factor to scale JPEG images by. Defaults to None.
+        cache_path (Path, optional): The path of the cache directory. Defaults to PDF_CACHE_PATH.
+
+    Returns:
+        dict[str, str]: The path of every PDF mapped to the path of the file to send instead.
+    """
+    if image_scale is not None and Image is None:
+        logging.warning("Pillow is not installed, images will not be downsampled")
+    if not files_path:
+        return {}
+    with ProcessPoolExecutor() as executor:
+        to_send = dict(
+            executor.map(
+                _optimize_cached,
+                files_path,
+                [image_scale] * len(files_path),
+                [str(cache_path)] * len(files_path),
+            )
+        )
+    saved = sum(
+        Path(source).stat().st_size - Path(optimized).stat().st_size
+        for source, optimized in to_send.items()
+    )
+    shrunk = sum(source != optimized for source, optimized in to_send.items())
+    logging.info(
+        f"Shrunk {shrunk} of {len(files_path)} PDFs, saving {saved / 2**20:.1f} MB"
+    )
+    return to_send
@@ -1,9 +1,24 @@
+import csv
+import glob
+import mmap
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from time import perf_counter
+from typing import IO, Sequence, cast
 
-from PyPDF2 import PdfReader, PdfWriter
+import yaml
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import DictionaryObject, NameObject
+from rich import print as rprint
 
+# The suffix split_pdf gives the parts, e.g. exam_part2.pdf
+SPLIT_PART_PATTERN = re.compile(r"_part\d+$")
+# The names of the images and forms a content stream draws, e.g. /Im0 Do
+XOBJECT_USE_PATTERN = re.compile(rb"/([^\s/\[\]()<>{}%]+)\s*Do\b")
 
-def split_pdf(file_path_str: str, pages: list[tuple[int, int]]) -> None:
+
+def split_pdf(file_path_str: str, pages: list[tuple[int, int]]) -> list[Path]:
     """
     Split a PDF into multiple files based on the given page numbers.
 
@@ -12,11 +27,12 @@ def split_pdf(file_path_str: str, pages: list[tuple[int, int]]) -> None:
         pages (list[tuple[int, int]]): A list of tuples representing the page ranges to split.
 
     Returns:
-        None
+        list[Path]: The paths of the new PDF files, one per page range.
     """
 
     # Convert the file path string to a Path object and open the file in read-binary mode
     file_path = Path(file_path_str)
+    new_files_path = []
     with file_path.open("rb") as f:
         # Create a PdfReader object to read the PDF file
         reader = PdfReader(f)
@@ -32,6 +48,258 @@ def split_pdf(file_path_str: str, pages: list[tuple[int, int]]) -> None:
             # Open the new file in write-binary mode and write the output PDF file to it
             with new_file_path.open("wb") as out_file:
                 output.write(out_file)
+            new_files_path.append(new_file_path)
+    return new_files_path
+
+
+def prune_resources(page: PageObject) -> None:
+    """
+    Drop the images and forms a page does not draw from its resources.
+
+    Scanners often give every page the same resources listing the images of all
+    pages, which would copy every image of the document into every part. The page
+    gets its own resources listing only what it draws, the other resources stay shared.
+
+    Args:
+        page (PageObject): The page.
+
+    Returns:
+        None
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    if not xobjects:
+        return
+    xobjects = xobjects.get_object()
+    contents = page.get_contents()
+    used = {
+        name.decode("latin-1")
+        for name in XOBJECT_USE_PATTERN.findall(
+            contents.get_data() if contents is not None else b""
+        )
+    }
+    names = {str(name)[1:] for name in xobjects}
+    if used == names or not used <= names:  # nothing to drop, or names it cannot read
+        return
+    pruned = DictionaryObject(resources.get_object())
+    pruned[NameObject("/XObject")] = DictionaryObject(
+        {NameObject(f"/{name}"): xobjects[f"/{name}"] for name in used}
+    )
+    page[NameObject("/Resources")] = pruned
+
+
+def split_pdf_low_memory(
+    file_path_str: str, pages: list[tuple[int, int]]
+) -> list[Path]:
+    """
+    Split a PDF like split_pdf, holding at most one part in memory.
+
+    The file is memory mapped instead of read, so the operating system pages the
+    source in and out as needed. Every part is written before the next is read, with
+    the resources its pages share written once and the images its pages do not draw
+    left out. The objects of a part are released once the part is written.
+
+    Args:
+        file_path_str (str): The path to the PDF file to split.
+        pages (list[tuple[int, int]]): A list of tuples representing the page ranges to split.
+
+    Returns:
+        list[Path]: The paths of the new PDF files, one per page range.
+    """
+    file_path = Path(file_path_str)
+    new_files_path = []
+    with file_path.open("rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        # The memory map reads and seeks like a binary file
+        reader = PdfReader(cast(IO[bytes], data))
+        for i, (start_page, end_page) in enumerate(pages):
+            output = PdfWriter()
+            for page_number in range(start_page - 1, end_page):
+                page = reader.pages[page_number]
+                prune_resources(page)
+                output.add_page(page)
+            new_file_path = file_path.with_name(f"{file_path.stem}_part{i+1}.pdf")
+            with new_file_path.open("wb") as out_file:
+                output.write(out_file)
+            new_files_path.append(new_file_path)
+            # Forget the parsed objects, the next part reads its own from the map
+            del output
+            reader.resolved_objects.clear()
+            reader.flattened_pages = None
+    return new_files_path
+
+
+def parse_page_range(page_range: str) -> tuple[int, int]:
+    """
+    Parse a page range such as "3-4", or "5" for a single page.
+
+    Args:
+        page_range (str): The page range, endpoints included.
+
+    Raises:
+        ValueError: If the range is not two increasing page numbers separated by a dash.
+
+    Returns:
+        tuple[int, int]: The start and end pages.
+    """
+    start, _, end = str(page_range).partition("-")
+    try:
+        start_page, end_page = int(start), int(end or start)
+    except ValueError:
+        raise ValueError(f"Invalid page range: {page_range}") from None
+    if not 1 <= start_page <= end_page:
+        raise ValueError(f"Invalid page range: {page_range}")
+    return start_page, end_page
+
+
+def read_manifest(manifest_path: Path) -> list[tuple[str, list[tuple[int, int]]]]:
+    """
+    Read the files to split and their page ranges from a CSV or YAML manifest.
+
+    A CSV manifest has a `file` and a `pages` column with one row per part, e.g.
+    `exam_1.pdf,1-2`. A YAML manifest maps every file to its page ranges, e.g.
+    `exam_1.pdf: [1-2, 3-4]`. Relative paths are relative to the manifest.
+
+    Args:
+        manifest_path (Path): The path of the manifest.
+
+    Raises:
+        ValueError: If the manifest is not a CSV or YAML manifest of page ranges.
+
+    Returns:
+        list[tuple[str, list[tuple[int, int]]]]: The files and their page ranges, in manifest order.
+    """
+    files_pages: dict[str, list[tuple[int, int]]] = {}
+    with manifest_path.open() as f:
+        if manifest_path.suffix == ".csv":
+            reader = csv.DictReader(f)
+            if not {"file", "pages"} <= set(reader.fieldnames or []):
+                raise ValueError(f"{manifest_path} needs a file and a pages column")
+            for row in reader:
+                files_pages.setdefault(row["file"], []).append(
+                    parse_page_range(row["pages"])
+                )
+        else:
+            try:
+                manifest = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"{manifest_path} is not valid YAML: {e}") from None
+            if not isinstance(manifest, dict):
+                raise ValueError(f"{manifest_path} does not map files to page ranges")
+            for file, ranges in manifest.items():
+                if not isinstance(ranges, list):
+                    raise ValueError(
+                        f"The page ranges of {file} are not a list, e.g. [1-2, 3-4]"
+                    )
+                files_pages[str(file)] = [parse_page_range(r) for r in ranges]
+    return [
+        (str(manifest_path.parent / file), pages) for file, pages in files_pages.items()
+    ]
+
+
+def split_pdf_job(
+    file_path_str: str,
+    pages: list[tuple[int, int]] | None = None,
+    pages_per_part: int | None = None,
+    low_memory: bool = False,
+) -> tuple[int, int, int]:
+    """
+    Split a PDF by its page ranges, or into parts of a fixed number of pages.
+
+    Runs in worker processes.
+
+    Args:
+        file_path_str (str): The path to the PDF file to split.
+        pages (list[tuple[int, int]] | None, optional): The page ranges to split. Defaults to None.
+        pages_per_part (int | None, optional): The number of pages of every part, used if no page ranges are given. Defaults to None.
+        low_memory (bool, optional): Split with split_pdf_low_memory. Defaults to False.
+
+    Raises:
+        ValueError: If neither rule is given or a page range is beyond the last page.
+
+    Returns:
+        tuple[int, int, int]: The number of parts, the number of pages and the size of the PDF in bytes.
+    """
+    with open(file_path_str, "rb") as f:
+        page_count = len(PdfReader(f).pages)
+    if pages is None:
+        if not pages_per_part:
+            raise ValueError("Either pages or pages_per_part is required")
+        pages = [
+            (start, min(start + pages_per_part - 1, page_count))
+            for start in range(1, page_count + 1, pages_per_part)
+        ]
+    if any(end > page_count for _, end in pages):
+        raise ValueError(f"The page ranges {pages} exceed the {page_count} pages")
+    split = split_pdf_low_memory if low_memory else split_pdf
+    new_files_path = split(file_path_str, pages)
+    page_total = sum(end - start + 1 for start, end in pages)
+    return len(new_files_path), page_total, Path(file_path_str).stat().st_size
+
+
+def split_pdfs(
+    jobs: Sequence[tuple[str, list[tuple[int, int]] | None]],
+    pages_per_part: int | None = None,
+    workers: int | None = None,
+    low_memory: bool = False,
+) -> None:
+    """
+    Split many PDFs concurrently in worker processes and print a throughput summary.
+
+    Args:
+        jobs (Sequence[tuple[str, list[tuple[int, int]] | None]]): The files and their page ranges, None to use pages_per_part.
+        pages_per_part (int | None, optional): The number of pages of every part of the files without page ranges. Defaults to None.
+        workers (int | None, optional): The number of worker processes. Defaults to None, which uses every core.
+        low_memory (bool, optional): Split with split_pdf_low_memory. Defaults to False.
+
+    Returns:
+        None
+    """
+    start_time = perf_counter()
+    parts = page_total = size = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                split_pdf_job, file, pages, pages_per_part, low_memory
+            ): file
+            for file, pages in jobs
+        }
+        for future, file in futures.items():
+            try:
+                file_parts, file_pages, file_size = future.result()
+            except Exception as e:  # report the file and keep splitting the others
+                failed += 1
+                rprint(f"[red]Could not split {file}: {e!r}[/red]")
+                continue
+            parts += file_parts
+            page_total += file_pages
+            size += file_size
+    elapsed = perf_counter() - start_time
+    rprint(
+        f"Split {len(jobs) - failed} of {len(jobs)} files into {parts} parts "
+        f"({page_total} pages, {size / 2**20:.1f} MB) in {elapsed:.1f} s, "
+        f"{page_total / elapsed:.0f} pages/s"
+    )
+
+
+def glob_jobs(pattern: str) -> list[tuple[str, list[tuple[int, int]] | None]]:
+    """
+    Find the PDFs to split with a glob pattern, skipping the parts of earlier splits.
+
+    Args:
+        pattern (str): The glob pattern, e.g. "~/exams/*.pdf".
+
+    Returns:
+        list[tuple[str, list[tuple[int, int]] | None]]: The files, without page ranges.
+    """
+    return [
+        (file, None)
+        for file in sorted(glob.glob(str(Path(pattern).expanduser()), recursive=True))
+        if file.endswith(".pdf") and not SPLIT_PART_PATTERN.search(Path(file).stem)
+    ]
 
 
 def get_input() -> tuple[str, list[tuple[int, int]]]:
@@ -0,0 +1,68 @@
+"""Module for extracting and caching the text of the first page of submissions."""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PyPDF2 import PdfReader
+
+from ta_workflow.path import PROJECT_ROOT
+
+PDF_TEXT_CACHE_PATH: Path = PROJECT_ROOT / "_pdf_text_cache"
+
+
+def extract_first_page_text(file_path: str) -> str:
+    """
+    Extract the text of the first page of a PDF.
+
+    Args:
+        file_path (str): The path of the PDF.
+
+    Returns:
+        str: The text, empty if the PDF has no pages or no text layer, e.g. a scan.
+    """
+    try:
+        reader = PdfReader(file_path)
+        return reader.pages[0].extract_text() if reader.pages else ""
+    except Exception as e:  # a broken PDF should not stop distributing the others
+        logging.warning(f"Could not read the text of {file_path}: {e!r}")
+        return ""
+
+
+def extract_texts(
+    files_path: list[Path],
+    digests: list[str],
+    cache_path: Path = PDF_TEXT_CACHE_PATH,
+    workers: int | None = None,
+) -> list[str]:
+    """
+    Extract the text of the first page of PDFs, reusing the texts cached by file hash.
+
+    The texts that are not cached are extracted in parallel worker processes and
+    cached as `<cache_path>/<digest>.txt`, so a rerun reads no PDF twice.
+
+    Args:
+        files_path (list[Path]): The paths of the PDFs.
+        digests (list[str]): The hashes of the contents of the PDFs.
+        cache_path (Path, optional): The cache directory. Defaults to PDF_TEXT_CACHE_PATH.
+        workers (int | None, optional): The number of worker processes, 1 extracts in this process. Defaults to None, which uses every core.
+
+    Returns:
+        list[str]: The text of every PDF, in the given order.
+    """
+    cache_path.mkdir(parents=True, exist_ok=True)
+    cached = [cache_path / f"{digest}.txt" for digest in digests]
+    texts = [
+        text_file.read_text() if text_file.exists() else None for text_file in cached
+    ]
+    missing = [i for i, text in enumerate(texts) if text is None]
+    sources = [str(files_path[i]) for i in missing]
+    if workers == 1 or len(missing) <= 1:
+        extracted = list(map(extract_first_page_text, sources))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extracted = list(executor.map(extract_first_page_text, sources))
+    for i, text in zip(missing, extracted):
+        cached[i].write_text(text)
+        texts[i] = text
+    return [text or "" for text in texts]
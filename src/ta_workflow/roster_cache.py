@@ -0,0 +1,90 @@
+"""Module for caching the parsed student data file, so Excel is parsed only after it changes."""
+
+import logging
+import os
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from ta_workflow.config_parser import YAML_CONFIG
+from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.transfer import file_digest
+
+FIXED_STUDENT_DATA_PATH: Path = PROJECT_ROOT / (
+    YAML_CONFIG.student_data_file_name.split(".")[0] + "_fixed.xlsx"
+)
+ROSTER_CACHE_PATH: Path = PROJECT_ROOT / "_roster_cache"
+
+# The frames read in this process, by path, modification time and size
+_frames: dict[tuple[str, int, int], pd.DataFrame] = {}
+
+
+def read_student_data(
+    path: Path = FIXED_STUDENT_DATA_PATH, cache_path: Path = ROSTER_CACHE_PATH
+) -> pd.DataFrame:
+    """
+    Reads the fixed student data file, from a pickle of the parsed frame if unchanged.
+
+    The pickle is stored with the modification time, size and hash of the file it was
+    parsed from. It is used as is when the modification time and size match, and after
+    hashing the file when only the modification time changed, e.g. after a copy. The
+    file is parsed with pandas only when its contents changed. Frames are also kept in
+    memory, so a command reading the student data twice unpickles it once.
+
+    Parameters:
+    -----------
+    path : Path, optional
+        The path of the Excel file.
+    cache_path : Path, optional
+        The directory of the pickles.
+
+    Raises:
+    -------
+    FileNotFoundError
+        If the Excel file does not exist.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A copy of the parsed student data, so callers can modify it.
+    """
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key in _frames:
+        return _frames[key].copy()
+
+    cache_file = cache_path / f"{path.name}.pkl"
+    try:
+        with cache_file.open("rb") as fp:
+            cached = pickle.load(fp)
+    except FileNotFoundError:
+        cached = None
+    except Exception as e:  # a corrupt cache is rebuilt from the file
+        logging.warning(f"Ignoring the roster cache {cache_file}: {e!r}")
+        cached = None
+
+    if cached is not None and (cached["mtime_ns"], cached["size"]) == key[1:]:
+        df = cached["frame"]
+    else:
+        digest = file_digest(path)
+        if cached is not None and cached["digest"] == digest:
+            df = cached["frame"]
+        else:
+            df = pd.read_excel(path)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_file.with_suffix(".pkl.tmp")
+        with tmp_path.open("wb") as fp:
+            pickle.dump(
+                {
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "digest": digest,
+                    "frame": df,
+                },
+                fp,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, cache_file)
+    _frames[key] = df
+    return df.copy()
@@ -1,25 +1,57 @@
 import logging
 import os
-import subprocess
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from smtplib import SMTPSenderRefused
+from smtplib import SMTPDataError, SMTPSenderRefused
 from time import sleep
+from typing import Sequence
 
-import pandas as pd  # type: ignore
 from unidecode import unidecode
 
 from ta_workflow.config_parser import YAML_CONFIG
+from ta_workflow.drive_sync import DriveSync
+from ta_workflow.gradebook import GradeBook, load_gradebook
+from ta_workflow.mailer import (
+    EmailDispatcher,
+    EncodedAttachment,
+    RateLimiter,
+    SMTPSession,
+    SpooledMessage,
+    is_message_too_large,
+)
+from ta_workflow.outbox import (
+    ASSIGNMENT_HEADER,
+    BILKENT_ID_HEADER,
+    CONTENT_HASH_HEADER,
+    PRIVATE_HEADER_PREFIX,
+    Outbox,
+    drive_headers,
+    init_render_worker,
+    render_message,
+)
+from ta_workflow.outbox_journal import (
+    FAILED,
+    PENDING,
+    SENT,
+    OutboxJournal,
+    content_hash,
+)
 from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.pdf_optimizer import optimize_pdfs
 from ta_workflow.student import Student
-from ta_workflow.utils import send_email
+from ta_workflow.utils import estimate_email_size, send_email
 
 # to avoid sending too many emails in a short period of time
 SEND_EVERY_N_SECONDS = YAML_CONFIG.email_frequency_in_seconds
+EMAILS_PER_MINUTE = YAML_CONFIG.emails_per_minute or 60 / SEND_EVERY_N_SECONDS
+EMAIL_SIZE_LIMIT = int(YAML_CONFIG.email_size_limit_in_mb * 2**20)
+# Routes of a feedback email
+ATTACH = "attach"
+DRIVE_LINK = "drive link"
+NO_ATTACHMENT = "no attachment"
+ROUTES = (ATTACH, DRIVE_LINK, NO_ATTACHMENT)
 USER, PASSWORD = os.environ["bilkent_email_credentials"].split(":")
-# Read the student data file into a pandas dataframe
-df = pd.read_excel(
-    PROJECT_ROOT / (YAML_CONFIG.student_data_file_name.split(".")[0] + "_fixed.xlsx")
-)
 
 
 class EmailBody:
@@ -103,25 +135,409 @@ Best,
 """
 
 
+class EmailPlan:
+    """
+    The route of the feedback email of one student for one assignment, decided before sending.
+
+    Attributes:
+    -----------
+    student : Student
+        The student to send the email to.
+    assignment : str
+        The assignment name.
+    email_body : EmailBody
+        The email bodies for the student.
+    files_path : list[str]
+        The feedback files of the student.
+    shared_attachments : list[EncodedAttachment]
+        The encoded files every student gets, attached on every route.
+    route : str
+        One of ATTACH, DRIVE_LINK or NO_ATTACHMENT.
+    drive_folder : Path
+        The folder of the files of the student in Google Drive, if they are linked.
+    size : int
+        The estimated size of the email with the files attached, in bytes.
+    """
+
+    def __init__(
+        self,
+        student: Student,
+        assignment: str,
+        email_body: EmailBody,
+        files_path: list[str],
+        shared_attachments: list[EncodedAttachment] | None = None,
+        size_limit: int = EMAIL_SIZE_LIMIT,
+    ) -> None:
+        self.student = student
+        self.assignment = assignment
+        self.email_body = email_body
+        self.files_path = files_path
+        self.shared_attachments = shared_attachments or []
+        self.drive_folder = (
+            Path(student.last_name + "_" + student.bilkent_id) / assignment
+        )
+        self.size = estimate_email_size(
+            [self.student.email, email_body.get_email_body()], files_path
+        ) + sum(len(shared_attachment) for shared_attachment in self.shared_attachments)
+        if not files_path:
+            self.route = NO_ATTACHMENT
+        elif self.size > size_limit:
+            self.route = DRIVE_LINK
+        else:
+            self.route = ATTACH
+
+    def get_body(self) -> str:
+        """
+        Get the email body of the planned route.
+
+        Returns:
+            str: The email body.
+        """
+        if self.route == NO_ATTACHMENT:
+            return self.email_body.get_no_attachment_email_body()
+        if self.route == DRIVE_LINK:
+            return self.email_body.get_large_file_email_body()
+        return self.email_body.get_email_body()
+
+    def get_content_hash(self, subject: str) -> str:
+        """
+        Get the hash that identifies the contents of the email in the outbox journal.
+
+        The hash does not depend on the route, so a changed size limit does not resend.
+
+        Args:
+            subject (str): The subject of the email.
+
+        Returns:
+            str: The hash of the subject, the regular body and the attached files.
+        """
+        return content_hash(
+            subject,
+            self.email_body.get_email_body(),
+            *(
+                shared_attachment.digest
+                for shared_attachment in self.shared_attachments
+            ),
+            files_path=self.files_path,
+        )
+
+
+def get_feedback_files(student: Student, assignment: str) -> list[str]:
+    """
+    Get the feedback pdf files of a student for an assignment, fixing messy file names.
+
+    Args:
+        student (Student): The student.
+        assignment (str): The assignment name.
+
+    Returns:
+        list[str]: The resolved paths of the pdf files.
+    """
+    student_dir = PROJECT_ROOT / (student.last_name + "_" + student.bilkent_id)
+    assignment_dir = student_dir / assignment
+    files_path_messy = [
+        assignment_dir / f for f in os.listdir(assignment_dir) if f.endswith(".pdf")
+    ]
+    # Fix the messy file paths
+    for file_path in files_path_messy:
+        new_name = unidecode(
+            file_path.name.replace(" ", "_").replace("/", "_").replace("-", "")
+        )
+        file_path.rename(file_path.parent / new_name)
+    # Get the file paths for the attachments
+    return [
+        str((assignment_dir / f).resolve())
+        for f in os.listdir(assignment_dir)
+        if f.endswith(".pdf")
+    ]
+
+
+def plan_emails(
+    students: Sequence[Student],
+    assignment: str,
+    gradebook: GradeBook,
+    shared_attachments: list[EncodedAttachment] | None = None,
+    shrink_pdfs: bool = False,
+    image_scale: float | None = None,
+) -> list[EmailPlan]:
+    """
+    Plan the feedback emails of every student for an assignment, without any network I/O.
+
+    If shrink_pdfs is True, every feedback PDF is first optimized in worker processes
+    and the optimized copy is planned instead when it is smaller. Students without a
+    directory, e.g. archived by sync-roster, are skipped.
+
+    Args:
+        students (Sequence[Student]): A list of `Student` objects.
+        assignment (str): The assignment name.
+        gradebook (GradeBook): The grades of the students.
+        shared_attachments (list[EncodedAttachment] | None, optional): The files every student gets. Defaults to None.
+        shrink_pdfs (bool, optional): Whether to send optimized copies of the PDFs. Defaults to False.
+        image_scale (float | None, optional): The factor to downsample JPEG images by when shrinking. Defaults to None.
+
+    Returns:
+        list[EmailPlan]: The planned emails, in the order of the students.
+    """
+    summary_stats = (
+        gradebook.describe(assignment).round(2)[["mean", "50%", "max"]].to_string()
+    )
+    # The directories of dropped and withdrawn students are archived by sync-roster
+    archived = {
+        student
+        for student in students
+        if not (PROJECT_ROOT / f"{student.last_name}_{student.bilkent_id}").is_dir()
+    }
+    for student in archived:
+        logging.warning(
+            f"Skipping {student.first_name} {student.last_name}, the student has no directory"
+        )
+    students = [student for student in students if student not in archived]
+    students_files_path = [
+        get_feedback_files(student, assignment) for student in students
+    ]
+    if shrink_pdfs:
+        to_send = optimize_pdfs(
+            [file for files_path in students_files_path for file in files_path],
+            image_scale,
+        )
+        students_files_path = [
+            [to_send[file] for file in files_path] for files_path in students_files_path
+        ]
+    plans = []
+    for student, files_path in zip(students, students_files_path):
+        student_grade = gradebook.grade(student.bilkent_id, assignment)
+        email_body = EmailBody(
+            assignment.replace("_", " "), student, student_grade, summary_stats
+        )
+        plans.append(
+            EmailPlan(student, assignment, email_body, files_path, shared_attachments)
+        )
+    routes = Counter(plan.route for plan in plans)
+    logging.info(
+        f"{assignment} plan: "
+        + ", ".join(f"{routes[route]} {route}" for route in ROUTES)
+    )
+    return plans
+
+
+def get_subject(assignment: str, course_code: str = YAML_CONFIG.course_code) -> str:
+    """
+    Get the subject of the feedback emails of an assignment.
+
+    Args:
+        assignment (str): The assignment name.
+        course_code (str, optional): The course code. Defaults to YAML_CONFIG.course_code.
+
+    Returns:
+        str: The subject.
+    """
+    return f"{course_code} {assignment.replace('_', ' ')} Feedback"
+
+
+def encode_common_files(
+    common_files_path: list[str] | None,
+) -> list[EncodedAttachment]:
+    """
+    Encode the files every student gets once, to be spliced into every email.
+
+    Args:
+        common_files_path (list[str] | None): The paths of the files.
+
+    Returns:
+        list[EncodedAttachment]: The encoded attachments.
+    """
+    shared_attachments = [
+        EncodedAttachment(file_path) for file_path in common_files_path or []
+    ]
+    for shared_attachment in shared_attachments:
+        logging.info(f"Attaching {shared_attachment.file_path} to every email")
+    return shared_attachments
+
+
+def send_student_grade(
+    session: SMTPSession,
+    plan: EmailPlan,
+    subject: str,
+    from_addr: str,
+    journal: OutboxJournal | None = None,
+    resend: bool = False,
+    drive_sync: DriveSync | None = None,
+) -> None:
+    """
+    Send the planned feedback email of one student for one assignment.
+
+    If a journal is given, the outcome of the send is recorded, and unless resend is
+    True an email whose contents were already sent to the student is skipped.
+
+    Args:
+        session (SMTPSession): The SMTP session to send the email with.
+        plan (EmailPlan): The planned email.
+        subject (str): The subject of the email.
+        from_addr (str): The email address of the sender.
+        journal (OutboxJournal | None, optional): The outbox journal. Defaults to None.
+        resend (bool, optional): Send even if the journal marks the email as sent. Defaults to False.
+        drive_sync (DriveSync | None, optional): The queue to copy the files routed to Google Drive with. Defaults to None, which copies them before returning.
+
+    Returns:
+        None
+    """
+    if journal is None:
+        _send_feedback(session, plan, subject, from_addr, drive_sync)
+        return
+
+    student, assignment = plan.student, plan.assignment
+    email_hash = plan.get_content_hash(subject)
+    if not resend and journal.is_sent(assignment, student.bilkent_id, email_hash):
+        logging.info(f"Skipping {student.email}, {assignment} email was already sent")
+        return
+    journal.mark(assignment, student.bilkent_id, email_hash, PENDING)
+    try:
+        _send_feedback(session, plan, subject, from_addr, drive_sync)
+    except Exception as e:
+        journal.mark(assignment, student.bilkent_id, email_hash, FAILED, repr(e))
+        raise
+    journal.mark(assignment, student.bilkent_id, email_hash, SENT)
+
+
+def _send_feedback(
+    session: SMTPSession,
+    plan: EmailPlan,
+    subject: str,
+    from_addr: str,
+    drive_sync: DriveSync | None = None,
+) -> None:
+    """
+    Send the feedback email along its planned route.
+
+    The shared attachments are attached on every route. If the server still refuses an
+    attachment the plan deemed small enough as too large, the email falls back to the
+    Google Drive route. Other refusals, e.g. throttling after the retries of the
+    session, are raised as send failures.
+
+    Args:
+        session (SMTPSession): The SMTP session to send the email with.
+        plan (EmailPlan): The planned email.
+        subject (str): The subject of the email.
+        from_addr (str): The email address of the sender.
+        drive_sync (DriveSync | None, optional): The queue to copy the files routed to Google Drive with. Defaults to None.
+
+    Returns:
+        None
+    """
+    student = plan.student
+    to_addr = [student.email]
+    if plan.route == NO_ATTACHMENT:
+        logging.info(f"No pdf files found for {student.email} in {plan.assignment}")
+        body = plan.get_body()
+        send_email(
+            session.user,
+            session.password,
+            from_addr,
+            to_addr,
+            subject,
+            body,
+            session=session,
+            shared_attachments=plan.shared_attachments,
+        )
+        return
+    if plan.route == ATTACH:
+        try:
+            body = plan.email_body.get_email_body()
+            send_email(
+                session.user,
+                session.password,
+                from_addr,
+                to_addr,
+                subject,
+                body,
+                plan.files_path,
+                session=session,
+                shared_attachments=plan.shared_attachments,
+            )
+            logging.info(f"Email sent successfully to {student.email}")
+            return
+        except (SMTPSenderRefused, SMTPDataError) as e:
+            # Throttling and other refusals are failures, only the size reroutes
+            if not is_message_too_large(e):
+                raise
+            logging.error(f"Could not send email to {student.email}, file is too large")
+    else:
+        logging.info(
+            f"Files of {student.email} are too large ({plan.size / 2**20:.1f} MB), "
+            "sharing them via Google Drive"
+        )
+    body = plan.email_body.get_large_file_email_body()
+    send_email(
+        session.user,
+        session.password,
+        from_addr,
+        to_addr,
+        subject,
+        body,
+        session=session,
+        shared_attachments=plan.shared_attachments,
+    )
+    copy_to_google_drive(plan.files_path, plan.drive_folder, drive_sync)
+
+
+def copy_to_google_drive(
+    files_path: list[str], folder: Path, drive_sync: DriveSync | None = None
+) -> None:
+    """
+    Copy the feedback files of an email to the Google Drive folder.
+
+    Args:
+        files_path (list[str]): The feedback files.
+        folder (Path): The folder of the files in Google Drive, see EmailPlan.drive_folder.
+        drive_sync (DriveSync | None, optional): The queue to copy the files with in the background. Defaults to None, which copies them before returning.
+
+    Returns:
+        None
+    """
+    if drive_sync is not None:
+        drive_sync.submit(files_path, folder)
+        return
+    with DriveSync() as drive_sync:
+        drive_sync.submit(files_path, folder)
+
+
 def send_grades(
-    students: list[Student],
+    students: Sequence[Student],
     assignment_names: list[str],
     user: str = USER,
     password: str = PASSWORD,
     from_addr: str = USER,
     course_code: str = YAML_CONFIG.course_code,
+    workers: int = YAML_CONFIG.email_workers,
+    resend: bool = False,
+    common_files_path: list[str] | None = None,
+    shrink_pdfs: bool = False,
+    image_scale: float | None = None,
 ) -> None:
     """
     Send feedback emails to students with their grades and a summary of statistics.
 
+    The route of every email (attached files, Google Drive link or no attachment) is
+    planned from the file sizes before connecting to the server. Emails are then sent
+    concurrently by a pool of workers that share a rate limiter with the per-minute and
+    per-hour quotas of the config file. Every send is recorded in the outbox journal,
+    so rerunning after an interruption only emails the students who have not received
+    the same contents yet. The files routed to Google Drive are copied in the
+    background, skipping the ones that are already there.
+
     Args:
-        students (list[Student]): A list of
+        students (Sequence[Student]): A list of
         `Student` objects.
         assignment_names (list[str]): A list of assignment names to send grades for.
         user (str, optional): The email address of the sender. Defaults to USER.
         password (str, optional): The password of the sender. Defaults to PASSWORD.
         from_addr (str, optional): The email address of the sender. Defaults to USER.
         course_code (str, optional): The course code. Defaults to YAML_CONFIG.course_code.
+        workers (int, optional): The number of concurrent senders. Defaults to YAML_CONFIG.email_workers.
+        resend (bool, optional): Send again the emails the outbox journal marks as sent. Defaults to False.
+        common_files_path (list[str] | None, optional): Files attached to every email, e.g. the solutions. Defaults to None.
+        shrink_pdfs (bool, optional): Send optimized copies of the feedback PDFs when they are smaller. Defaults to False.
+        image_scale (float | None, optional): The factor to downsample JPEG images by when shrinking. Defaults to None.
 
     Returns:
         None
@@ -135,83 +551,243 @@ def send_grades(
     )
     if user_input != "y":
         return
+    gradebook = load_gradebook()
+    shared_attachments = encode_common_files(common_files_path)
+    rate_limiter = RateLimiter(EMAILS_PER_MINUTE, YAML_CONFIG.emails_per_hour)
     # Send emails for each assignment and each student
-    for assignment in assignment_names:
-        logging.info(f"Sending {assignment} grades...")
-        sleep(
-            SEND_EVERY_N_SECONDS
-        )  # gives time to interrupt the program without sending the first email
-        subject = f"{course_code} {assignment.replace('_', ' ')} Feedback"
-        summary_stats = (
-            df[assignment].describe().round(2)[["mean", "50%", "max"]].to_string()
-        )
-        for student in students:
-            to_addr = [student.email]
-            # Get the student's grade for the assignment from the dataframe
-            student_grade = df[df["bilkent_id"] == int(student.bilkent_id)][
-                assignment
-            ].values[0]
-            student_dir = PROJECT_ROOT / (student.last_name + "_" + student.bilkent_id)
-            assignment_dir = student_dir / assignment
-            files_path_messy = [
-                assignment_dir / f
-                for f in os.listdir(assignment_dir)
-                if f.endswith(".pdf")
-            ]
-            # Fix the messy file paths
-            for file_path in files_path_messy:
-                new_name = unidecode(
-                    file_path.name.replace(" ", "_").replace("/", "_").replace("-", "")
+    with OutboxJournal() as journal, DriveSync() as drive_sync, EmailDispatcher(
+        user, password, rate_limiter, workers
+    ) as dispatcher:
+        for assignment in assignment_names:
+            logging.info(f"Sending {assignment} grades...")
+            subject = get_subject(assignment, course_code)
+            # Plan every email before any network I/O
+            plans = plan_emails(
+                students,
+                assignment,
+                gradebook,
+                shared_attachments,
+                shrink_pdfs,
+                image_scale,
+            )
+            sleep(
+                SEND_EVERY_N_SECONDS
+            )  # gives time to interrupt the program without sending the first email
+            for plan in plans:
+                dispatcher.submit(
+                    send_student_grade,
+                    plan,
+                    subject,
+                    from_addr,
+                    journal,
+                    resend,
+                    drive_sync,
                 )
-                file_path.rename(file_path.parent / new_name)
-            # Get the file paths for the attachments
-            files_path = [
-                str((assignment_dir / f).resolve())
-                for f in os.listdir(assignment_dir)
-                if f.endswith(".pdf")
-            ]
-            # Handle cases where there are no files or the files are too large
-            if len(files_path) == 0:
+            failed = dispatcher.wait()
+            if failed:
+                logging.error(f"{failed} {assignment} emails could not be sent")
+    logging.info("Done!")
+
+
+def render_grades(
+    students: Sequence[Student],
+    assignment_names: list[str],
+    from_addr: str = USER,
+    course_code: str = YAML_CONFIG.course_code,
+    resend: bool = False,
+    outbox: Outbox | None = None,
+    common_files_path: list[str] | None = None,
+    shrink_pdfs: bool = False,
+    image_scale: float | None = None,
+) -> None:
+    """
+    Render the feedback emails into the outbox without connecting to the server.
+
+    The emails are planned and every message is rendered with its attachments in
+    parallel worker processes. A message with attached files also gets a fallback
+    that links to the files instead, in case the server refuses it as too large. The
+    outbox can then be reviewed and sent with `flush_outbox`, which copies the linked
+    files to Google Drive. Emails the outbox journal marks as sent are not rendered
+    unless resend is True.
+
+    Args:
+        students (Sequence[Student]): A list of `Student` objects.
+        assignment_names (list[str]): A list of assignment names to render grades for.
+        from_addr (str, optional): The email address of the sender. Defaults to USER.
+        course_code (str, optional): The course code. Defaults to YAML_CONFIG.course_code.
+        resend (bool, optional): Render also the emails the outbox journal marks as sent. Defaults to False.
+        outbox (Outbox | None, optional): The outbox. Defaults to None, which uses OUTBOX_PATH.
+        common_files_path (list[str] | None, optional): Files attached to every email, e.g. the solutions. Defaults to None.
+        shrink_pdfs (bool, optional): Send optimized copies of the feedback PDFs when they are smaller. Defaults to False.
+        image_scale (float | None, optional): The factor to downsample JPEG images by when shrinking. Defaults to None.
+
+    Returns:
+        None
+    """
+    outbox = outbox or Outbox()
+    gradebook = load_gradebook()
+    shared_attachments = encode_common_files(common_files_path)
+    with OutboxJournal() as journal, ProcessPoolExecutor(
+        initializer=init_render_worker, initargs=(shared_attachments,)
+    ) as executor:
+        for assignment in assignment_names:
+            discarded = outbox.discard([assignment])
+            if discarded:
                 logging.info(
-                    f"No pdf files found for {student.email} in {assignment_dir}"
+                    f"Discarded {discarded} previously rendered {assignment} emails"
                 )
-                body = EmailBody(
-                    assignment.replace("_", " "), student, student_grade, summary_stats
-                ).get_no_attachment_email_body()
-                send_email(user, password, from_addr, to_addr, subject, body)
-            else:
-                try:
-                    body = EmailBody(
-                        assignment.replace("_", " "),
-                        student,
-                        student_grade,
-                        summary_stats,
-                    ).get_email_body()
-                    send_email(
-                        user, password, from_addr, to_addr, subject, body, files_path
+            subject = get_subject(assignment, course_code)
+            futures = []
+            for plan in plan_emails(
+                students,
+                assignment,
+                gradebook,
+                shared_attachments,
+                shrink_pdfs,
+                image_scale,
+            ):
+                email_hash = plan.get_content_hash(subject)
+                if not resend and journal.is_sent(
+                    assignment, plan.student.bilkent_id, email_hash
+                ):
+                    continue
+                headers = {
+                    ASSIGNMENT_HEADER: assignment,
+                    BILKENT_ID_HEADER: plan.student.bilkent_id,
+                    CONTENT_HASH_HEADER: email_hash,
+                }
+                fallback = None
+                if plan.route == DRIVE_LINK:
+                    headers.update(drive_headers(plan.files_path, plan.drive_folder))
+                elif plan.route == ATTACH:
+                    fallback = (
+                        plan.email_body.get_large_file_email_body(),
+                        headers | drive_headers(plan.files_path, plan.drive_folder),
                     )
-                    logging.info(f"Email sent successfully to {student.email}")
-                except SMTPSenderRefused:
-                    logging.error(
-                        f"Could not send email to {student.email}, file is too large"
+                futures.append(
+                    executor.submit(
+                        render_message,
+                        str(outbox.path),
+                        from_addr,
+                        [plan.student.email],
+                        subject,
+                        plan.get_body(),
+                        plan.files_path if plan.route == ATTACH else None,
+                        headers,
+                        fallback,
                     )
-                    sleep(SEND_EVERY_N_SECONDS)
-                    body = EmailBody(
-                        assignment.replace("_", " "),
-                        student,
-                        student_grade,
-                        summary_stats,
-                    ).get_large_file_email_body()
-                    send_email(user, password, from_addr, to_addr, subject, body)
-                    # Copy files to Google Drive
-                    google_drive_folder = (
-                        Path(YAML_CONFIG.google_drive_path).resolve().expanduser()
-                        / (student.last_name + "_" + student.bilkent_id)
-                        / assignment
-                    )
-                    google_drive_folder.mkdir(parents=True, exist_ok=True)
-                    for file in files_path:
-                        subprocess.run(["cp", file, google_drive_folder], check=False)
-                    logging.info(f"Files copied to {google_drive_folder}")
-            sleep(SEND_EVERY_N_SECONDS)
+                )
+            for future in futures:
+                future.result()
+            logging.info(
+                f"Rendered {len(futures)} {assignment} emails to {outbox.path}"
+            )
+
+
+def flush_message(
+    session: SMTPSession,
+    message_path: Path,
+    outbox: Outbox,
+    journal: OutboxJournal,
+    resend: bool = False,
+    drive_sync: DriveSync | None = None,
+) -> None:
+    """
+    Send a rendered message as it is and move it out of the pending messages.
+
+    The outbox headers are stripped before sending. If the server refuses the message
+    as too large, its fallback is sent instead. The files the sent message links to
+    are copied to Google Drive.
+
+    Args:
+        session (SMTPSession): The SMTP session to send the email with.
+        message_path (Path): The path of the rendered message.
+        outbox (Outbox): The outbox of the message.
+        journal (OutboxJournal): The outbox journal.
+        resend (bool, optional): Send even if the journal marks the email as sent. Defaults to False.
+        drive_sync (DriveSync | None, optional): The queue to copy the linked files to Google Drive with. Defaults to None, which copies them before returning.
+
+    Returns:
+        None
+    """
+    headers = outbox.read_headers(message_path)
+    key = outbox.read_journal_key(message_path)
+    to_addr = headers["To"].split(",")
+    if not resend and journal.is_sent(*key):
+        logging.info(f"Skipping {headers['To']}, {key[0]} email was already sent")
+        outbox.mark_flushed(message_path)
+        return
+    journal.mark(*key, PENDING)
+    sent_path = message_path
+    try:
+        try:
+            session.sendmail(
+                headers["From"],
+                to_addr,
+                SpooledMessage(message_path, PRIVATE_HEADER_PREFIX),
+            )
+        except (SMTPSenderRefused, SMTPDataError) as e:
+            fallback_path = outbox.fallback_path(message_path)
+            if fallback_path is None or not is_message_too_large(e):
+                raise
+            logging.error(
+                f"Could not send email to {headers['To']}, file is too large, "
+                "sharing it via Google Drive"
+            )
+            session.sendmail(
+                headers["From"],
+                to_addr,
+                SpooledMessage(fallback_path, PRIVATE_HEADER_PREFIX),
+            )
+            sent_path = fallback_path
+    except Exception as e:
+        journal.mark(*key, FAILED, repr(e))
+        raise
+    journal.mark(*key, SENT)
+    drive_files = outbox.read_drive_files(sent_path)
+    if drive_files is not None:
+        copy_to_google_drive(*drive_files, drive_sync)
+    outbox.mark_flushed(message_path)
+    logging.info(f"Email sent successfully to {headers['To']}")
+
+
+def flush_outbox(
+    user: str = USER,
+    password: str = PASSWORD,
+    workers: int = YAML_CONFIG.email_workers,
+    resend: bool = False,
+    outbox: Outbox | None = None,
+) -> None:
+    """
+    Send every rendered message in the outbox, with the same rate limits as send_grades.
+
+    Args:
+        user (str, optional): The email address of the sender. Defaults to USER.
+        password (str, optional): The password of the sender. Defaults to PASSWORD.
+        workers (int, optional): The number of concurrent senders. Defaults to YAML_CONFIG.email_workers.
+        resend (bool, optional): Send also the emails the outbox journal marks as sent. Defaults to False.
+        outbox (Outbox | None, optional): The outbox. Defaults to None, which uses OUTBOX_PATH.
+
+    Returns:
+        None
+    """
+    outbox = outbox or Outbox()
+    pending = outbox.pending()
+    user_input = (
+        input(f"Do you want to send {len(pending)} emails in {outbox.path}? [y/N]: ")
+        or "n"
+    ).lower()
+    if user_input != "y":
+        return
+    rate_limiter = RateLimiter(EMAILS_PER_MINUTE, YAML_CONFIG.emails_per_hour)
+    with OutboxJournal() as journal, DriveSync() as drive_sync, EmailDispatcher(
+        user, password, rate_limiter, workers
+    ) as dispatcher:
+        for message_path in pending:
+            dispatcher.submit(
+                flush_message, message_path, outbox, journal, resend, drive_sync
+            )
+        failed = dispatcher.wait()
+    if failed:
+        logging.error(f"{failed} emails could not be sent, they are kept in the outbox")
     logging.info("Done!")
@@ -0,0 +1,243 @@
+"""Module for splitting a scanned stack of papers straight into the students' directories."""
+
+import os
+from itertools import count
+from pathlib import Path
+from statistics import median
+from typing import Iterator, Sequence
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from rich import print as rprint
+
+from ta_workflow.matcher import ID_IN_TEXT_SCORE, NameMatcher
+from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.student import Student
+
+# The rules a stack is split by
+PAGES = "pages"
+BLANK = "blank"
+COVER = "cover"
+BOUNDARIES = (PAGES, BLANK, COVER)
+
+# A page without text whose content is smaller than this fraction of the median page
+# of the stack is a blank separator page, e.g. a scanned empty sheet
+BLANK_PAGE_RATIO = 0.1
+
+
+def page_ink(page: PageObject) -> int:
+    """
+    Measure how much a page draws by the encoded size of its content and images.
+
+    Scanners compress empty sheets to a fraction of the size of written ones, so the
+    size tells blank pages apart without decoding or rendering them.
+
+    Args:
+        page (PageObject): The page.
+
+    Returns:
+        int: The total size of the content streams and the images of the page in bytes.
+    """
+    contents = page.get("/Contents")
+    contents = contents.get_object() if contents is not None else []
+    streams = contents if isinstance(contents, list) else [contents]
+    ink = sum(len(stream.get_object()._data) for stream in streams)
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    for xobject in (xobjects.get_object() if xobjects else {}).values():
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") == "/Image":
+            ink += len(xobject._data)
+    return ink
+
+
+def page_text(page: PageObject) -> str:
+    """
+    Extract the text of a page, empty if the page cannot be read or has no text layer.
+
+    Args:
+        page (PageObject): The page.
+
+    Returns:
+        str: The text of the page.
+    """
+    try:
+        return page.extract_text()
+    except Exception:  # a page that cannot be read is treated as a scan
+        return ""
+
+
+def stack_segments(
+    reader: PdfReader,
+    matcher: NameMatcher,
+    boundary: str,
+    pages_per_student: int | None = None,
+) -> Iterator[tuple[Student | None, list[PageObject]]]:
+    """
+    Split the pages of a stack into the papers of the students, in one pass.
+
+    Splitting by BLANK measures the size of every page first, to tell the blank pages
+    of the stack from the written ones.
+
+    Args:
+        reader (PdfReader): The reader of the stack.
+        matcher (NameMatcher): The matcher of the roster, finds the student of a paper by the bilkent id or the full name on its first page.
+        boundary (str): PAGES for papers of pages_per_student pages, BLANK for papers separated by blank pages or COVER for papers starting with a page with a bilkent id of the roster.
+        pages_per_student (int | None, optional): The number of pages of every paper, required for PAGES. Defaults to None.
+
+    Raises:
+        ValueError: If the boundary is unknown or pages_per_student is missing for PAGES.
+
+    Yields:
+        tuple[Student | None, list[PageObject]]: The student and the pages of every paper, in stack order. The student is None if the paper could not be identified.
+    """
+    if boundary not in BOUNDARIES:
+        raise ValueError(f"Unknown boundary {boundary}, use one of {BOUNDARIES}")
+    if boundary == PAGES and not pages_per_student:
+        raise ValueError(f"pages_per_student is required to split by {PAGES}")
+    blank_ink = 0.0
+    if boundary == BLANK:
+        blank_ink = BLANK_PAGE_RATIO * median(page_ink(page) for page in reader.pages)
+
+    student: Student | None = None
+    pages: list[PageObject] = []
+    has_text = False
+    for i, page in enumerate(reader.pages):
+        if boundary == PAGES:
+            assert pages_per_student is not None
+            if i % pages_per_student == 0:
+                if pages:
+                    yield student, pages
+                student, pages = matcher.match_text([page_text(page)])[0][0], []
+            pages.append(page)
+            continue
+        text = page_text(page)
+        has_text = has_text or bool(text.strip())
+        if boundary == BLANK and not text.strip() and page_ink(page) <= blank_ink:
+            # A separator ends the paper and is not part of any paper
+            if pages:
+                yield student, pages
+            student, pages = None, []
+            continue
+        if boundary == COVER:
+            cover_student, score = matcher.match_text([text])[0]
+            # A paper starts at the first page with the bilkent id of another student,
+            # the id can be repeated on every page of a paper
+            if score == ID_IN_TEXT_SCORE and cover_student != student:
+                if pages:
+                    yield student, pages
+                student, pages = cover_student, []
+        elif not pages:
+            student = matcher.match_text([text])[0][0]
+        pages.append(page)
+    if pages:
+        yield student, pages
+    if boundary == COVER and not has_text:
+        rprint(
+            f"[yellow]No page has a text layer, so no cover could be found. Split "
+            f"image-only scans by {BLANK} or {PAGES}, or run OCR on them first.[/yellow]"
+        )
+
+
+def write_pages(pages: list[PageObject], destination: Path) -> Path:
+    """
+    Write pages to a new PDF atomically, never overwriting an existing file.
+
+    If the destination exists, e.g. a graded paper, the PDF is written next to it with
+    a numbered suffix instead.
+
+    Args:
+        pages (list[PageObject]): The pages.
+        destination (Path): The path of the PDF.
+
+    Returns:
+        Path: The path the PDF was written to.
+    """
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            writer.write(f)
+        path = destination
+        for n in count(2):
+            try:
+                # Linking fails if the name is taken, unlike renaming
+                os.link(tmp_path, path)
+                break
+            except FileExistsError:
+                pass
+            except OSError:  # a file system without hard links
+                if not path.exists():
+                    os.replace(tmp_path, path)
+                    break
+            path = destination.with_stem(f"{destination.stem}_{n}")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    if path != destination:
+        rprint(f"[yellow]{destination} exists, saved to {path}[/yellow]")
+    return path
+
+
+def split_stack(
+    file_path_str: str,
+    assignment_name: str,
+    students: Sequence[Student],
+    boundary: str = COVER,
+    pages_per_student: int | None = None,
+) -> dict[str, Path]:
+    """
+    Split a scanned stack of papers into the students' assignment directories.
+
+    The paper of every student is written to `<last_name>_<bilkent_id>/<assignment>/`
+    as `<assignment>.pdf` while the stack is read, without intermediate part files.
+    Papers that could not be identified, or a second paper of the same student, are
+    written to the assignment directory in the project root, where `distribute` picks
+    them up.
+
+    Args:
+        file_path_str (str): The path of the stack.
+        assignment_name (str): The name of the assignment, e.g. "Quiz_1".
+        students (Sequence[Student]): The roster, e.g. from parse_and_validate_student_data.
+        boundary (str, optional): PAGES, BLANK or COVER, see stack_segments. Defaults to COVER.
+        pages_per_student (int | None, optional): The number of pages of every paper, required for PAGES. Defaults to None.
+
+    Returns:
+        dict[str, Path]: The path of the paper of every identified student by bilkent id.
+    """
+    file_path = Path(file_path_str).expanduser()
+    matcher = NameMatcher(students)
+    written: dict[str, Path] = {}
+    unmatched = pages_total = 0
+    with file_path.open("rb") as f:
+        reader = PdfReader(f)
+        for student, pages in stack_segments(
+            reader, matcher, boundary, pages_per_student
+        ):
+            pages_total += len(pages)
+            if student is not None and student.bilkent_id not in written:
+                destination = (
+                    PROJECT_ROOT
+                    / f"{student.last_name}_{student.bilkent_id}"
+                    / assignment_name
+                    / f"{assignment_name}.pdf"
+                )
+                written[student.bilkent_id] = write_pages(pages, destination)
+            else:
+                unmatched += 1
+                destination = (
+                    PROJECT_ROOT
+                    / assignment_name
+                    / f"{file_path.stem}_unmatched{unmatched}.pdf"
+                )
+                destination = write_pages(pages, destination)
+                rprint(
+                    f"[yellow]Could not identify the paper of {len(pages)} pages, "
+                    f"saved to {destination}[/yellow]"
+                )
+    rprint(
+        f"Split {pages_total} pages of {file_path.name} into {len(written)} student "
+        f"papers and {unmatched} unidentified papers"
+    )
+    return written
@@ -1,15 +1,111 @@
+import os
+from functools import partial
+from pathlib import Path
+from typing import Any, Iterator, Sequence, overload
+
+import numpy as np
 import pandas as pd
-from pydantic import BaseModel, validator
 from unidecode import unidecode
 
 from ta_workflow.config_parser import YAML_CONFIG
 from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.roster_cache import FIXED_STUDENT_DATA_PATH, read_student_data
+
+STUDENT_FIELDS = (
+    "first_name",
+    "last_name",
+    "department",
+    "bilkent_id",
+    "email",
+    "withdraw_fz",
+)
+
+# The values accepted as booleans, the same pydantic accepts
+BOOL_VALUES = {
+    **dict.fromkeys([True, "1", "on", "t", "true", "y", "yes"], True),
+    **dict.fromkeys([False, "0", "off", "f", "false", "n", "no"], False),
+}
+
+
+def convert_value(field: str, value: Any) -> str | bool | None:
+    """
+    Converts the value of a student field.
+
+    Parameters:
+    -----------
+    field : str
+        One of STUDENT_FIELDS.
+    value : Any
+        The value.
+
+    Returns:
+    --------
+    str, bool or None
+        The value as str, as bool for withdraw_fz, None if it is invalid. Numbers are
+        converted to str, so a bilkent_id read as an int becomes a str.
+    """
+    if field == "withdraw_fz":
+        return BOOL_VALUES.get(value.lower() if isinstance(value, str) else value)
+    return None if value is None else str(value)
+
+
+def validate_column(field: str, values: Sequence | pd.Series) -> np.ndarray:
+    """
+    Validates and converts the values of a student field at once.
+
+    Parameters:
+    -----------
+    field : str
+        One of STUDENT_FIELDS.
+    values : sequence or pd.Series
+        The values of the field, e.g. a column of the student data.
+
+    Raises:
+    -------
+    ValueError
+        If a value is missing, or a withdraw_fz value is not a boolean.
+
+    Returns:
+    --------
+    np.ndarray
+        The converted values, see convert_value.
+    """
+    series = pd.Series(values, dtype=object)
+    column = series.map(partial(convert_value, field))
+    invalid = column.isna()
+    if invalid.any():
+        raise ValueError(
+            f"Invalid {field} of the students in rows {series.index[invalid].tolist()}"
+        )
+    return column.to_numpy(dtype=bool if field == "withdraw_fz" else object)
+
 
+def to_ascii(names: pd.Series) -> pd.Series:
+    """
+    Converts accented characters to ASCII, unidecoding only the names that have any.
+
+    Parameters:
+    -----------
+    names : pd.Series
+        The names.
 
-class Student(BaseModel):
+    Returns:
+    --------
+    pd.Series
+        The ASCII names.
+    """
+    names = names.astype(str)
+    non_ascii = ~names.map(str.isascii).astype(bool)
+    return names.mask(non_ascii, names[non_ascii].map(unidecode))
+
+
+class Student:
     """
     Represents a student in the system.
 
+    A student is a light row of a StudentTable with a slot per field. Students are
+    equal if their fields are, and hash by their bilkent_id.
+
     Attributes:
     -----------
     first_name : str
@@ -26,10 +122,7 @@ class Student(BaseModel):
         Whether the student has withdrawn from the course.
     """
 
-    # if bilkent_id is int cast it to str before validation with pre=True
-    @validator("bilkent_id", pre=True)
-    def cast_bilkent_id_to_str(cls, v) -> str:
-        return str(v)
+    __slots__ = STUDENT_FIELDS
 
     first_name: str
     last_name: str
@@ -38,16 +131,212 @@ class Student(BaseModel):
     email: str
     withdraw_fz: bool
 
+    def __init__(self, **fields: Any) -> None:
+        """
+        Validates the fields of a single student, other keyword arguments are ignored.
+        """
+        missing = [field for field in STUDENT_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"Missing student fields {missing}")
+        for field in STUDENT_FIELDS:
+            value = convert_value(field, fields[field])
+            if value is None:
+                raise ValueError(f"Invalid {field} of the student: {fields[field]!r}")
+            setattr(self, field, value)
+
+    @classmethod
+    def from_values(cls, values: Sequence) -> "Student":
+        """
+        Creates a student from already validated values, in STUDENT_FIELDS order.
+        """
+        student = cls.__new__(cls)
+        for field, value in zip(STUDENT_FIELDS, values):
+            setattr(student, field, value)
+        return student
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, field) for field in STUDENT_FIELDS)
+
+    def __setstate__(self, state: tuple) -> None:
+        for field, value in zip(STUDENT_FIELDS, state):
+            setattr(self, field, value)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Student):
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
     def __hash__(self) -> int:
         """
         Returns a unique hash value for each instance of the class based on the bilkent_id attribute.
         """
         return hash(self.bilkent_id)
 
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}" for field in STUDENT_FIELDS
+        )
+        return f"Student({fields})"
+
+
+class StudentTable(Sequence[Student]):
+    """
+    The students of the course, stored as one array per field.
+
+    Every field is validated once for the whole column, and Student rows are only
+    created when the table is indexed or iterated. Slicing gives a table.
+
+    Attributes:
+    -----------
+    columns : dict of str to np.ndarray
+        The validated values of every field in STUDENT_FIELDS, in row order.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray]) -> None:
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "StudentTable":
+        """
+        Validates the student fields of a data frame, other columns are ignored.
+
+        Parameters:
+        -----------
+        df : pd.DataFrame
+            The student data.
+
+        Raises:
+        -------
+        ValueError
+            If a field is missing or invalid, see validate_column.
+
+        Returns:
+        --------
+        StudentTable
+            The students, in the order of the rows.
+        """
+        missing = [field for field in STUDENT_FIELDS if field not in df.columns]
+        if missing:
+            raise ValueError(f"Missing student fields {missing}")
+        return cls(
+            {field: validate_column(field, df[field]) for field in STUDENT_FIELDS}
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns["bilkent_id"])
+
+    @overload
+    def __getitem__(self, i: int) -> Student:
+        ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "StudentTable":
+        ...
+
+    def __getitem__(self, i: int | slice) -> "Student | StudentTable":
+        if isinstance(i, slice):
+            return StudentTable(
+                {field: column[i] for field, column in self.columns.items()}
+            )
+        values = [self.columns[field][i] for field in STUDENT_FIELDS]
+        return Student.from_values(
+            [
+                value.item() if isinstance(value, np.generic) else value
+                for value in values
+            ]
+        )
+
+    def __iter__(self) -> Iterator[Student]:
+        rows = zip(*(self.columns[field].tolist() for field in STUDENT_FIELDS))
+        return map(Student.from_values, rows)
+
+
+def read_registrar_data(path: Path) -> pd.DataFrame:
+    """
+    Reads a class roster as the registrar sends it and fixes its columns and names.
+
+    Parameters:
+    -----------
+    path : Path
+        The path of the roster, a .csv or .xls file.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The student data with snake case column names and ASCII names.
+    """
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, index_col=0)
+    else:
+        df = pd.read_excel(path, index_col=0)
+
+    # fix messy column names
+    df.columns = (
+        df.columns.str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+        .str.replace("/", "_")
+        .str.replace("-", "")
+    )
+
+    # fix data
+    df["withdraw_fz"] = df["withdraw_fz"].fillna(
+        False
+    )  # Replace NaN values with False for withdraw_fz column
+    df["first_name"] = to_ascii(
+        df["first_name"]
+    )  # Convert accented characters to ASCII
+    df["last_name"] = to_ascii(df["last_name"])
+    return df
+
+
+def sync_student_data(
+    roster: pd.DataFrame, path: Path = FIXED_STUDENT_DATA_PATH
+) -> pd.DataFrame:
+    """
+    Updates the fixed student data file to a new roster, keeping the grades.
+
+    The rows are the students of the new roster with their new fields, followed by the
+    students that are no longer on it, marked as withdrawn. The columns that are not
+    on the roster, e.g. the grades, are kept by bilkent id and are empty for the new
+    students.
+
+    Parameters:
+    -----------
+    roster : pd.DataFrame
+        The new roster, e.g. from read_registrar_data.
+    path : Path, optional
+        The path of the fixed student data file, replaced atomically.
+
+    Returns:
+    --------
+    pd.DataFrame
+        The updated student data.
+    """
+    try:
+        old = pd.read_excel(path)
+    except FileNotFoundError:
+        old = roster.iloc[:0]
+    old = old.set_index(old["bilkent_id"].astype(str))
+    new = roster.set_index(roster["bilkent_id"].astype(str))
+    kept = [column for column in old.columns if column not in new.columns]
+    dropped = old[~old.index.isin(new.index)].assign(withdraw_fz=True)
+    df = pd.concat([new.join(old[kept]), dropped])[list(new.columns) + kept]
+    df = df.reset_index(drop=True)
+
+    tmp_path = path.with_name(f".{path.stem}.tmp{path.suffix}")
+    try:
+        df.to_excel(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return df
+
 
 def parse_and_validate_student_data(
     resave: bool = False,
-) -> list[Student]:  # resave True for the first time ever use
+) -> StudentTable:  # resave True for the first time ever use
     """
     Reads the student data from a file and validates it.
 
@@ -59,43 +348,16 @@ def parse_and_validate_student_data(
 
     Returns:
     --------
-    A list of Student objects representing the students in the file.
+    StudentTable
+        The students in the file, created one row at a time when they are used.
     """
 
     try:
-        # Try to read the fixed Excel file first
-        df = pd.read_excel(
-            PROJECT_ROOT
-            / (YAML_CONFIG.student_data_file_name.split(".")[0] + "_fixed.xlsx")
-        )
+        # Try to read the fixed Excel file first, parsed only if it changed
+        df = read_student_data()
     except FileNotFoundError:
-        # If the fixed Excel file does not exist, try to read the original file
-        if YAML_CONFIG.student_data_file_name.endswith(".csv"):
-            df = pd.read_csv(
-                PROJECT_ROOT / YAML_CONFIG.student_data_file_name, index_col=0
-            )
-        elif YAML_CONFIG.student_data_file_name.endswith(".xls"):
-            df = pd.read_excel(
-                PROJECT_ROOT / YAML_CONFIG.student_data_file_name, index_col=0
-            )
-
-        # fix messy column names
-        df.columns = (
-            df.columns.str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-            .str.replace("/", "_")
-            .str.replace("-", "")
-        )
-
-        # fix data
-        df["withdraw_fz"] = df["withdraw_fz"].fillna(
-            False
-        )  # Replace NaN values with False for withdraw_fz column
-        df["first_name"] = df["first_name"].apply(
-            unidecode
-        )  # Convert accented characters to ASCII
-        df["last_name"] = df["last_name"].apply(unidecode)
+        # If the fixed Excel file does not exist, read the original file
+        df = read_registrar_data(PROJECT_ROOT / YAML_CONFIG.student_data_file_name)
 
         # If resave is True, save the fixed Excel file
         if resave:
@@ -105,5 +367,5 @@ def parse_and_validate_student_data(
                 index=False,
             )
 
-    # Create a list of Student objects from the data frame
-    return [Student(**row._asdict()) for row in df.itertuples()]  # type: ignore
+    # Validate the data frame a column at a time, the Student rows are created lazily
+    return StudentTable.from_frame(df)
@@ -3,25 +3,13 @@ import logging
 import pandas as pd
 
 from ta_workflow.config_parser import YAML_CONFIG
-from ta_workflow.path import PROJECT_ROOT
+from ta_workflow.gradebook import GradeBook
+from ta_workflow.roster_cache import read_student_data
 from ta_workflow.utils import init_logger
 
 pd.set_option("display.max_columns", None)
 
 
-def get_cols_after(df: pd.DataFrame, col_name: str) -> pd.Index:
-    """
-    Get the columns after the given column.
-
-    Args:
-        df (pd.DataFrame): The dataframe to get the columns from.
-
-    Returns:
-        pd.Index: The columns after the given column.
-    """
-    return df.columns[df.columns.get_loc(col_name) + 1 :]  # type: ignore
-
-
 def summarize_data() -> None:
     init_logger("summary.log")
 
@@ -30,16 +18,15 @@ def summarize_data() -> None:
     logging.info("Config file:" + "\n" + config_data_str)
 
     # Read the student data file into a pandas dataframe
-    df: pd.DataFrame = pd.read_excel(
-        PROJECT_ROOT
-        / (YAML_CONFIG.student_data_file_name.split(".")[0] + "_fixed.xlsx")
-    )
+    df: pd.DataFrame = read_student_data()
 
+    gradebook = GradeBook.from_frame(df)
     df.set_index("first_name", inplace=True)
 
     logging.info("Student data file:" + "\n" + str(df) + "\n")
 
-    df_grades = df[get_cols_after(df, "email")]
+    # Keep the rows indexed by first name, like the student data above
+    df_grades = gradebook.to_frame().set_axis(df.index)
 
     logging.info("Summary of the grades:" + "\n" + str(df_grades.describe()) + "\n")
     logging.info(
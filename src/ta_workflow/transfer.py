@@ -0,0 +1,252 @@
+"""Module for copying and linking files in process, without spawning cp or ln."""
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+from uuid import uuid4
+from zipfile import ZipFile, ZipInfo
+
+REFLINK = "reflink"
+HARDLINK = "hardlink"
+SYMLINK = "symlink"
+COPY = "copy"
+STRATEGIES = (REFLINK, HARDLINK, SYMLINK, COPY)
+
+TRANSFER_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# The ioctl that clones a file on Linux file systems with copy on write, e.g. Btrfs or XFS
+FICLONE = 0x40049409
+# Errors meaning the file system cannot clone or link, so the file is copied instead
+UNSUPPORTED_ERRNOS = frozenset(
+    {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM}
+)
+
+
+class ChecksumMismatchError(OSError):
+    """Raised when a copied file does not have the contents of its source."""
+
+
+def file_digest(file_path: Path) -> str:
+    """Hashes the contents of a file in chunks.
+
+    Args:
+        file_path (Path): path of the file
+
+    Returns:
+        str: hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with file_path.open("rb") as fp:
+        while chunk := fp.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy(source: Path, destination: Path) -> None:
+    """Copies the contents of a file in the kernel with copy_file_range where available.
+
+    Falls back to shutil, which uses sendfile on Linux and fcopyfile on macOS.
+    """
+    if not hasattr(os, "copy_file_range"):
+        shutil.copyfile(source, destination)
+        return
+    with source.open("rb") as src, destination.open("wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS | {errno.ENOSYS}:
+                raise
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst)
+
+
+def _reflink(source: Path, destination: Path) -> None:
+    """Clones a file so both share their blocks until one of them is modified."""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink is only supported on Linux")
+    import fcntl
+
+    with source.open("rb") as src, destination.open("wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def transfer_file(
+    source: Path, destination: Path, strategy: str = COPY, verify: bool = False
+) -> int:
+    """Copies or links a file to the destination, replacing it if it exists.
+
+    The file is created under a temporary name in the destination directory and renamed
+    over the destination, so readers never see a partial file. Reflinks and hardlinks
+    fall back to a copy when the file system does not support them, e.g. across devices.
+
+    Args:
+        source (Path): path of the file
+        destination (Path): path of the copy or link
+        strategy (str, optional): one of REFLINK, HARDLINK, SYMLINK or COPY, defaults to COPY
+        verify (bool, optional): compare the checksums of the source and a copy, defaults to False
+
+    Raises:
+        ValueError: if the strategy is unknown
+        ChecksumMismatchError: if verify is True and the copy differs from the source
+
+    Returns:
+        int: the number of bytes written, 0 for links
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Unknown transfer strategy {strategy}, use one of {STRATEGIES}"
+        )
+    tmp_path = destination.with_name(f".{destination.name}.{uuid4().hex}.tmp")
+    written = 0
+    try:
+        if strategy == SYMLINK:
+            os.symlink(source.resolve(), tmp_path)
+        elif strategy == HARDLINK:
+            try:
+                os.link(source, tmp_path)
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                strategy = COPY
+        elif strategy == REFLINK:
+            try:
+                _reflink(source, tmp_path)
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                strategy = COPY
+        if strategy == COPY:
+            _copy(source, tmp_path)
+            written = source.stat().st_size
+        if verify and strategy in (COPY, REFLINK):
+            if file_digest(tmp_path) != file_digest(source):
+                raise ChecksumMismatchError(f"{tmp_path} differs from {source}")
+        os.replace(tmp_path, destination)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return written
+
+
+def extract_members(zip_file: Path, members: list[tuple[ZipInfo, Path]]) -> list[bool]:
+    """Streams members of a ZIP to their destinations in one pass over the archive.
+
+    The members are read in the order they are stored, so the archive is read from
+    start to end once. Every member is decompressed straight into a temporary file
+    next to its destination and renamed over it, nothing else is extracted.
+
+    Args:
+        zip_file (Path): path of the ZIP
+        members (list[tuple[ZipInfo, Path]]): the members and the paths to extract them to
+
+    Returns:
+        list[bool]: whether every member was extracted, in the given order
+    """
+    extracted = [False] * len(members)
+    order = sorted(range(len(members)), key=lambda i: members[i][0].header_offset)
+    with ZipFile(zip_file) as archive:
+        for i in order:
+            member, destination = members[i]
+            tmp_path = destination.with_name(f".{destination.name}.{uuid4().hex}.tmp")
+            try:
+                with archive.open(member) as src, tmp_path.open("wb") as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.replace(tmp_path, destination)
+            except OSError as e:
+                tmp_path.unlink(missing_ok=True)
+                logging.error(f"Could not extract {member.filename}: {e!r}")
+            else:
+                extracted[i] = True
+    return extracted
+
+
+class FileTransfer:
+    """
+    Copies or links files from a bounded pool of worker threads.
+
+    The workers block on file system I/O with the GIL released, so a few threads keep
+    the disk busy without spawning a process per file.
+    """
+
+    def __init__(
+        self,
+        strategy: str = COPY,
+        verify: bool = False,
+        workers: int = TRANSFER_WORKERS,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown transfer strategy {strategy}, use one of {STRATEGIES}"
+            )
+        self.strategy = strategy
+        self.verify = verify
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="transfer"
+        )
+        self._futures: list[Future[int]] = []
+        self._lock = threading.Lock()
+        self.transferred_files = 0
+        self.transferred_bytes = 0
+
+    def __enter__(self) -> "FileTransfer":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+
+    def _transfer(self, source: Path, destination: Path) -> int:
+        written = transfer_file(source, destination, self.strategy, self.verify)
+        with self._lock:
+            self.transferred_files += 1
+            self.transferred_bytes += written
+        return written
+
+    def submit(self, source: Path, destination: Path) -> "Future[int]":
+        """Queues a file to be copied or linked.
+
+        Args:
+            source (Path): path of the file
+            destination (Path): path of the copy or link
+
+        Returns:
+            Future[int]: the future of the number of bytes written
+        """
+        future = self._executor.submit(self._transfer, source, destination)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def wait(self) -> int:
+        """Waits for every queued file and logs the ones that failed.
+
+        Returns:
+            int: the number of files that could not be transferred
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        failed = 0
+        for future in futures:
+            try:
+                future.result()
+            except OSError as e:
+                failed += 1
+                logging.error(f"Could not {self.strategy} a file: {e!r}")
+        return failed
@@ -1,9 +1,8 @@
 """Module for utility functions."""
 
 import logging
-import smtplib
-from email import encoders
-from email.mime.base import MIMEBase
+import math
+import os
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from pathlib import Path
@@ -14,13 +13,22 @@ import typer
 from rich.logging import RichHandler
 
 from ta_workflow.config_parser import YAML_CONFIG
+from ta_workflow.mailer import (
+    DEFAULT_SERVER_NAME,
+    EncodedAttachment,
+    MIMEStream,
+    SMTPSession,
+)
 from ta_workflow.path import LOG_PATH
-from ta_workflow.student import Student, parse_and_validate_student_data
+from ta_workflow.student import StudentTable, parse_and_validate_student_data
 
 # Define type variables
 R = TypeVar("R")
 P = ParamSpec("P")
 
+# Headers and boundaries of a message or a MIME part, a generous upper bound
+MIME_OVERHEAD_IN_BYTES = 512
+
 
 def check_log_file_name(log_file_name: str) -> str:
     """Check if the given log file name is valid and prompt the user to overwrite if necessary.
@@ -124,6 +132,27 @@ def _mime_init(
     return message
 
 
+def estimate_email_size(texts: list[str], files_path: list[str] | None = None) -> int:
+    """Estimates the size of the MIME message send_email builds, without reading the files.
+
+    Attachments are base64 encoded, which takes 4 bytes for every 3 bytes of the file
+    plus a line break every 76 characters.
+
+    Args:
+        texts (list[str]): the texts of the email, e.g. subject and body
+        files_path (list[str] | None, optional): list of file paths to be attached, defaults to None
+
+    Returns:
+        int: the estimated size of the message in bytes
+    """
+    size = MIME_OVERHEAD_IN_BYTES + sum(len(text.encode()) for text in texts)
+    for file_path in files_path or []:
+        encoded_size = 4 * math.ceil(os.path.getsize(file_path) / 3)
+        size += encoded_size + 2 * math.ceil(encoded_size / 76)
+        size += MIME_OVERHEAD_IN_BYTES + len(Path(file_path).name)
+    return size
+
+
 def send_email(
     user: str,
     password: str,
@@ -132,7 +161,9 @@ def send_email(
     subject: str,
     body: str,
     files_path: list[str] | None = None,
-    server_name: str = "asmtp.bilkent.edu.tr",
+    server_name: str = DEFAULT_SERVER_NAME,
+    session: SMTPSession | None = None,
+    shared_attachments: list[EncodedAttachment] | None = None,
 ) -> None:
     """Sends email to the given recipients.
 
@@ -145,49 +176,29 @@ def send_email(
         body (str): body of the email
         files_path (list[str] | None, optional): list of file paths to be attached, defaults to None
         server (str, optional): server name, defaults to "asmtp.bilkent.edu.tr"
+        session (SMTPSession | None, optional): an open session to reuse, defaults to None which opens a new one for this email only
+        shared_attachments (list[EncodedAttachment] | None, optional): already encoded attachments, defaults to None
     """
-    # Initialize the MIME object
-    message = _mime_init(from_addr, to_addr, subject, body)
+    # Initialize the MIME object, the files are attached while the message is sent
+    message = MIMEStream(
+        _mime_init(from_addr, to_addr, subject, body), files_path, shared_attachments
+    )
 
-    # Attach the files to the email if files_path is not None
-    for file_path in files_path or []:
-        with open(file_path, "rb") as fp:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload((fp).read())
-            # Encoding payload is necessary if encoded (compressed) file has to be attached.
-            encoders.encode_base64(part)
-            part.add_header(
-                "Content-Disposition",
-                "attachment; filename= %s" % Path(file_path).name,
-            )
-            message.attach(part)
-
-    if server_name == "localhost":  # send mail from local server
-        # Start local SMTP server
-        server = smtplib.SMTP_SSL(server_name)
-        text = message.as_string()
-        server.send_message(message)
-    else:
-        # Start SMTP server at port 465
-        server = smtplib.SMTP_SSL(server_name, 465)
-        server.ehlo()
-        # Enter login credentials for the email you want to sent mail from
-        server.login(user, password)
-        text = message.as_string()
-        # Send mail
-        server.sendmail(from_addr, to_addr, text)
-
-    server.quit()
-
-
-def prepare() -> tuple[list[Student], list[str], list[str]]:
+    if session is not None:
+        session.sendmail(from_addr, to_addr, message)
+        return
+    with SMTPSession(user, password, server_name) as one_off_session:
+        one_off_session.sendmail(from_addr, to_addr, message)
+
+
+def prepare() -> tuple[StudentTable, list[str], list[str]]:
     """Prepares the necessary data for the application.
 
     Returns:
-        tuple[list[Student], list[str], list[str]]: a tuple containing a list of Student objects, a list of homework names and a list of quiz names
+        tuple[StudentTable, list[str], list[str]]: a tuple containing the students, a list of homework names and a list of quiz names
     """
     # Parse and validate the student data from the CSV file
-    STUDENTS: list[Student] = parse_and_validate_student_data()
+    STUDENTS: StudentTable = parse_and_validate_student_data()
     # Create a list of homework names and quiz names
     HOMEWORKS_SO_FAR = [
         f"Homework_{i}" for i in range(1, YAML_CONFIG.number_of_homeworks + 1)
@@ -199,14 +210,14 @@ def prepare() -> tuple[list[Student], list[str], list[str]]:
 
 def get_students_and_selected_assignments(
     function_job: str,
-) -> tuple[list[Student], list[str]]:
+) -> tuple[StudentTable, list[str]]:
     """Prompts the user to select homeworks/quizzes and returns a list of Student objects and a list of selected assignment names.
 
     Args:
         function_job (str): the job that the function is doing (e.g. grading)
 
     Returns:
-        tuple[list[Student], list[str]]: a tuple containing a list of Student objects and a list of selected assignment names
+        tuple[StudentTable, list[str]]: a tuple containing the students and a list of selected assignment names
     """
     # Prepare the necessary data
     students, homeworks, quizzes = prepare()
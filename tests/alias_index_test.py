@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from ta_workflow.alias_index import AliasIndex, file_name_key, submission_aliases
+from ta_workflow.student import Student
+
+
+def test_file_name_key_ignores_assignment_numbers() -> None:
+    assert file_name_key("Lovelace_Ada_HW3.pdf") == file_name_key(
+        "ada lovelace hw4.PDF"
+    )
+
+
+def test_alias_index_persists_confirmed_matches(
+    tmp_path: Path, students: list[Student]
+) -> None:
+    ada, alan = students[:2]
+    path = tmp_path / "alias_index.json"
+    homework_1 = tmp_path / "Lovelace_Ada_HW1.pdf"
+    homework_1.write_bytes(b"homework 1")
+    generic_1 = tmp_path / "hw1.pdf"
+    generic_1.write_bytes(b"generic 1")
+    copied = tmp_path / "copied.pdf"
+    copied.write_bytes(b"same file")
+
+    alias_index = AliasIndex(path)
+    alias_index.confirm(submission_aliases(homework_1, None), ada)
+    alias_index.confirm(submission_aliases(generic_1, None), ada)
+    alias_index.confirm(submission_aliases(copied, "Ada Lovelace_1_file_"), ada)
+    alias_index.confirm(submission_aliases(copied, "Alan Turing_2_file_"), alan)
+    alias_index.save()
+
+    alias_index = AliasIndex(path)
+    homework_2 = tmp_path / "Lovelace_Ada_HW2.pdf"
+    homework_2.write_bytes(b"homework 2")
+    assert alias_index.lookup(submission_aliases(homework_2, None)) == "21900000"
+    # A file name without the name of the student is not recorded
+    generic_2 = tmp_path / "hw2.pdf"
+    generic_2.write_bytes(b"generic 2")
+    assert alias_index.lookup(submission_aliases(generic_2, None)) is None
+    # The same contents were matched to two students, so only the directory decides
+    assert (
+        alias_index.lookup(submission_aliases(copied, "Alan Turing_2_file_"))
+        == "21900001"
+    )
+    other = tmp_path / "other.pdf"
+    other.write_bytes(b"other")
+    assert alias_index.lookup(submission_aliases(other, None)) is None
@@ -1,10 +1,14 @@
 import logging
 from email.mime.multipart import MIMEMultipart
-from typing import Generator
+from pathlib import Path
+from typing import Callable, Generator
 
 import pytest
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
 
 from ta_workflow.path import LOG_PATH
+from ta_workflow.student import Student
 from ta_workflow.utils import _mime_init, init_logger
 
 
@@ -27,3 +31,65 @@ def sample_message() -> MIMEMultipart:
         subject="Test Subject",
         body="Test Body",
     )
+
+
+@pytest.fixture(scope="package")
+def make_student() -> Callable[..., Student]:
+    def make_student(
+        first_name: str, last_name: str, bilkent_id: int, withdraw_fz: bool = False
+    ) -> Student:
+        return Student(
+            first_name=first_name,
+            last_name=last_name,
+            department="ECON",
+            bilkent_id=bilkent_id,
+            email=f"{first_name.lower()}@example.com",
+            withdraw_fz=withdraw_fz,
+        )
+
+    return make_student
+
+
+@pytest.fixture
+def students(make_student: Callable[..., Student]) -> list[Student]:
+    names = [
+        ("Ada", "Lovelace"),
+        ("Alan", "Turing"),
+        ("Grace", "Hopper"),
+        ("Şule", "Öztürk"),
+        ("Edsger", "Dijkstra"),
+    ]
+    return [
+        make_student(first_name, last_name, 21900000 + i)
+        for i, (first_name, last_name) in enumerate(names)
+    ]
+
+
+@pytest.fixture(scope="package")
+def write_pdf() -> Callable[[Path, list[str]], None]:
+    def write_pdf(path: Path, texts: list[str]) -> None:
+        """Writes a PDF with a page per text, an empty text is a blank page."""
+        writer = PdfWriter()
+        font = writer._add_object(
+            DictionaryObject(
+                {
+                    NameObject("/Type"): NameObject("/Font"),
+                    NameObject("/Subtype"): NameObject("/Type1"),
+                    NameObject("/BaseFont"): NameObject("/Helvetica"),
+                }
+            )
+        )
+        for text in texts:
+            page = PageObject.create_blank_page(None, 612, 792)
+            if text:
+                page[NameObject("/Resources")] = DictionaryObject(
+                    {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+                )
+                stream = DecodedStreamObject()
+                stream.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+                page[NameObject("/Contents")] = writer._add_object(stream)
+            writer.add_page(page)
+        with path.open("wb") as fp:
+            writer.write(fp)
+
+    return write_pdf
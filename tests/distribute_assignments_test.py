@@ -0,0 +1,128 @@
+from pathlib import Path
+from zipfile import ZipFile
+
+import pytest
+
+from ta_workflow import distribute_assignments
+from ta_workflow.alias_index import FILE_NAME, AliasIndex
+from ta_workflow.distribute_assignments import (
+    distribute_assignment,
+    init_distribute_worker,
+    scan_zip,
+    snapshot_directory,
+    watch_assignments,
+)
+from ta_workflow.matcher import NameMatcher
+from ta_workflow.student import Student
+from ta_workflow.transfer import extract_members
+
+
+def test_scan_zip_and_extract_matched_members(tmp_path: Path) -> None:
+    zip_file = tmp_path / "submissions.zip"
+    with ZipFile(zip_file, "w") as archive:
+        archive.writestr("Ada Lovelace_101_assignsubmission_file_/hw1.pdf", b"ada")
+        archive.writestr("Alan Turing_102_assignsubmission_file_/a.pdf", b"alan")
+        archive.writestr("Alan Turing_102_assignsubmission_file_/b.pdf", b"alan")
+        archive.writestr("Grace Hopper_103_assignsubmission_file_/notes.txt", b"")
+
+    members, queries, aliases, moodle_dir = scan_zip(zip_file)
+
+    # A directory with more than one PDF is ambiguous, as in the extracted directory
+    assert queries == ["Ada Lovelace_101_assignsubmission_file_ hw1.pdf"]
+    assert moodle_dir
+    assert aliases[0]["moodle_dir"] == "ada lovelace 101 assignsubmission file"
+
+    destination = tmp_path / "Lovelace_21900000" / "Homework_1"
+    destination.mkdir(parents=True)
+    missing = tmp_path / "missing" / "hw1.pdf"
+    extracted = extract_members(
+        zip_file, [(members[0], destination / "hw1.pdf"), (members[0], missing)]
+    )
+
+    assert extracted == [True, False]
+    assert (destination / "hw1.pdf").read_bytes() == b"ada"
+
+
+def test_snapshot_directory_changes_with_submissions(tmp_path: Path) -> None:
+    (tmp_path / "ada_lovelace.pdf").write_bytes(b"ada")
+    (tmp_path / "notes.txt").write_bytes(b"")
+    moodle_dir = tmp_path / "Alan Turing_102_assignsubmission_file_"
+    moodle_dir.mkdir()
+    before = snapshot_directory(tmp_path)
+
+    (moodle_dir / "hw1.pdf").write_bytes(b"alan")
+    after = snapshot_directory(tmp_path)
+
+    assert set(before) == {"ada_lovelace.pdf", moodle_dir.name}
+    assert before["ada_lovelace.pdf"] == after["ada_lovelace.pdf"]
+    assert before[moodle_dir.name] != after[moodle_dir.name]
+
+
+def test_distribute_assignment_prefers_the_contents_to_aliases(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, students: list[Student]
+) -> None:
+    monkeypatch.setattr(distribute_assignments, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(
+        distribute_assignments,
+        "extract_texts",
+        lambda files_path, digests, workers: [
+            "Alan Turing 21900001" if file.name == "hw2.pdf" else ""
+            for file in files_path
+        ],
+    )
+    (tmp_path / "Homework_2").mkdir()
+    (tmp_path / "Homework_2" / "hw2.pdf").write_bytes(b"alan")
+    (tmp_path / "Turing_21900001" / "Homework_2").mkdir(parents=True)
+    alias_index = AliasIndex(tmp_path / "alias_index.json")
+    # A stale alias of a generic name, recorded before names were required
+    alias_index.aliases[FILE_NAME]["hw"] = "21900000"
+    init_distribute_worker(NameMatcher(students), alias_index, collect_logs=False)
+
+    _, confirmed = distribute_assignment("Homework_2", copy=True)
+
+    assert [bilkent_id for _, bilkent_id in confirmed] == ["21900001"]
+    assert (tmp_path / "Turing_21900001" / "Homework_2" / "hw2.pdf").exists()
+
+
+def test_watch_assignments_distributes_only_new_and_changed_submissions(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, students: list[Student]
+) -> None:
+    monkeypatch.setattr(distribute_assignments, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(
+        distribute_assignments,
+        "AliasIndex",
+        lambda: AliasIndex(tmp_path / "alias_index.json"),
+    )
+    assignment_dir = tmp_path / "Homework_2"
+    assignment_dir.mkdir()
+    (assignment_dir / "alan_turing.pdf").write_bytes(b"first")
+    turing_dir = tmp_path / "Turing_21900001" / "Homework_2"
+    turing_dir.mkdir(parents=True)
+    (turing_dir / "alan_turing.pdf").write_bytes(b"graded")
+    (tmp_path / "Lovelace_21900000" / "Homework_2").mkdir(parents=True)
+    graded: list[bytes] = []
+    ticks = iter(
+        [
+            lambda: (assignment_dir / "ada_lovelace.pdf").write_bytes(b"ada"),
+            lambda: None,
+            lambda: graded.append((turing_dir / "alan_turing.pdf").read_bytes()),
+            lambda: (assignment_dir / "alan_turing.pdf").write_bytes(b"second"),
+            lambda: None,
+        ]
+    )
+
+    def sleep(interval: float) -> None:
+        try:
+            next(ticks)()
+        except StopIteration:
+            raise KeyboardInterrupt from None
+
+    monkeypatch.setattr(distribute_assignments, "sleep", sleep)
+
+    watch_assignments(students, ["Homework_2"], copy=True, interval=0)
+
+    # The submission there before watching is only copied once it is resubmitted
+    assert graded == [b"graded"]
+    lovelace_dir = tmp_path / "Lovelace_21900000" / "Homework_2"
+    assert (lovelace_dir / "ada_lovelace.pdf").read_bytes() == b"ada"
+    assert (turing_dir / "alan_turing.pdf").read_bytes() == b"second"
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from ta_workflow.drive_sync import DriveSync
+
+
+def test_drive_sync_skips_unchanged_files(tmp_path: Path) -> None:
+    feedback = tmp_path / "feedback.pdf"
+    feedback.write_bytes(b"feedback" * 1000)
+    google_drive_path = tmp_path / "drive"
+    folder = Path("Doe_22001234") / "Homework_1"
+
+    with DriveSync(google_drive_path) as drive_sync:
+        drive_sync.submit([str(feedback)], folder)
+    assert (google_drive_path / folder / "feedback.pdf").read_bytes() == (
+        feedback.read_bytes()
+    )
+    assert drive_sync.copied_bytes == feedback.stat().st_size
+
+    with DriveSync(google_drive_path) as drive_sync:
+        drive_sync.submit([str(feedback)], folder)
+    assert (drive_sync.copied_files, drive_sync.skipped_files) == (0, 1)
+
+    # Same size but different contents is copied again
+    feedback.write_bytes(b"FEEDBACK" * 1000)
+    with DriveSync(google_drive_path) as drive_sync:
+        drive_sync.submit([str(feedback)], folder)
+    assert drive_sync.copied_files == 1
+    assert (google_drive_path / folder / "feedback.pdf").read_bytes() == (
+        feedback.read_bytes()
+    )
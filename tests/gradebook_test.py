@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ta_workflow.gradebook import GradeBook
+
+
+@pytest.fixture
+def gradebook() -> GradeBook:
+    df = pd.DataFrame(
+        {
+            "first_name": ["Ada", "Alan"],
+            "last_name": ["Lovelace", "Turing"],
+            "bilkent_id": [21900000, 21900001],
+            "email": ["ada@example.com", "alan@example.com"],
+            "Homework_1": [90.125, 75.0],
+            "Quiz_1": [10.0, 8.5],
+        }
+    )
+    return GradeBook.from_frame(df)
+
+
+def test_gradebook_lookups(gradebook: GradeBook) -> None:
+    assert gradebook.assignments == ["Homework_1", "Quiz_1"]
+    assert gradebook.grade("21900001", "Quiz_1") == 8.5
+    rows = gradebook.rows(["21900001", "21900000"])
+    assert gradebook.column("Homework_1")[rows].tolist() == [75.0, 90.125]
+    assert gradebook.describe("Quiz_1")["max"] == 10.0
+    assert gradebook.to_frame().loc["21900000", "Homework_1"] == 90.125
+
+
+def test_gradebook_reads_cells_that_are_not_numbers_as_missing(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    df = pd.DataFrame(
+        {
+            "bilkent_id": [21900000, 21900001],
+            "email": ["ada@example.com", "alan@example.com"],
+            "Homework_1": [90.0, "absent"],
+            "Quiz_1": [None, 8.5],
+        }
+    )
+
+    gradebook = GradeBook.from_frame(df)
+
+    assert gradebook.grade("21900000", "Homework_1") == 90.0
+    assert np.isnan(gradebook.grade("21900001", "Homework_1"))
+    assert np.isnan(gradebook.grade("21900000", "Quiz_1"))
+    assert [record.getMessage() for record in caplog.records] == [
+        "The Homework_1 grade of 21900001 is not a number: 'absent'"
+    ]
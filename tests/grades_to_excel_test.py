@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from ta_workflow import grades_to_excel
+from ta_workflow.gradebook import GradeBook
+from ta_workflow.student import Student
+
+
+def test_grades_to_excel_writes_every_format(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    make_student: Callable[..., Student],
+) -> None:
+    gradebook = GradeBook(
+        ["21900000", "21900001"], ["Homework_1", "Quiz_1"], [[90.125, 10], [75, 8.5]]
+    )
+    monkeypatch.setattr(grades_to_excel, "load_gradebook", lambda: gradebook)
+    monkeypatch.setattr(grades_to_excel, "PROJECT_ROOT", tmp_path)
+    students = [make_student("Alan", "Turing", 21900001)]
+
+    manifest_path = tmp_path / "export_manifest.json"
+
+    def export() -> None:
+        grades_to_excel.grades_to_excel(
+            students,
+            ["Homework_1", "Quiz_1"],
+            False,
+            ("xls", "csv"),
+            workers=1,
+            manifest_path=manifest_path,
+        )
+
+    export()
+    assert (tmp_path / "Quiz_1.csv").read_text() == "21900001,8.5\n"
+    assert (tmp_path / "Homework_1.xls").stat().st_size > 0
+
+    # Only the files of the changed grades, or of edited files, are written again
+    written = []
+    monkeypatch.setattr(
+        grades_to_excel,
+        "write_grades",
+        lambda *args: written.append(args[0]) or tmp_path / f"{args[0]}.{args[3]}",
+    )
+    gradebook.grades[1, 1] = 9
+    (tmp_path / "Homework_1.csv").write_text("edited")
+    export()
+    assert written == ["Homework_1", "Quiz_1", "Quiz_1"]
+
+    with pytest.raises(ValueError):
+        grades_to_excel.grades_to_excel(students, ["Quiz_1"], False, ("ods",))
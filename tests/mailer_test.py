@@ -0,0 +1,320 @@
+import copy
+import email
+import os
+import smtplib
+import socketserver
+import threading
+from email.mime.multipart import MIMEMultipart
+from pathlib import Path
+from typing import Generator
+
+import pytest
+
+from ta_workflow.mailer import (
+    BASE64_CHUNK_IN_BYTES,
+    EmailDispatcher,
+    EncodedAttachment,
+    MIMEStream,
+    RateLimiter,
+    SMTPSession,
+    SpooledMessage,
+    is_message_too_large,
+    throttling_code,
+)
+from ta_workflow.utils import _mime_init
+
+
+class FakeSMTP:
+    """Records the calls made by SMTPSession, the first connection drops on send."""
+
+    connections = 0
+
+    def __init__(self, *args, **kwargs) -> None:
+        FakeSMTP.connections += 1
+        self.connection_number = FakeSMTP.connections
+        self.sent: list[tuple[str, list[str], str]] = []
+
+    def ehlo(self) -> None:
+        pass
+
+    def login(self, user: str, password: str) -> None:
+        pass
+
+    def has_extn(self, name: str) -> bool:
+        return False
+
+    def sendmail(self, from_addr: str, to_addr: list[str], message: str) -> None:
+        if self.connection_number == 1:
+            raise smtplib.SMTPServerDisconnected("dropped")
+        self.sent.append((from_addr, to_addr, message))
+
+    def quit(self) -> None:
+        pass
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """A plain SMTP server on localhost that answers 421 to the first MAIL FROMs."""
+
+    daemon_threads = True
+
+    def __init__(self, throttled: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), FakeSMTPHandler)
+        self.throttled = throttled
+        self.pipelining = False
+        self.messages: list[bytes] = []
+        self.quits = 0
+        self.lock = threading.Lock()
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    server: FakeSMTPServer
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        self.reply("220 fake ESMTP")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO") and self.server.pipelining:
+                self.reply("250-fake")
+                self.reply("250 PIPELINING")
+            elif command.startswith(("EHLO", "HELO")):
+                self.reply("250 fake")
+            elif command.startswith("MAIL"):
+                with self.server.lock:
+                    throttle = self.server.throttled > 0
+                    self.server.throttled -= throttle
+                if throttle:
+                    # The server closes the connection after a 421
+                    self.reply("421 4.7.0 Too many messages, try again later")
+                    return
+                self.reply("250 OK")
+            elif command.startswith("RCPT"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                with self.server.lock:
+                    self.server.messages.append(data.strip())
+                self.reply("250 OK")
+            elif command == "RSET":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                with self.server.lock:
+                    self.server.quits += 1
+                self.reply("221 Bye")
+                return
+
+
+@pytest.fixture
+def smtp_server(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> Generator[FakeSMTPServer, None, None]:
+    server = FakeSMTPServer(getattr(request, "param", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    # The sessions connect to the fake server in plain text
+    monkeypatch.setattr(
+        smtplib, "SMTP_SSL", lambda *args, **kwargs: smtplib.SMTP("127.0.0.1", port)
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+MESSAGE_KINDS = ["str", "stream", "pipelined stream", "spooled"]
+
+
+def make_message(
+    kind: str, subject: str, tmp_path: Path
+) -> "str | MIMEStream | SpooledMessage":
+    """Builds a message of the given kind, the way send_grades sends it."""
+    message = _mime_init("a@example.com", ["b@example.com"], subject, "Body")
+    if kind == "str":
+        return message.as_string()
+    if kind == "spooled":
+        path = tmp_path / f"{subject}.eml"
+        with path.open("wb") as fp:
+            MIMEStream(message).write(fp)
+        return SpooledMessage(path)
+    return MIMEStream(message)
+
+
+def received_subjects(smtp_server: FakeSMTPServer) -> list[str]:
+    return sorted(
+        str(email.message_from_bytes(message)["Subject"])
+        for message in smtp_server.messages
+    )
+
+
+@pytest.mark.parametrize("smtp_server", [2], indirect=True)
+@pytest.mark.parametrize("kind", MESSAGE_KINDS)
+def test_smtp_session_retries_throttled_sends(
+    smtp_server: FakeSMTPServer, kind: str, tmp_path: Path
+) -> None:
+    smtp_server.pipelining = kind == "pipelined stream"
+    rate_limiter = RateLimiter(emails_per_minute=600, initial_backoff_in_seconds=0)
+
+    with SMTPSession(
+        "user", "password", "localhost", rate_limiter=rate_limiter
+    ) as session:
+        session.sendmail(
+            "a@example.com", ["b@example.com"], make_message(kind, "1", tmp_path)
+        )
+
+    # Backed off after each 421, then sent on a new connection
+    assert rate_limiter._consecutive_backoffs == 0
+    assert rate_limiter._minute_bucket.rate < 600 / 60 / 2
+    assert received_subjects(smtp_server) == ["1"]
+    assert smtp_server.quits == 1
+
+
+@pytest.mark.parametrize("smtp_server", [2], indirect=True)
+@pytest.mark.parametrize("kind", MESSAGE_KINDS)
+def test_email_dispatcher_sends_through_every_worker(
+    smtp_server: FakeSMTPServer, kind: str, tmp_path: Path
+) -> None:
+    smtp_server.pipelining = kind == "pipelined stream"
+    rate_limiter = RateLimiter(emails_per_minute=600, initial_backoff_in_seconds=0)
+
+    def send(session: SMTPSession, i: int) -> None:
+        message = make_message(kind, str(i), tmp_path)
+        session.sendmail("a@example.com", ["b@example.com"], message)
+
+    with EmailDispatcher(
+        "user", "password", rate_limiter, workers=2, server_name="localhost"
+    ) as dispatcher:
+        for i in range(6):
+            dispatcher.submit(send, i)
+        assert dispatcher.wait() == 0
+        sessions = list(dispatcher._sessions)
+
+    assert received_subjects(smtp_server) == [str(i) for i in range(6)]
+    assert rate_limiter._minute_bucket.rate < 600 / 60
+    # Every worker session is closed on exit
+    assert all(session._server is None for session in sessions)
+    assert smtp_server.quits == len(sessions)
+
+
+def test_email_dispatcher_cancels_queued_emails_on_interrupt(
+    smtp_server: FakeSMTPServer,
+) -> None:
+    rate_limiter = RateLimiter(emails_per_minute=600)
+    started, release = threading.Event(), threading.Event()
+
+    def send(session: SMTPSession, i: int) -> None:
+        if i == 0:
+            started.set()
+            release.wait(5)
+        session.sendmail("a@example.com", ["b@example.com"], f"Subject: {i}")
+
+    with pytest.raises(KeyboardInterrupt):
+        with EmailDispatcher(
+            "user", "password", rate_limiter, server_name="localhost"
+        ) as dispatcher:
+            futures = [dispatcher.submit(send, i) for i in range(4)]
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            raise KeyboardInterrupt
+
+    # The email being sent finishes, the queued ones are never started
+    assert smtp_server.messages == [b"Subject: 0"]
+    assert [future.cancelled() for future in futures] == [False, True, True, True]
+    assert smtp_server.quits == 1
+
+
+def test_smtp_session_reconnects(monkeypatch: pytest.MonkeyPatch) -> None:
+    FakeSMTP.connections = 0
+    monkeypatch.setattr(smtplib, "SMTP_SSL", FakeSMTP)
+
+    with SMTPSession("user", "password", "example.com") as session:
+        session.sendmail("a@example.com", ["b@example.com"], "first")
+        session.sendmail("a@example.com", ["b@example.com"], "second")
+        server = session._server
+
+    # One reconnect after the drop, then the same connection is reused
+    assert FakeSMTP.connections == 2
+    assert isinstance(server, FakeSMTP)
+    assert [message for _, _, message in server.sent] == ["first", "second"]
+
+
+def test_is_message_too_large() -> None:
+    assert is_message_too_large(
+        smtplib.SMTPSenderRefused(552, b"5.3.4 Message size exceeds limit", "a")
+    )
+    assert is_message_too_large(
+        smtplib.SMTPDataError(554, b"5.3.4 Message too big for system")
+    )
+    # Throttling that outlasted the retries is a failure, not a reason to reroute
+    assert not is_message_too_large(
+        smtplib.SMTPSenderRefused(451, b"4.7.1 Try again later", "a")
+    )
+    assert not is_message_too_large(smtplib.SMTPSenderRefused(421, b"Busy", "a"))
+
+
+def test_throttling_code() -> None:
+    assert throttling_code(smtplib.SMTPSenderRefused(421, b"Busy", "a")) == 421
+    assert throttling_code(smtplib.SMTPDataError(554, b"Rejected")) is None
+    assert (
+        throttling_code(
+            smtplib.SMTPRecipientsRefused(
+                {"b@example.com": (451, b"Later"), "c@example.com": (452, b"Later")}
+            )
+        )
+        == 451
+    )
+    # A recipient that does not exist is not throttling
+    assert (
+        throttling_code(
+            smtplib.SMTPRecipientsRefused(
+                {"b@example.com": (451, b"Later"), "c@example.com": (550, b"No")}
+            )
+        )
+        is None
+    )
+
+
+def test_rate_limiter_backs_off_and_recovers() -> None:
+    rate_limiter = RateLimiter(emails_per_minute=60, initial_backoff_in_seconds=0)
+    # The bucket starts full, so a minute's quota goes out without waiting
+    for _ in range(60):
+        rate_limiter.acquire()
+
+    rate_limiter.back_off()
+    assert rate_limiter._minute_bucket.rate == pytest.approx(0.5)
+    for _ in range(10):
+        rate_limiter.record_success()
+    assert rate_limiter._minute_bucket.rate == pytest.approx(1)
+
+
+def test_mime_stream_round_trip(tmp_path: Path, sample_message: MIMEMultipart) -> None:
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(os.urandom(BASE64_CHUNK_IN_BYTES + 1000))
+    message = MIMEStream(copy.deepcopy(sample_message), [str(attachment)])
+
+    streamed = b"".join(message)
+    assert len(streamed) == len(message)
+    # Streaming again yields the same message, e.g. after a reconnect
+    assert b"".join(message) == streamed
+
+    parsed = email.message_from_bytes(streamed)
+    text_part, attachment_part = parsed.get_payload()
+    assert text_part.get_payload() == "Test Body"
+    assert attachment_part.get_filename() == "feedback.pdf"
+    assert attachment_part.get_payload(decode=True) == attachment.read_bytes()
+
+
+def test_mime_stream_splices_shared_attachments(
+    tmp_path: Path, sample_message: MIMEMultipart
+) -> None:
+    solutions = tmp_path / "solutions.pdf"
+    solutions.write_bytes(os.urandom(5000))
+    shared_attachment = EncodedAttachment(str(solutions))
+    message = MIMEStream(copy.deepcopy(sample_message), None, [shared_attachment])
+
+    streamed = b"".join(message)
+    assert len(streamed) == len(message)
+    attachment_part = email.message_from_bytes(streamed).get_payload()[1]
+    assert attachment_part.get_filename() == "solutions.pdf"
+    assert attachment_part.get_payload(decode=True) == solutions.read_bytes()
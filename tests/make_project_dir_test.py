@@ -0,0 +1,47 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from ta_workflow import make_project_dir
+from ta_workflow.make_project_dir import sync_roster
+from ta_workflow.student import Student
+
+
+def test_sync_roster_touches_changed_students_only(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    make_student: Callable[..., Student],
+) -> None:
+    def student(last_name: str, bilkent_id: int, withdraw_fz: bool = False) -> Student:
+        return make_student("Ada", last_name, bilkent_id, withdraw_fz)
+
+    monkeypatch.setattr(make_project_dir, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(make_project_dir, "ARCHIVE_PATH", tmp_path / "_archive")
+    snapshot_path = tmp_path / "roster_snapshot.json"
+    old = [student("Lovelace", 1), student("Turing", 2), student("Hopper", 3)]
+    make_project_dir.make_project_dir(old, ["Quiz_1"])
+    (tmp_path / "Turing_2" / "Quiz_1" / "quiz.pdf").write_text("graded")
+
+    new = [student("Byron", 1), student("Hopper", 3, True), student("Dijkstra", 4)]
+    diff = sync_roster(new, ["Quiz_1"], old, snapshot_path=snapshot_path)
+
+    assert len(diff) == 4
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "Byron_1",
+        "Dijkstra_4",
+        "_archive",
+        "roster_snapshot.json",
+    ]
+    assert (tmp_path / "Dijkstra_4" / "Quiz_1").is_dir()
+    assert sorted(path.name for path in (tmp_path / "_archive").iterdir()) == [
+        "Hopper_3",
+        "Turing_2",
+    ]
+
+    # The snapshot is the old roster of the next sync, a reinstated student is restored
+    diff = sync_roster(
+        new + [student("Turing", 2)], ["Quiz_1"], snapshot_path=snapshot_path
+    )
+    assert [s.bilkent_id for s in diff.added] == ["2"]
+    assert (tmp_path / "Turing_2" / "Quiz_1" / "quiz.pdf").read_text() == "graded"
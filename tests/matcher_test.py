@@ -0,0 +1,51 @@
+from ta_workflow.matcher import NameMatcher
+from ta_workflow.student import Student
+
+
+def test_name_matcher_matches_file_names(students: list[Student]) -> None:
+    # Block down to two candidates so the n-gram index decides who is scored
+    name_matcher = NameMatcher(students, max_candidates=2)
+    queries = [
+        "hopper_grace_hw1.pdf",
+        "Sule_Ozturk_HW1.pdf",
+        "Alan Turing_123_assignsubmission_file_/HW1.pdf",
+    ]
+
+    matches = name_matcher.match(queries)
+
+    assert [student.last_name for student, _ in matches] == [
+        "Hopper",
+        "Öztürk",
+        "Turing",
+    ]
+    assert all(score >= 80 for _, score in matches)
+    assert NameMatcher([]).match(queries) == [(None, 0)] * 3
+
+
+def test_name_matcher_matches_texts(students: list[Student]) -> None:
+    name_matcher = NameMatcher(students)
+    texts = [
+        "ECON 101 Homework 1\nStudent ID: 21900003",
+        "Name: Grace Hopper\nInstructor: Donald Knuth",
+        "Homework 1 by Ada Lovelace and Edsger Dijkstra",
+        "",
+    ]
+
+    matches = name_matcher.match_text(texts)
+
+    assert [student and student.last_name for student, _ in matches] == [
+        "Öztürk",
+        "Hopper",
+        None,
+        None,
+    ]
+
+
+def test_name_matcher_blocks_without_shared_ngrams(students: list[Student]) -> None:
+    name_matcher = NameMatcher(students, max_candidates=2)
+
+    candidates = name_matcher.candidates(["lovelace ada hw", "scan"])
+
+    assert "Lovelace" in [students[j].last_name for j in candidates[0]]
+    assert len(candidates[1]) == 0
+    assert name_matcher.match(["scan.pdf"]) == [(None, 0)]
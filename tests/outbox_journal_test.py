@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from ta_workflow.outbox_journal import FAILED, SENT, OutboxJournal, content_hash
+
+
+def test_outbox_journal_persists_sent_emails(tmp_path: Path) -> None:
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(b"%PDF-1.4 feedback")
+    email_hash = content_hash("subject", "body", files_path=[str(attachment)])
+
+    with OutboxJournal(tmp_path / "journal.sqlite3") as journal:
+        journal.mark("Homework_1", "21900000", email_hash, SENT)
+        journal.mark("Homework_1", "21900001", email_hash, FAILED, "error")
+
+    # A new run sees only the successful send
+    with OutboxJournal(tmp_path / "journal.sqlite3") as journal:
+        assert journal.is_sent("Homework_1", "21900000", email_hash)
+        assert not journal.is_sent("Homework_1", "21900001", email_hash)
+        assert not journal.is_sent("Homework_2", "21900000", email_hash)
+
+    # Changing the attachment changes the hash, so the email is sent again
+    attachment.write_bytes(b"%PDF-1.4 regraded feedback")
+    assert content_hash("subject", "body", files_path=[str(attachment)]) != email_hash
@@ -0,0 +1,71 @@
+import email
+import os
+from pathlib import Path
+
+from ta_workflow.mailer import SpooledMessage
+from ta_workflow.outbox import (
+    ASSIGNMENT_HEADER,
+    PRIVATE_HEADER_PREFIX,
+    Outbox,
+    drive_headers,
+    render_message,
+)
+
+
+def test_render_and_read_outbox(tmp_path: Path) -> None:
+    outbox = Outbox(tmp_path / "outbox")
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(os.urandom(10_000))
+    message_path = Path(
+        render_message(
+            str(outbox.path),
+            "ta@example.com",
+            ["student@example.com"],
+            "Subject",
+            "Body\n.with a leading period",
+            [str(attachment)],
+            {ASSIGNMENT_HEADER: "Homework_1"},
+        )
+    )
+    assert outbox.pending() == [message_path]
+    assert outbox.read_headers(message_path)["To"] == "student@example.com"
+
+    # The streamed message is the rendered one, dot-stuffed for SMTP DATA
+    streamed = b"".join(SpooledMessage(message_path))
+    assert streamed.replace(b"\r\n..", b"\r\n.") == message_path.read_bytes()
+    parsed = email.message_from_bytes(message_path.read_bytes())
+    assert parsed.get_payload()[1].get_payload(decode=True) == attachment.read_bytes()
+
+    outbox.mark_flushed(message_path)
+    assert outbox.pending() == []
+    assert outbox.discard(["Homework_1"]) == 0
+
+
+def test_outbox_keeps_private_headers_local(tmp_path: Path) -> None:
+    outbox = Outbox(tmp_path / "outbox")
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(b"%PDF-1.4 feedback")
+    headers = {ASSIGNMENT_HEADER: "Homework_1"}
+    message_path = Path(
+        render_message(
+            str(outbox.path),
+            "ta@example.com",
+            ["student@example.com"],
+            "Subject",
+            "Body",
+            [str(attachment)],
+            headers,
+            ("Drive body", headers | drive_headers([str(attachment)], Path("L_1"))),
+        )
+    )
+
+    streamed = b"".join(SpooledMessage(message_path, PRIVATE_HEADER_PREFIX))
+    assert PRIVATE_HEADER_PREFIX.encode() not in streamed
+    assert b"To: student@example.com" in streamed
+    assert outbox.read_drive_files(message_path) is None
+    fallback_path = outbox.fallback_path(message_path)
+    assert fallback_path is not None
+    assert outbox.read_drive_files(fallback_path) == ([str(attachment)], Path("L_1"))
+
+    outbox.mark_flushed(message_path)
+    assert outbox.fallback_path(message_path) is None
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Callable
+
+from PyPDF2 import PdfReader
+
+from ta_workflow.pdf_optimizer import NOT_SMALLER_MARKER, optimize_pdf, optimize_pdfs
+
+
+def test_optimize_pdfs_keeps_smaller_copies(
+    tmp_path: Path, write_pdf: Callable[[Path, list[str]], None]
+) -> None:
+    feedback = tmp_path / "feedback.pdf"
+    write_pdf(feedback, ["Feedback " * 2000])
+    write_pdf(tmp_path / "source.pdf", ["Feedback"])
+    already_optimized = tmp_path / "already_optimized.pdf"
+    optimize_pdf(tmp_path / "source.pdf", already_optimized)
+    cache_path = tmp_path / "cache"
+
+    to_send = optimize_pdfs(
+        [str(feedback), str(already_optimized)], cache_path=cache_path
+    )
+
+    optimized = Path(to_send[str(feedback)])
+    assert optimized.parent.parent == cache_path
+    assert optimized.stat().st_size < feedback.stat().st_size
+    assert len(PdfReader(optimized).pages) == 1
+    # Optimizing again cannot shrink it, so the original is sent
+    assert to_send[str(already_optimized)] == str(already_optimized)
+    assert len(list(cache_path.glob(f"*/{NOT_SMALLER_MARKER}"))) == 1
+    # The second run is served from the cache
+    assert (
+        optimize_pdfs([str(feedback), str(already_optimized)], cache_path=cache_path)
+        == to_send
+    )
@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+from ta_workflow.pdf_splitter import (
+    glob_jobs,
+    read_manifest,
+    split_pdf_low_memory,
+    split_pdfs,
+)
+
+
+def test_read_manifest(tmp_path: Path) -> None:
+    csv_manifest = tmp_path / "manifest.csv"
+    csv_manifest.write_text("file,pages\nexam.pdf,1-2\nexam.pdf,3\n")
+    yaml_manifest = tmp_path / "manifest.yaml"
+    yaml_manifest.write_text("exam.pdf: [1-2, 3]\n")
+
+    expected = [(str(tmp_path / "exam.pdf"), [(1, 2), (3, 3)])]
+    assert read_manifest(csv_manifest) == expected
+    assert read_manifest(yaml_manifest) == expected
+
+
+@pytest.mark.parametrize(
+    "name, text",
+    [
+        ("manifest.yaml", "exam.pdf: 1-2\n"),
+        ("manifest.yaml", "- exam.pdf\n"),
+        ("manifest.yaml", "exam.pdf: [1-2\n"),
+        ("manifest.yaml", "exam.pdf: [two]\n"),
+        ("manifest.csv", "name,range\nexam.pdf,1-2\n"),
+    ],
+)
+def test_read_manifest_rejects_malformed_manifests(
+    tmp_path: Path, name: str, text: str
+) -> None:
+    manifest = tmp_path / name
+    manifest.write_text(text)
+
+    with pytest.raises(ValueError):
+        read_manifest(manifest)
+
+
+def test_split_pdfs_by_pages_per_part(
+    tmp_path: Path, write_pdf: Callable[[Path, list[str]], None]
+) -> None:
+    for i in range(3):
+        write_pdf(tmp_path / f"exam_{i}.pdf", [""] * 5)
+
+    split_pdfs(glob_jobs(str(tmp_path / "*.pdf")), pages_per_part=2, workers=2)
+
+    parts = sorted(tmp_path.glob("exam_0_part*.pdf"))
+    assert [len(PdfReader(part).pages) for part in parts] == [2, 2, 1]
+    # The parts are not split again
+    assert len(glob_jobs(str(tmp_path / "*.pdf"))) == 3
+
+
+def write_scan(path: Path, page_count: int) -> None:
+    """Writes a PDF whose pages share resources listing the images of every page."""
+    writer = PdfWriter()
+    images = {
+        NameObject(f"/Im{i}"): writer._add_object(image_stream(i))
+        for i in range(page_count)
+    }
+    resources = writer._add_object(
+        DictionaryObject({NameObject("/XObject"): DictionaryObject(images)})
+    )
+    for i in range(page_count):
+        page = PageObject.create_blank_page(None, 100, 100)
+        page[NameObject("/Resources")] = resources
+        contents = DecodedStreamObject()
+        contents.set_data(f"q 100 0 0 100 0 0 cm /Im{i} Do Q".encode())
+        page[NameObject("/Contents")] = writer._add_object(contents)
+        writer.add_page(page)
+    with path.open("wb") as f:
+        writer.write(f)
+
+
+def image_stream(seed: int) -> DecodedStreamObject:
+    image = DecodedStreamObject()
+    image.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(64),
+            NameObject("/Height"): NumberObject(64),
+            NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+        }
+    )
+    image.set_data(bytes((seed * 7 + i) % 256 for i in range(64 * 64)))
+    return image
+
+
+def test_split_pdf_low_memory_drops_unused_images(tmp_path: Path) -> None:
+    scan = tmp_path / "scan.pdf"
+    write_scan(scan, 4)
+
+    parts = split_pdf_low_memory(str(scan), [(1, 2), (3, 4)])
+
+    for part in parts:
+        reader = PdfReader(part)
+        assert len(reader.pages) == 2
+        for page in reader.pages:
+            assert len(page["/Resources"]["/XObject"]) == 1
+        assert part.stat().st_size < scan.stat().st_size * 0.6
@@ -0,0 +1,18 @@
+from pathlib import Path
+from typing import Callable
+
+from ta_workflow.pdf_text import extract_texts
+
+
+def test_extract_texts_caches_by_digest(
+    tmp_path: Path, write_pdf: Callable[[Path, list[str]], None]
+) -> None:
+    scan = tmp_path / "scan0003.pdf"
+    write_pdf(scan, ["Ada Lovelace 21900000"])
+    cache_path = tmp_path / "cache"
+
+    assert "Ada Lovelace 21900000" in extract_texts([scan], ["digest"], cache_path)[0]
+
+    # A rerun reads the cache, not the file
+    scan.unlink()
+    assert "21900000" in extract_texts([scan], ["digest"], cache_path)[0]
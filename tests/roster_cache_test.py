@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ta_workflow import roster_cache
+from ta_workflow.roster_cache import read_student_data
+
+
+def test_read_student_data_parses_changed_files_only(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "classRoster_fixed.xlsx"
+    cache_path = tmp_path / "cache"
+    pd.DataFrame({"bilkent_id": [21900000], "Quiz_1": [10.0]}).to_excel(
+        path, index=False
+    )
+    parsed = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(
+        roster_cache.pd, "read_excel", lambda p: parsed.append(p) or read_excel(p)
+    )
+
+    assert read_student_data(path, cache_path)["Quiz_1"].tolist() == [10.0]
+    # Touching the file or starting a new process uses the cache
+    os.utime(path, ns=(0, 0))
+    monkeypatch.setattr(roster_cache, "_frames", {})
+    read_student_data(path, cache_path).loc[0, "Quiz_1"] = 0
+    assert read_student_data(path, cache_path)["Quiz_1"].tolist() == [10.0]
+    assert parsed == [path]
+
+    pd.DataFrame({"bilkent_id": [21900000], "Quiz_1": [9.0]}).to_excel(
+        path, index=False
+    )
+    assert read_student_data(path, cache_path)["Quiz_1"].tolist() == [9.0]
+    assert parsed == [path, path]
@@ -0,0 +1,117 @@
+import importlib
+import smtplib
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+from ta_workflow.mailer import SpooledMessage
+from ta_workflow.outbox import (
+    ASSIGNMENT_HEADER,
+    BILKENT_ID_HEADER,
+    CONTENT_HASH_HEADER,
+    Outbox,
+    drive_headers,
+    render_message,
+)
+from ta_workflow.outbox_journal import OutboxJournal
+
+
+@pytest.fixture
+def send_grades(monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    monkeypatch.setenv("bilkent_email_credentials", "ta@example.com:password")
+    return importlib.import_module("ta_workflow.send_grades")
+
+
+class FakeSession:
+    """Refuses messages with attachments as too large and records the others."""
+
+    def __init__(self) -> None:
+        self.sent: list[bytes] = []
+
+    def sendmail(
+        self, from_addr: str, to_addr: list[str], message: SpooledMessage
+    ) -> None:
+        data = b"".join(message)
+        if b"attachment;" in data:
+            raise smtplib.SMTPSenderRefused(552, b"5.3.4 Message too big", from_addr)
+        self.sent.append(data)
+
+
+class FakeDriveSync:
+    def __init__(self) -> None:
+        self.submitted: list[tuple[list[str], Path]] = []
+
+    def submit(self, files_path: list[str], folder: Path) -> None:
+        self.submitted.append((files_path, folder))
+
+
+def test_flush_message_falls_back_to_google_drive(
+    tmp_path: Path, send_grades: ModuleType
+) -> None:
+    outbox = Outbox(tmp_path / "outbox")
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(b"%PDF-1.4 feedback")
+    headers = {
+        ASSIGNMENT_HEADER: "Homework_1",
+        BILKENT_ID_HEADER: "21900000",
+        CONTENT_HASH_HEADER: "hash",
+    }
+    folder = Path("Lovelace_21900000") / "Homework_1"
+    message_path = Path(
+        render_message(
+            str(outbox.path),
+            "ta@example.com",
+            ["ada@example.com"],
+            "Subject",
+            "Attached body",
+            [str(attachment)],
+            headers,
+            ("Drive body", headers | drive_headers([str(attachment)], folder)),
+        )
+    )
+    session, drive_sync = FakeSession(), FakeDriveSync()
+
+    with OutboxJournal(tmp_path / "journal.sqlite3") as journal:
+        send_grades.flush_message(
+            session, message_path, outbox, journal, drive_sync=drive_sync
+        )
+        assert journal.is_sent("Homework_1", "21900000", "hash")
+
+    (sent,) = session.sent
+    assert b"Drive body" in sent
+    assert b"X-TA-Workflow" not in sent
+    assert drive_sync.submitted == [([str(attachment)], folder)]
+    assert outbox.pending() == []
+
+
+def test_flush_message_fails_on_throttling(
+    tmp_path: Path, send_grades: ModuleType
+) -> None:
+    outbox = Outbox(tmp_path / "outbox")
+    headers = {
+        ASSIGNMENT_HEADER: "Homework_1",
+        BILKENT_ID_HEADER: "21900000",
+        CONTENT_HASH_HEADER: "hash",
+    }
+    message_path = Path(
+        render_message(
+            str(outbox.path),
+            "ta@example.com",
+            ["ada@example.com"],
+            "Subject",
+            "Body",
+            headers=headers,
+            fallback=("Drive body", headers),
+        )
+    )
+
+    class ThrottledSession:
+        def sendmail(self, from_addr: str, *args: object) -> None:
+            raise smtplib.SMTPSenderRefused(451, b"4.7.1 Try again later", from_addr)
+
+    with OutboxJournal(tmp_path / "journal.sqlite3") as journal:
+        with pytest.raises(smtplib.SMTPSenderRefused):
+            send_grades.flush_message(ThrottledSession(), message_path, outbox, journal)
+        assert not journal.is_sent("Homework_1", "21900000", "hash")
+    assert outbox.pending() == [message_path]
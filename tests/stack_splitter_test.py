@@ -0,0 +1,63 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from PyPDF2 import PdfReader
+
+from ta_workflow import stack_splitter
+from ta_workflow.stack_splitter import BLANK, COVER, split_stack
+from ta_workflow.student import Student
+
+
+@pytest.mark.parametrize(
+    "boundary, texts",
+    [
+        (COVER, ["Scan notes", "21900001", "Answers", "Name 21900000", "Answers"]),
+        (BLANK, ["Scan notes", "", "Alan Turing", "Answers", "", "", "Ada Lovelace"]),
+    ],
+)
+def test_split_stack(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    students: list[Student],
+    write_pdf: Callable[[Path, list[str]], None],
+    boundary: str,
+    texts: list[str],
+) -> None:
+    monkeypatch.setattr(stack_splitter, "PROJECT_ROOT", tmp_path)
+    stack = tmp_path / "stack.pdf"
+    write_pdf(stack, texts)
+
+    written = split_stack(str(stack), "Quiz_1", students, boundary)
+
+    assert written == {
+        "21900000": tmp_path / "Lovelace_21900000" / "Quiz_1" / "Quiz_1.pdf",
+        "21900001": tmp_path / "Turing_21900001" / "Quiz_1" / "Quiz_1.pdf",
+    }
+    turing_pages = PdfReader(written["21900001"]).pages
+    assert len(turing_pages) == 2
+    assert "Answers" in turing_pages[1].extract_text()
+    # The pages no student could be found for are left to distribute
+    unmatched = tmp_path / "Quiz_1" / "stack_unmatched1.pdf"
+    assert "Scan notes" in PdfReader(unmatched).pages[0].extract_text()
+
+
+def test_split_stack_keeps_papers_with_ids_on_every_page(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    students: list[Student],
+    write_pdf: Callable[[Path, list[str]], None],
+) -> None:
+    monkeypatch.setattr(stack_splitter, "PROJECT_ROOT", tmp_path)
+    stack = tmp_path / "stack.pdf"
+    write_pdf(stack, ["21900001 Page 1", "21900001 Page 2", "21900000 Page 1"])
+    paper = tmp_path / "Turing_21900001" / "Quiz_1" / "Quiz_1.pdf"
+
+    assert split_stack(str(stack), "Quiz_1", students)["21900001"] == paper
+    assert len(PdfReader(paper).pages) == 2
+
+    # Splitting again does not overwrite the papers, which may be graded by now
+    paper.write_bytes(b"graded")
+    written = split_stack(str(stack), "Quiz_1", students)
+    assert written["21900001"] == paper.with_name("Quiz_1_2.pdf")
+    assert paper.read_bytes() == b"graded"
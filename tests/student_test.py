@@ -0,0 +1,72 @@
+import pickle
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ta_workflow.student import Student, StudentTable, sync_student_data
+
+
+def test_student_table_validates_columns() -> None:
+    df = pd.DataFrame(
+        {
+            "first_name": ["Ada", "Alan"],
+            "last_name": ["Lovelace", "Turing"],
+            "department": ["ECON", "MATH"],
+            "bilkent_id": [21900000, 21900001],
+            "email": ["ada@example.com", "alan@example.com"],
+            "withdraw_fz": [False, "yes"],
+            "Quiz_1": [10.0, 8.5],
+        }
+    )
+
+    table = StudentTable.from_frame(df)
+
+    assert len(table) == 2
+    alan = table[1]
+    assert (alan.bilkent_id, alan.withdraw_fz) == ("21900001", True)
+    assert list(table)[1] == alan
+    assert table[-1] == alan and table[-1].withdraw_fz is True
+    assert list(table[1:]) == [alan]
+    assert alan == Student(**df.iloc[1].to_dict())
+    assert hash(alan) == hash("21900001")
+    assert pickle.loads(pickle.dumps(alan)) == alan
+    with pytest.raises(ValueError, match="withdraw_fz"):
+        StudentTable.from_frame(df.assign(withdraw_fz=["maybe", False]))
+    with pytest.raises(ValueError, match="email"):
+        StudentTable.from_frame(df.drop(columns="email"))
+
+
+def test_sync_student_data_keeps_the_grades(tmp_path: Path) -> None:
+    path = tmp_path / "classRoster_fixed.xlsx"
+    pd.DataFrame(
+        {
+            "first_name": ["Ada", "Alan"],
+            "last_name": ["Lovelace", "Turing"],
+            "department": ["ECON", "MATH"],
+            "bilkent_id": [21900000, 21900001],
+            "email": ["ada@example.com", "alan@example.com"],
+            "withdraw_fz": [False, False],
+            "Quiz_1": [10.0, 8.5],
+        }
+    ).to_excel(path, index=False)
+    roster = pd.DataFrame(
+        {
+            "first_name": ["Grace", "Ada"],
+            "last_name": ["Hopper", "Byron"],
+            "department": ["CS", "ECON"],
+            "bilkent_id": [21900002, 21900000],
+            "email": ["grace@example.com", "ada@example.com"],
+            "withdraw_fz": [False, False],
+        }
+    )
+
+    sync_student_data(roster, path)
+
+    df = pd.read_excel(path)
+    assert df["last_name"].tolist() == ["Hopper", "Byron", "Turing"]
+    assert df["Quiz_1"].tolist()[1:] == [10.0, 8.5]
+    assert pd.isna(df["Quiz_1"][0])
+    # The dropped student keeps the grades, as a withdrawn student
+    assert df["withdraw_fz"].tolist() == [False, False, True]
+    assert len(list(StudentTable.from_frame(df))) == 3
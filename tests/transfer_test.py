@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from ta_workflow.transfer import (
+    COPY,
+    HARDLINK,
+    REFLINK,
+    SYMLINK,
+    FileTransfer,
+    transfer_file,
+)
+
+
+@pytest.mark.parametrize("strategy", [COPY, REFLINK, HARDLINK, SYMLINK])
+def test_transfer_file_replaces_destination(tmp_path: Path, strategy: str) -> None:
+    source = tmp_path / "submission.pdf"
+    source.write_bytes(os.urandom(100_000))
+    destination = tmp_path / "student" / "submission.pdf"
+    destination.parent.mkdir()
+    destination.write_bytes(b"old")
+
+    transfer_file(source, destination, strategy, verify=True)
+
+    assert destination.read_bytes() == source.read_bytes()
+    assert destination.is_symlink() == (strategy == SYMLINK)
+    assert list(destination.parent.iterdir()) == [destination]
+
+
+def test_file_transfer_reports_failures(tmp_path: Path) -> None:
+    source = tmp_path / "submission.pdf"
+    source.write_bytes(b"submission")
+    with FileTransfer() as file_transfer:
+        file_transfer.submit(source, tmp_path / "copy.pdf")
+        file_transfer.submit(source, tmp_path / "missing" / "copy.pdf")
+        assert file_transfer.wait() == 1
+    assert file_transfer.transferred_bytes == len(b"submission")
+    with pytest.raises(ValueError):
+        FileTransfer("move")
@@ -1,13 +1,17 @@
 import logging
+import os
+from email import encoders
+from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from pathlib import Path
 from typing import Generator
 
 import pytest
 from pytest import LogCaptureFixture
 
 from ta_workflow.path import LOG_PATH
-from ta_workflow.utils import timer_decorator
+from ta_workflow.utils import _mime_init, estimate_email_size, timer_decorator
 
 
 @pytest.mark.parametrize(
@@ -55,3 +59,19 @@ def test_mime_init(sample_message: MIMEMultipart) -> None:
     assert sample_message["To"] == "test1@example.com,test2@example.com"
     assert sample_message["Subject"] == "Test Subject"
     assert isinstance(sample_message.get_payload()[0], MIMEText)
+
+
+def test_estimate_email_size(tmp_path: Path) -> None:
+    attachment = tmp_path / "feedback.pdf"
+    attachment.write_bytes(os.urandom(100_000))
+    message = _mime_init("a@example.com", ["b@example.com"], "Subject", "Body")
+    part = MIMEBase("application", "octet-stream")
+    part.set_payload(attachment.read_bytes())
+    encoders.encode_base64(part)
+    part.add_header("Content-Disposition", f"attachment; filename= {attachment.name}")
+    message.attach(part)
+    actual_size = len(message.as_string())
+
+    estimated_size = estimate_email_size(["Subject", "Body"], [str(attachment)])
+    # The estimate is an upper bound that is close to the actual size
+    assert actual_size <= estimated_size <= actual_size * 1.02